@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Account Analytics State
+Mergeable per-account brand analytics, folded incrementally and aged out by day
+
+Each account keeps one BrandAnalytics accumulator per posting day, the ids of
+the posts already folded in, and a running rollup over every retained day. A
+refresh only touches the days its new posts fall on and adds them to the
+rollup; days older than the retention window are subtracted from the rollup
+and deleted. Reading the report costs the same however long the history is.
+State is stored in SQLite so every gunicorn worker reads and updates the same
+history.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import logging
+from datetime import datetime, timedelta
+
+from brand_analytics import BrandAnalytics
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DB = os.environ.get('SKRAPER_ANALYTICS_DB', os.path.join(tempfile.gettempdir(), 'skraper-analytics.db'))
+RETENTION_DAYS = int(os.environ.get('SKRAPER_ANALYTICS_RETENTION_DAYS', 90))
+
+
+def _post_day(post, default):
+    """YYYY-MM-DD of a post's timestamp, or default when it has none"""
+    timestamp = post.get('timestamp')
+    if isinstance(timestamp, str) and len(timestamp) >= 10:
+        try:
+            datetime.strptime(timestamp[:10], '%Y-%m-%d')
+            return timestamp[:10]
+        except ValueError:
+            pass
+    return default
+
+
+class AccountAnalytics:
+    """Retained analytics of one account: the rollup over every day plus the day range"""
+
+    def __init__(self, rollup=None, days=0, oldest_day=None, newest_day=None, updated_at=None):
+        self.rollup = rollup or BrandAnalytics()
+        self.days = days
+        self.oldest_day = oldest_day
+        self.newest_day = newest_day
+        self.updated_at = updated_at
+
+    def merged(self):
+        """One accumulator over every retained day"""
+        return self.rollup
+
+    @property
+    def post_count(self):
+        return self.rollup.post_count
+
+    def summary(self, retention_days=RETENTION_DAYS):
+        return {
+            "posts_tracked": self.post_count,
+            "days": self.days,
+            "oldest_day": self.oldest_day,
+            "newest_day": self.newest_day,
+            "retention_days": retention_days
+        }
+
+
+class AccountStateStore:
+    """SQLite-backed AccountAnalytics per account, shared by every worker process on the host
+
+    account_days holds one accumulator per (account, day), account_posts the
+    ids already folded in, and account_rollup the merge of every retained
+    day together with the days its best and worst posts came from.
+    """
+
+    def __init__(self, path=ANALYTICS_DB, retention_days=RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS account_days (
+                    account TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    best_engagement INTEGER,
+                    worst_engagement INTEGER,
+                    PRIMARY KEY (account, day)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS account_posts (
+                    account TEXT NOT NULL,
+                    post_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    PRIMARY KEY (account, post_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS account_posts_day ON account_posts (account, day)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS account_rollup (
+                    account TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    best_day TEXT,
+                    worst_day TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._migrate(conn)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _migrate(self, conn):
+        """Split state written as one JSON blob per account into day, post and rollup rows"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'account_state'"
+            ).fetchone()
+            if exists:
+                for account, state in conn.execute("SELECT account, state FROM account_state").fetchall():
+                    buckets = json.loads(state)['buckets']
+                    for day in sorted(buckets):
+                        analytics = BrandAnalytics.from_state(buckets[day]['analytics'])
+                        self._add_day(conn, account, day, analytics, [str(post_id) for post_id in buckets[day]['post_ids']])
+                conn.execute("DROP TABLE account_state")
+                logger.info("Migrated account analytics to per-day rows")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _rollup(self, conn, account):
+        row = conn.execute(
+            "SELECT state, best_day, worst_day, updated_at FROM account_rollup WHERE account = ?", (account,)
+        ).fetchone()
+        if row is None:
+            return BrandAnalytics(), None, None, None
+        return BrandAnalytics.from_state(json.loads(row[0])), row[1], row[2], row[3]
+
+    def _analytics(self, conn, account, rollup, updated_at):
+        days, oldest_day, newest_day = conn.execute(
+            "SELECT COUNT(*), MIN(day), MAX(day) FROM account_days WHERE account = ?", (account,)
+        ).fetchone()
+        return AccountAnalytics(rollup, days, oldest_day, newest_day, updated_at)
+
+    def _add_day(self, conn, account, day, delta, post_ids):
+        """Merge one day's new posts into its row and the rollup (inside the caller's transaction)"""
+        row = conn.execute("SELECT state FROM account_days WHERE account = ? AND day = ?", (account, day)).fetchone()
+        analytics = BrandAnalytics.from_state(json.loads(row[0])).merge(delta) if row else delta
+        conn.execute(
+            "INSERT OR REPLACE INTO account_days (account, day, state, best_engagement, worst_engagement) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (account, day, json.dumps(analytics.to_state()), analytics._best_engagement, analytics._worst_engagement)
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO account_posts (account, post_id, day) VALUES (?, ?, ?)",
+            [(account, post_id, day) for post_id in post_ids]
+        )
+
+        rollup, best_day, worst_day, _ = self._rollup(conn, account)
+        best_post, worst_post = rollup.best_post, rollup.worst_post
+        rollup.merge(delta)
+        if rollup.best_post is not best_post:
+            best_day = day
+        if rollup.worst_post is not worst_post:
+            worst_day = day
+        self._write_rollup(conn, account, rollup, best_day, worst_day)
+
+    def _write_rollup(self, conn, account, rollup, best_day, worst_day):
+        conn.execute(
+            "INSERT OR REPLACE INTO account_rollup (account, state, best_day, worst_day, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (account, json.dumps(rollup.to_state()), best_day, worst_day, time.time())
+        )
+
+    def _expire(self, conn, account, cutoff):
+        """Subtract and delete days before cutoff; returns how many posts aged out"""
+        expired = conn.execute(
+            "SELECT day, state FROM account_days WHERE account = ? AND day < ?", (account, cutoff)
+        ).fetchall()
+        if not expired:
+            return 0
+
+        rollup, best_day, worst_day, _ = self._rollup(conn, account)
+        removed = 0
+        for day, state in expired:
+            analytics = BrandAnalytics.from_state(json.loads(state))
+            rollup.subtract(analytics)
+            removed += analytics.post_count
+        conn.execute("DELETE FROM account_days WHERE account = ? AND day < ?", (account, cutoff))
+        conn.execute("DELETE FROM account_posts WHERE account = ? AND day < ?", (account, cutoff))
+
+        # Best/worst post aged out: pick it again from the remaining days (oldest wins ties, like merge)
+        if best_day is not None and best_day < cutoff:
+            row = conn.execute(
+                "SELECT day, state FROM account_days WHERE account = ? "
+                "ORDER BY best_engagement DESC, day LIMIT 1", (account,)
+            ).fetchone()
+            best = BrandAnalytics.from_state(json.loads(row[1])) if row else BrandAnalytics()
+            rollup.best_post, rollup._best_engagement = best.best_post, best._best_engagement
+            best_day = row[0] if row else None
+        if worst_day is not None and worst_day < cutoff:
+            row = conn.execute(
+                "SELECT day, state FROM account_days WHERE account = ? "
+                "ORDER BY worst_engagement, day LIMIT 1", (account,)
+            ).fetchone()
+            worst = BrandAnalytics.from_state(json.loads(row[1])) if row else BrandAnalytics()
+            rollup.worst_post, rollup._worst_engagement = worst.worst_post, worst._worst_engagement
+            worst_day = row[0] if row else None
+        self._write_rollup(conn, account, rollup, best_day, worst_day)
+        return removed
+
+    def get(self, account):
+        conn = self._connect()
+        try:
+            rollup, _, _, updated_at = self._rollup(conn, account)
+            return self._analytics(conn, account, rollup, updated_at)
+        finally:
+            conn.close()
+
+    def update(self, account, posts):
+        """Fold posts into the stored state and age out old days; returns (state, new_posts, expired_posts)
+
+        Only the days the new posts fall on, the expired days and the rollup
+        are read and written, under one write transaction so concurrent
+        workers refreshing the same account never lose each other's posts.
+        """
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            seen = set()
+            days = {}  # day -> (BrandAnalytics of the new posts, their ids)
+            for post in posts:
+                post_id = post.get('id')
+                if post_id is None or str(post_id) in seen:
+                    continue
+                seen.add(str(post_id))
+                if conn.execute("SELECT 1 FROM account_posts WHERE account = ? AND post_id = ?",
+                                (account, str(post_id))).fetchone():
+                    continue
+                delta, post_ids = days.setdefault(_post_day(post, today), (BrandAnalytics(), []))
+                delta.add(post)
+                post_ids.append(str(post_id))
+
+            added = 0
+            for day in sorted(days):
+                delta, post_ids = days[day]
+                self._add_day(conn, account, day, delta, post_ids)
+                added += len(post_ids)
+            expired = self._expire(conn, account, cutoff)
+
+            rollup, _, _, updated_at = self._rollup(conn, account)
+            state = self._analytics(conn, account, rollup, updated_at or time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return state, added, expired
+
+    def reset(self, account):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ('account_days', 'account_posts', 'account_rollup'):
+                conn.execute(f"DELETE FROM {table} WHERE account = ?", (account,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
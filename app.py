@@ -8,18 +8,45 @@ import os
 import json
 import subprocess
 import logging
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
 import asyncio
 from datetime import datetime
 import re
 import tempfile
+import time
+import codecs
+import itertools
+import threading
+from contextlib import contextmanager
+from platform_router import detect_platform
+from post_record import PostRecord
+from json_provider import make_json_provider
+from response_fields import ProjectionError, parse_list, parse_projection, project_response
+from http_delivery import init_compression, resource_etag, matches_etag, not_modified
+from metrics import metrics, init_request_metrics, PROMETHEUS_CONTENT_TYPE
+from request_profiler import profiler, init_profile_routes
+from skraper_pool import create_pool, skraper_env, SkraperPool
+from skraper_probe import skraper_probe
+from scrape_jobs import JobManager, JobQueueFull
+from result_cache import ResultCache, CacheOptionError, parse_cache_options
+from post_store import PostStore, parse_time
+from media_fetcher import media_fetcher, servable_media_type
+from single_flight import SingleFlight
+from scrape_pages import PageManager
+from scrape_batch import BatchRunner, BATCH_MAX_ITEMS
+from rate_limit import FairScheduler, DEFAULT_TENANT
+from skraper_stream import iter_json_items, iter_raw_posts, negotiate_stream_format, frame_events
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = make_json_provider(app)
+init_request_metrics(app, metrics)  # Registered first so its timing includes compression
+init_compression(app)
+init_profile_routes(app, profiler)
 CORS(app)  # Enable CORS for all routes
 
 # Supported platforms mapping
@@ -44,65 +71,28 @@ SUPPORTED_PLATFORMS = {
     'pikabu': 'pikabu'
 }
 
+# Bytes read from Skraper stdout per step when streaming
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# since=last: consecutive posts older than the mark before the stream is stopped,
+# so a pinned old post at the top of a profile does not end the scan
+SINCE_OLDER_RUN = 3
+
 class SkraperService:
     """Service class to handle Skraper operations"""
     
     def __init__(self):
-        self.skraper_path = self._find_skraper_executable()
-    
-    def _find_skraper_executable(self):
-        """Find the skraper executable"""
-        # Try common installation paths
-        possible_paths = [
-            '/usr/local/bin/skraper',
-            '/usr/bin/skraper',
-            os.path.expanduser('~/.local/bin/skraper'),
-            os.path.join(os.getcwd(), 'skraper'),
-            'skraper'  # Assume in PATH
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path) and os.access(path, os.X_OK):
-                return path
-        
-        # Check if skraper is in PATH
-        try:
-            result = subprocess.run(['which', 'skraper'], capture_output=True, text=True)
-            if result.returncode == 0:
-                return result.stdout.strip()
-        except:
-            pass
-            
-        return None
+        self.skraper_path = skraper_probe.executable()  # No subprocess: the JVM probe runs in the background
+        self.pool = create_pool()
+        self.cache = ResultCache()
+        self.posts = PostStore()
+        self.flights = SingleFlight()
+        self.pages = PageManager(self._stream_window)
+        self.scheduler = FairScheduler()
     
     def detect_platform(self, url):
         """Detect social media platform from URL"""
-        patterns = {
-            'instagram': r'(?:instagram\.com|instagr\.am)',
-            'tiktok': r'tiktok\.com',
-            'twitter': r'(?:twitter\.com|x\.com)',
-            'youtube': r'(?:youtube\.com|youtu\.be)',
-            'facebook': r'facebook\.com',
-            'reddit': r'reddit\.com',
-            'pinterest': r'pinterest\.com',
-            'flickr': r'flickr\.com',
-            'tumblr': r'tumblr\.com',
-            'telegram': r't\.me',
-            'twitch': r'twitch\.tv',
-            'vimeo': r'vimeo\.com',
-            'vk': r'vk\.com',
-            '9gag': r'9gag\.com',
-            'ifunny': r'ifunny\.co',
-            'coub': r'coub\.com',
-            'odnoklassniki': r'odnoklassniki\.ru',
-            'pikabu': r'pikabu\.ru'
-        }
-        
-        for platform, pattern in patterns.items():
-            if re.search(pattern, url, re.IGNORECASE):
-                return platform
-        
-        return None
+        return detect_platform(url)
     
     def extract_path_from_url(self, url, platform):
         """Extract the path component needed by Skraper"""
@@ -128,8 +118,8 @@ class SkraperService:
         
         return path
     
-    def scrape_data(self, url, content_type='posts', limit=50, output_format='json'):
-        """Scrape data using Skraper CLI"""
+    def build_command(self, url, content_type='posts', limit=50, output_format='json'):
+        """Validate a scrape request and build its Skraper command line"""
         
         if not self.skraper_path:
             raise Exception("Skraper executable not found. Please install Skraper CLI tool.")
@@ -154,42 +144,363 @@ class SkraperService:
         if content_type == 'media-only':
             cmd.append('-m')
         
+        return platform, cmd
+    
+    def scrape_data(self, url, content_type='posts', limit=50, output_format='json', tenant=DEFAULT_TENANT):
+        """Scrape data using Skraper CLI"""
+        
+        platform, cmd = self.build_command(url, content_type, limit, output_format)
+        
+        # Wait for this platform's rate limit and a fair turn among tenants
+        with metrics.timer('rate_limit_wait', platform=platform):
+            self.scheduler.acquire(platform, tenant)
+        
         logger.info(f"Running command: {' '.join(cmd)}")
         
+        with self.scrape_outcome(platform):
+            # Run skraper once the host's pool has a free slot
+            with metrics.timer('subprocess', platform=platform):
+                result = self.pool.run(cmd, timeout=300)  # 5 minute timeout
+            return self.parse_output(result, output_format, platform)
+    
+    @contextmanager
+    def scrape_outcome(self, platform):
+        """Count one Skraper run by outcome, turning a timeout of either runner into the API's error"""
+        outcome = 'error'
         try:
-            # Run skraper command
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
+            yield
+            outcome = 'success'
+        except (subprocess.TimeoutExpired, asyncio.TimeoutError):
+            outcome = 'timeout'
+            raise Exception("Scraping timeout - operation took too long")
+        except Exception as e:
+            logger.error(f"Error running skraper: {str(e)}")
+            raise
+        finally:
+            metrics.inc('skraper_scrapes_total', platform=platform, outcome=outcome)
+    
+    def parse_output(self, result, output_format, platform):
+        """Scraped data from a finished Skraper run ({"returncode", "stdout", "stderr"})"""
+        if result['returncode'] != 0:
+            logger.error(f"Skraper error: {result['stderr']}")
+            raise Exception(f"Scraping failed: {result['stderr']}")
+        
+        # Parse the output
+        if output_format != 'json':
+            return {"raw_output": result['stdout']}
+        try:
+            with metrics.timer('parse', platform=platform):
+                return json.loads(result['stdout'])
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON output: {result['stdout'][:500]}")
+            raise Exception("Invalid response format from Skraper")
+    
+    def cache_key(self, url, platform, limit, content_type, output_format):
+        path = self.extract_path_from_url(url, platform)
+        return self.cache.make_key('scrape', platform, path, limit, content_type, output_format)
+    
+    def stream_data(self, cmd, platform, tenant=DEFAULT_TENANT, timeout=300):
+        """Run Skraper and yield raw post items as its output arrives
+        
+        The process holds a pool slot from start to exit, like a scrape_data
+        run, and is timed and counted under the same metrics.
+        """
+        with metrics.timer('rate_limit_wait', platform=platform):
+            self.scheduler.acquire(platform, tenant)
+        logger.info(f"Streaming command: {' '.join(cmd)}")
+        
+        outcome = 'error'
+        try:
+            with metrics.timer('subprocess', platform=platform), self.pool.slot(timeout):
+                yield from self._stream_process(cmd, timeout)
+            outcome = 'success'
+        except GeneratorExit:
+            outcome = 'success'  # The caller had all it needed and stopped reading
+            raise
+        except subprocess.TimeoutExpired:
+            outcome = 'timeout'
+            raise Exception("Scraping timeout - operation took too long")
+        finally:
+            metrics.inc('skraper_scrapes_total', platform=platform, outcome=outcome)
+    
+    def _stream_process(self, cmd, timeout):
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, env=skraper_env())
+            watchdog = threading.Timer(timeout, process.kill)
+            watchdog.start()
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
             
-            if result.returncode != 0:
-                logger.error(f"Skraper error: {result.stderr}")
-                raise Exception(f"Scraping failed: {result.stderr}")
+            def read_chunks():
+                while True:
+                    chunk = process.stdout.read1(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        yield decoder.decode(b'', final=True)
+                        return
+                    yield decoder.decode(chunk)
             
-            # Parse the output
-            if output_format == 'json':
+            try:
+                yield from iter_json_items(read_chunks())
+                
+                if process.wait() != 0:
+                    if not watchdog.is_alive():
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+                    stderr.seek(0)
+                    error = stderr.read().decode('utf-8', errors='replace')
+                    logger.error(f"Skraper error: {error}")
+                    raise Exception(f"Scraping failed: {error}")
+            finally:
+                watchdog.cancel()
+                # Stop Skraper if the client went away or the limit was reached early
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+    
+    def _stream_window(self, params, limit):
+        """Raw items of one Skraper run for a paginated scrape"""
+        platform, cmd = self.build_command(params['url'], params['content_type'], limit)
+        return self.stream_data(cmd, platform, params.get('tenant', DEFAULT_TENANT))
+    
+    def scrape_page(self, url, content_type='posts', page_size=50, cursor=None, tenant=DEFAULT_TENANT,
+                    statistics=True):
+        """One page of a cursor-paginated scrape
+        
+        Without a cursor a new listing is started; with one, the next page is
+        read from the spooled output of the earlier Skraper run.
+        """
+        if not cursor:
+            self.build_command(url, content_type, page_size)  # Fail fast on bad input
+        
+        items, start_index, next_cursor, params = self.pages.page(
+            {"url": url, "content_type": content_type, "tenant": tenant}, page_size, cursor
+        )
+        url = params['url']
+        platform = self.detect_platform(url)
+        self.record_posts(items, url, platform)
+        results = self.format_results_for_web(
+            items, url, platform, page_size, start_index=start_index, statistics=statistics
+        )
+        results['pagination'] = {
+            "page_size": page_size,
+            "start_index": start_index,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
+        return results
+    
+    def stream_results(self, url, content_type='posts', limit=50, output_format='json',
+                       use_cache=True, max_age=None, tenant=DEFAULT_TENANT, fields=None, include=None):
+        """Validate a streaming scrape and return its (event, data) generator
+        
+        Events are one "metadata", one "post" per formatted item, then
+        "statistics" last (or "error" if Skraper fails mid-stream). fields
+        projects each post; include (None for all) can leave out the "data"
+        posts or the "statistics" event.
+        """
+        if output_format != 'json':
+            raise Exception("Streaming is only available for JSON output")
+        
+        platform, cmd = self.build_command(url, content_type, limit, output_format)
+        key = self.cache_key(url, platform, limit, content_type, output_format)
+        
+        cached = None
+        if use_cache:
+            cached, age = self.cache.get(key, max_age=max_age)
+        
+        if cached is not None:
+            items = iter_raw_posts(cached)
+            cache_info = {"status": "hit", "age_seconds": age}
+        else:
+            items = self._keep_streamed(self.stream_data(cmd, platform, tenant), key, url, platform, limit)
+            cache_info = {"status": "miss" if use_cache else "bypass"}
+        metrics.inc('skraper_cache_requests_total', status=cache_info['status'])
+        
+        return self._stream_formatted(items, url, platform, limit, cache_info, fields, include)
+    
+    def _keep_streamed(self, items, key, url, platform, limit):
+        """Pass raw items through, then cache and record them if the run delivered all of its posts"""
+        streamed = []
+        complete = False
+        try:
+            for item in items:
+                streamed.append(item)
+                yield item
+            complete = True
+        finally:
+            items.close()
+            # Reaching the limit is complete too: the reader stops there without draining Skraper
+            if complete or len(streamed) >= limit:
                 try:
-                    return json.loads(result.stdout)
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON output: {result.stdout[:500]}")
-                    raise Exception("Invalid response format from Skraper")
-            else:
-                return {"raw_output": result.stdout}
+                    self.cache.put(key, streamed, self.cache.ttl_for(platform))
+                except Exception as e:
+                    logger.error(f"Could not cache streamed results: {str(e)}")
+                self.record_posts(streamed, url, platform)
+    
+    def _stream_formatted(self, items, url, platform, limit, cache_info, fields=None, include=None):
+        send_posts = include is None or 'data' in include
+        send_statistics = include is None or 'statistics' in include
+        metadata = self._build_metadata(url, platform, limit)
+        metadata['cache'] = cache_info
+        yield 'metadata', metadata
+        
+        total_posts = media_items = total_likes = total_comments = total_shares = 0
+        try:
+            for i, item in enumerate(itertools.islice(items, limit)):
+                post = self.format_post_item(item, platform, i)
+                total_posts += 1
+                media_items += 1 if post.get('media_url') else 0
+                total_likes += post.get('likes', 0)
+                total_comments += post.get('comments', 0)
+                total_shares += post.get('shares', 0)
+                if send_posts:
+                    yield 'post', {field: post[field] for field in fields} if fields else post
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            yield 'error', {"error": str(e), "success": False}
+            return
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+        
+        if send_statistics:
+            yield 'statistics', self._build_statistics(
+                total_posts, media_items, total_likes, total_comments, total_shares
+            )
+    
+    def scrape_with_cache(self, url, content_type='posts', limit=50, output_format='json',
+                          use_cache=True, max_age=None, tenant=DEFAULT_TENANT):
+        """Scrape data, serving repeat requests from the shared result cache
+        
+        Identical concurrent scrapes are coalesced into a single Skraper run,
+        both inside this process and across gunicorn workers on the host.
+        Returns (raw_data, cache_info) where cache_info describes the hit/miss.
+        """
+        platform, key = self.scrape_key(url, content_type, limit, output_format)
+        
+        if use_cache:
+            hit = self.cached_scrape(key, max_age)
+            if hit:
+                return hit
+        
+        requested_at = time.time()
+        
+        def run_scrape():
+            with self.flights.host_lease(key):
+                fresh = self.peer_scrape(key, requested_at)
+                if fresh is not None:
+                    return fresh, True
                 
-        except subprocess.TimeoutExpired:
-            raise Exception("Scraping timeout - operation took too long")
+                raw_data = self.scrape_data(url, content_type, limit, output_format, tenant)
+                self.keep_scrape(key, raw_data, url, platform, output_format)
+                return raw_data, False
+        
+        (raw_data, from_peer), shared = self.flights.do(key, run_scrape)
+        return raw_data, self.scrape_cache_info(shared or from_peer, use_cache)
+    
+    # Steps of scrape_with_cache, shared with asgi_app's coroutine version
+    
+    def scrape_key(self, url, content_type, limit, output_format):
+        platform = self.detect_platform(url)
+        if not platform:
+            raise Exception(f"Unsupported platform for URL: {url}")
+        return platform, self.cache_key(url, platform, limit, content_type, output_format)
+    
+    def cached_scrape(self, key, max_age):
+        """(raw_data, cache_info) of a cache hit, or None"""
+        raw_data, age = self.cache.get(key, max_age=max_age)
+        if raw_data is None:
+            return None
+        metrics.inc('skraper_cache_requests_total', status='hit')
+        return raw_data, {"status": "hit", "age_seconds": age}
+    
+    def peer_scrape(self, key, requested_at):
+        """Result another worker stored after requested_at, e.g. while we waited for its lease"""
+        fresh, _ = self.cache.get(key, max_age=time.time() - requested_at)
+        return fresh
+    
+    def keep_scrape(self, key, raw_data, url, platform, output_format):
+        """Cache a fresh Skraper result and add its posts to the history"""
+        self.cache.put(key, raw_data, self.cache.ttl_for(platform))
+        if output_format == 'json':
+            self.record_posts(raw_data, url, platform)
+    
+    def scrape_cache_info(self, shared, use_cache):
+        status = "coalesced" if shared else ("miss" if use_cache else "bypass")
+        metrics.inc('skraper_cache_requests_total', status=status)
+        return {"status": status}
+    
+    def record_posts(self, raw_data, url, platform):
+        """Keep the posts of a fresh Skraper run in the history store and advance the account's mark
+        
+        Items without an id are skipped: their positional ids would collide across runs.
+        Only a publish time the item itself carries is stored, never from_item's default.
+        """
+        try:
+            posts = []
+            for i, item in enumerate(iter_raw_posts(raw_data)):
+                if not isinstance(item, dict) or item.get('id') is None:
+                    continue
+                post = PostRecord.from_item(item, i)
+                if item.get('timestamp', item.get('created_at')) is None:
+                    post.timestamp = None
+                posts.append(post)
+            path = self.extract_path_from_url(url, platform)
+            self.posts.upsert(platform, posts, account=path)
+            self.posts.advance_watermark(platform, path, posts)
         except Exception as e:
-            logger.error(f"Error running skraper: {str(e)}")
-            raise
+            logger.error(f"Could not store posts in history: {str(e)}")
     
-    def format_results_for_web(self, raw_data, url, platform, limit):
-        """Format skraper results for web frontend"""
+    def scrape_new_posts(self, url, content_type='posts', limit=50, tenant=DEFAULT_TENANT):
+        """Raw items newer than the account's high-water mark; returns (items, incremental_info)
         
-        # Create metadata
-        metadata = {
+        Skraper lists newest posts first, so its output is streamed and the
+        process is stopped at the post carrying the mark's id, or after
+        SINCE_OLDER_RUN posts in a row published before the mark (one older
+        post alone may be pinned above newer ones and is only skipped).
+        Without a mark this is a plain scrape that sets one.
+        """
+        platform, cmd = self.build_command(url, content_type, limit, 'json')
+        mark = self.posts.watermark(platform, self.extract_path_from_url(url, platform))
+        
+        items = []
+        older_run = 0
+        stopped_early = False
+        stream = self.stream_data(cmd, platform, tenant)
+        try:
+            for item in stream:
+                if mark and isinstance(item, dict):
+                    if mark['post_id'] == str(item.get('id')):
+                        stopped_early = True
+                        break
+                    if self._older(item, mark):
+                        older_run += 1
+                        if older_run >= SINCE_OLDER_RUN:
+                            stopped_early = True
+                            break
+                        continue
+                    older_run = 0
+                items.append(item)
+                if len(items) >= limit:
+                    break
+        finally:
+            stream.close()  # Stops Skraper if it is still writing
+        
+        self.record_posts(items, url, platform)
+        return items, {
+            "since": "last",
+            "watermark": mark,
+            "new_posts": len(items),
+            "stopped_early": stopped_early
+        }
+    
+    @staticmethod
+    def _older(item, mark):
+        """Whether a raw item was published before a high-water mark"""
+        published_at = parse_time(item.get('timestamp', item.get('created_at')))
+        return published_at is not None and mark['published_at'] is not None and published_at < mark['published_at']
+    
+    def _build_metadata(self, url, platform, limit):
+        return {
             "url": url,
             "platform": platform,
             "scraped_at": datetime.utcnow().isoformat() + "Z",
@@ -197,86 +508,217 @@ class SkraperService:
             "output_format": "json",
             "limit": limit
         }
-        
-        # Format data based on platform and response format
-        formatted_data = []
-        
-        if isinstance(raw_data, list):
-            # Direct list of posts
-            for i, item in enumerate(raw_data[:limit]):
-                formatted_post = self.format_post_item(item, platform, i)
-                formatted_data.append(formatted_post)
-        elif isinstance(raw_data, dict):
-            # Structured response
-            if 'posts' in raw_data:
-                posts = raw_data['posts']
-            elif 'data' in raw_data:
-                posts = raw_data['data']
-            else:
-                posts = [raw_data]
-            
-            for i, item in enumerate(posts[:limit]):
-                formatted_post = self.format_post_item(item, platform, i)
-                formatted_data.append(formatted_post)
-        
-        # Calculate statistics
-        total_likes = sum(post.get('likes', 0) for post in formatted_data)
-        total_comments = sum(post.get('comments', 0) for post in formatted_data)
-        total_shares = sum(post.get('shares', 0) for post in formatted_data)
-        
-        statistics = {
-            "total_posts": len(formatted_data),
-            "media_items": len([p for p in formatted_data if p.get('media_url')]),
+    
+    def _build_statistics(self, total_posts, media_items, total_likes, total_comments, total_shares):
+        return {
+            "total_posts": total_posts,
+            "media_items": media_items,
             "engagement_metrics": {
                 "total_likes": total_likes,
                 "total_comments": total_comments,
                 "total_shares": total_shares
             }
         }
+    
+    def format_results_for_web(self, raw_data, url, platform, limit, start_index=0, statistics=True):
+        """Format skraper results for web frontend (statistics=False skips the statistics section)"""
         
-        return {
-            "metadata": metadata,
-            "data": formatted_data,
-            "statistics": statistics
-        }
+        # Create metadata
+        metadata = self._build_metadata(url, platform, limit)
+        
+        with metrics.timer('format', platform=platform):
+            # Format data based on platform and response format
+            formatted_data = [
+                self.format_post_item(item, platform, i)
+                for i, item in enumerate(itertools.islice(iter_raw_posts(raw_data), limit), start_index)
+            ]
+            
+            results = {
+                "metadata": metadata,
+                "data": formatted_data
+            }
+            if not statistics:
+                return results
+            
+            # Calculate statistics
+            total_likes = sum(post.likes for post in formatted_data)
+            total_comments = sum(post.comments for post in formatted_data)
+            total_shares = sum(post.shares for post in formatted_data)
+            media_items = sum(1 for post in formatted_data if post.media_url)
+        
+        results["statistics"] = self._build_statistics(
+            len(formatted_data),
+            media_items,
+            total_likes,
+            total_comments,
+            total_shares
+        )
+        return results
     
     def format_post_item(self, item, platform, index):
         """Format a single post item"""
-        
-        # Handle different response formats from different platforms
-        if isinstance(item, dict):
-            # Direct post object
-            return {
-                "id": item.get('id', f"post_{index + 1}"),
-                "username": item.get('username', 'unknown'),
-                "content": item.get('content', item.get('text', item.get('caption', ''))),
-                "timestamp": item.get('timestamp', item.get('created_at', datetime.utcnow().isoformat())),
-                "likes": item.get('likes', item.get('like_count', 0)),
-                "comments": item.get('comments', item.get('comment_count', 0)),
-                "shares": item.get('shares', item.get('share_count', 0)),
-                "media_url": item.get('media_url', item.get('image_url', item.get('video_url', '')),
-                "caption": item.get('caption', ''),
-                "hashtags": item.get('hashtags', []),
-                "mentions": item.get('mentions', [])
-            }
-        else:
-            # String content
-            return {
-                "id": f"post_{index + 1}",
-                "username": "unknown",
-                "content": str(item),
-                "timestamp": datetime.utcnow().isoformat(),
-                "likes": 0,
-                "comments": 0,
-                "shares": 0,
-                "media_url": "",
-                "caption": "",
-                "hashtags": [],
-                "mentions": []
-            }
+        return PostRecord.from_item(item, index)
+
+# Top-level sections of /api/scrape that include= can select
+SCRAPE_SECTIONS = ('data', 'statistics')
+
+MEDIA_MAX_URLS = 50
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+# WSGI environ key under which asgi_app passes a scrape it already ran: a callable returning
+# (raw_data, cache_info) or raising the scrape's error
+PREFETCHED_SCRAPE = 'skraper.prefetched_scrape'
 
 # Initialize service
 skraper_service = SkraperService()
+job_manager = JobManager()
+
+# Gauges read when /metrics is scraped; the host pool is shared by all workers, a local pool is not
+pool_is_local = isinstance(skraper_service.pool, SkraperPool)
+metrics.register_gauge('skraper_jobs_in_flight', "Background jobs queued or running",
+                       job_manager.in_flight, label='state')
+metrics.register_gauge('skraper_scrapes_in_flight', "Distinct scrapes currently running",
+                       skraper_service.flights.in_flight)
+metrics.register_gauge('skraper_rate_limit_queued', "Requests waiting for a platform rate-limit slot",
+                       skraper_service.scheduler.queued, label='platform')
+metrics.register_gauge('skraper_pool_workers', "Skraper pool workers by state",
+                       lambda: {state: skraper_service.pool.health().get(state, 0) for state in ('busy', 'idle')},
+                       label='state', per_worker=pool_is_local)
+metrics.register_gauge('skraper_pool_queue_depth', "Skraper runs waiting for a free pool worker",
+                       lambda: skraper_service.pool.health().get('queued', 0), per_worker=pool_is_local)
+metrics.register_gauge('skraper_cache_bytes', "Size of the shared result cache",
+                       lambda: skraper_service.cache.stats()['bytes'], per_worker=False)
+
+def run_scrape_job(progress, url, content_type, limit, output_format, use_cache=True, max_age=None,
+                   tenant=DEFAULT_TENANT, fields=None, include=SCRAPE_SECTIONS, since=None, download_media=False):
+    """Background job: scrape and format results"""
+    progress('scraping', 0.1)
+    if since:
+        formatted_results = scrape_since_last(url, content_type, limit, tenant, 'statistics' in include)
+        if download_media:
+            progress('downloading media', 0.5)
+            attach_media(formatted_results)
+        return project_response(formatted_results, fields, include, 'data', SCRAPE_SECTIONS)
+    raw_data, cache_info = skraper_service.scrape_with_cache(
+        url=url,
+        content_type=content_type,
+        limit=limit,
+        output_format=output_format,
+        use_cache=use_cache,
+        max_age=max_age,
+        tenant=tenant
+    )
+    
+    progress('formatting', 0.8)
+    platform = skraper_service.detect_platform(url)
+    formatted_results = skraper_service.format_results_for_web(
+        raw_data, url, platform, limit, statistics='statistics' in include
+    )
+    formatted_results['metadata']['cache'] = cache_info
+    if download_media:
+        progress('downloading media', 0.85)
+        attach_media(formatted_results)
+    return project_response(formatted_results, fields, include, 'data', SCRAPE_SECTIONS)
+
+def scrape_since_last(url, content_type, limit, tenant, statistics=True):
+    """Formatted results of only the posts published since the account was last scraped"""
+    items, incremental = skraper_service.scrape_new_posts(url, content_type, limit, tenant)
+    formatted_results = skraper_service.format_results_for_web(
+        items, url, skraper_service.detect_platform(url), limit, statistics=statistics
+    )
+    formatted_results['metadata']['cache'] = {"status": "bypass"}
+    formatted_results['metadata']['incremental'] = incremental
+    return formatted_results
+
+def attach_media(formatted_results):
+    """Download the media of formatted posts into the media store, as a "media" section keyed by media URL"""
+    formatted_results['media'] = media_results(post.media_url for post in formatted_results['data'])
+    return formatted_results
+
+def run_media_job(progress, urls):
+    """Background job: download a list of media URLs"""
+    progress('downloading', 0.0)
+    return {"media": media_results(urls)}
+
+def media_results(urls):
+    """Download media URLs; results keyed by URL with a path to each stored file"""
+    with metrics.timer('media_fetch'):
+        media = media_fetcher.fetch_all(urls)
+    for result in media.values():
+        if result.get('sha256'):
+            result['path'] = f"/api/media/{result['sha256']}"
+    return media
+
+def scrape_batch_item(item):
+    """Scrape and format one batch item"""
+    raw_data, cache_info = skraper_service.scrape_with_cache(
+        url=item['url'],
+        content_type=item['content_type'],
+        limit=item['limit'],
+        use_cache=item['use_cache'],
+        max_age=item['max_age'],
+        tenant=item['tenant']
+    )
+    platform = skraper_service.detect_platform(item['url'])
+    formatted_results = skraper_service.format_results_for_web(raw_data, item['url'], platform, item['limit'])
+    formatted_results['metadata']['cache'] = cache_info
+    return formatted_results
+
+batch_runner = BatchRunner(scrape_batch_item, skraper_service.detect_platform)
+
+def batch_item(entry, index, data, use_cache, max_age, tenant):
+    """Normalized batch item; a malformed entry gets an "error" and is reported on its own, keyed
+    by its url or, without one, by its position (items[<index>])"""
+    if isinstance(entry, str):
+        entry = {"url": entry}
+    if not isinstance(entry, dict) or not isinstance(entry.get('url'), str) or not entry['url']:
+        return {"url": f"items[{index}]", "error": "Batch item needs a url"}
+    item = {
+        "url": entry['url'],
+        "content_type": entry.get('content_type', data.get('content_type', 'posts')),
+        "use_cache": use_cache,
+        "max_age": max_age,
+        "tenant": tenant
+    }
+    try:
+        item["limit"] = max(1, min(int(entry.get('limit', data.get('limit', 50))), 100))  # Max 100 posts
+    except (TypeError, ValueError):
+        item["error"] = "limit must be an integer"
+    return item
+
+def run_batch_job(progress, items):
+    """Background job: scrape a batch of URLs"""
+    progress('scraping', 0.0)
+    results, summary = batch_runner.run(
+        items, on_progress=lambda done, total: progress('scraping', 0.99 * done / total)
+    )
+    return {"results": results, "summary": summary}
+
+def scrape_options(data):
+    """content_type, limit, output_format and cache options of a scrape request body"""
+    use_cache, max_age = parse_cache_options(data)
+    return {
+        "content_type": data.get('content_type', 'posts'),
+        "limit": min(int(data.get('limit', 50)), 100),  # Max 100 posts per page
+        "output_format": data.get('output_format', 'json'),
+        "use_cache": use_cache,
+        "max_age": max_age
+    }
+
+def request_tenant(data, headers=None):
+    """Tenant used for fair scheduling of upstream calls"""
+    headers = request.headers if headers is None else headers
+    return headers.get('X-Tenant-Id') or data.get('tenant') or DEFAULT_TENANT
+
+def cached_result_etag(cache_key, max_age, fields, include):
+    """ETag of the cached result a request would be served from, or None"""
+    version = skraper_service.cache.version(cache_key, max_age=max_age)
+    return resource_etag(cache_key, version, fields, sorted(include)) if version else None
+
+def wants_async(data, args=None):
+    """Whether the client asked for an asynchronous job"""
+    args = request.args if args is None else args
+    return bool(data.get('async')) or args.get('async') in ('1', 'true')
 
 @app.route('/')
 def index():
@@ -287,18 +729,27 @@ def index():
         "description": "Web API for social media scraping using Skraper library",
         "endpoints": {
             "GET /health": "Health check",
-            "POST /api/scrape": "Scrape social media data",
-            "GET /api/platforms": "Get supported platforms"
+            "POST /api/scrape": "Scrape social media data (pass \"async\": true for a background job, \"paginate\": true or a \"cursor\" for pages, \"since\": \"last\" for only posts newer than the last scrape, \"fields\"/\"include\" to project the response, \"download_media\": true to store each post's media)",
+            "POST /api/media/fetch": "Download a list of media URLs concurrently into the content-addressed media store",
+            "GET /api/media/<sha256>": "A downloaded media file by its SHA-256",
+            "POST /api/scrape/batch": "Scrape a list of URLs concurrently",
+            "GET /api/jobs/<job_id>": "Get status and result of a background scrape job",
+            "GET /api/history": "Previously scraped posts from the local store (platform, username, since, until, sort, order, limit, offset, fields)",
+            "GET /api/platforms": "Get supported platforms",
+            "GET /metrics": "Prometheus metrics for all workers on this host",
+            "GET /api/profiles/<profile_id>": "Stored request profile (send \"X-Profile: 1\" with an X-Profile-Token to profile a scrape)"
         }
     })
 
 @app.route('/health')
 def health():
-    """Health check endpoint"""
+    """Health check endpoint (answers from the cached Skraper probe, never runs it)"""
+    probe = skraper_probe.state()
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "skraper_available": skraper_service.skraper_path is not None
+        "skraper_available": skraper_service.skraper_path is not None and probe['available'],
+        "skraper_probe": {"status": probe['status'], "checked_at": probe['checked_at']}
     })
 
 @app.route('/api/platforms')
@@ -310,6 +761,7 @@ def get_platforms():
     })
 
 @app.route('/api/scrape', methods=['POST'])
+@profiler.profiled
 def scrape_endpoint():
     """Main scraping endpoint"""
     try:
@@ -319,30 +771,126 @@ def scrape_endpoint():
             return jsonify({"error": "No JSON data provided"}), 400
         
         url = data.get('url')
-        if not url:
+        cursor = data.get('cursor')
+        if not url and not cursor:
             return jsonify({"error": "URL is required"}), 400
         
         # Optional parameters
-        content_type = data.get('content_type', 'posts')
-        limit = min(int(data.get('limit', 50)), 100)  # Max 100 posts
-        output_format = data.get('output_format', 'json')
-        
-        # Scrape data
-        raw_data = skraper_service.scrape_data(
-            url=url,
-            content_type=content_type,
-            limit=limit,
-            output_format=output_format
-        )
+        options = scrape_options(data)
+        content_type, limit, output_format = options['content_type'], options['limit'], options['output_format']
+        use_cache, max_age = options['use_cache'], options['max_age']
+        tenant = request_tenant(data)
+        fields, include = parse_projection(data, request.args, PostRecord.FIELDS, SCRAPE_SECTIONS)
+        since = data.get('since', request.args.get('since'))
+        if since not in (None, 'last'):
+            return jsonify({"error": "since must be \"last\"", "success": False}), 400
+        download_media = bool(data.get('download_media'))
         
-        # Format results
+        # Cursor pagination: pages beyond the first come from spooled output
+        if cursor or data.get('paginate'):
+            return jsonify(project_response(skraper_service.scrape_page(
+                url=url,
+                content_type=content_type,
+                page_size=limit,
+                cursor=cursor,
+                tenant=tenant,
+                statistics='statistics' in include
+            ), fields, include, 'data', SCRAPE_SECTIONS))
+        
+        if wants_async(data):
+            job_id = job_manager.submit(
+                'scrape',
+                run_scrape_job,
+                url=url,
+                content_type=content_type,
+                limit=limit,
+                output_format=output_format,
+                use_cache=use_cache,
+                max_age=max_age,
+                tenant=tenant,
+                fields=fields,
+                include=sorted(include),
+                since=since,
+                download_media=download_media
+            )
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}"
+            }), 202
+        
+        # Only posts newer than the account's high-water mark; never cached
+        if since:
+            formatted_results = scrape_since_last(url, content_type, limit, tenant, 'statistics' in include)
+            if download_media:
+                attach_media(formatted_results)
+            return jsonify(project_response(formatted_results, fields, include, 'data', SCRAPE_SECTIONS))
+        
+        # Stream posts as they are parsed when the client asks for it
+        stream_mimetype = negotiate_stream_format(request.headers.get('Accept'))
+        if stream_mimetype:
+            events = skraper_service.stream_results(
+                url=url,
+                content_type=content_type,
+                limit=limit,
+                output_format=output_format,
+                use_cache=use_cache,
+                max_age=max_age,
+                tenant=tenant,
+                fields=fields,
+                include=include
+            )
+            return Response(
+                stream_with_context(frame_events(events, stream_mimetype)),
+                mimetype=stream_mimetype,
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        # Conditional request: a matching ETag is answered from the cache entry's version alone
+        # (not when media is downloaded, which the cache entry's version does not cover)
         platform = skraper_service.detect_platform(url)
+        cache_key = None
+        if use_cache and platform and not download_media:
+            cache_key = skraper_service.cache_key(url, platform, limit, content_type, output_format)
+            etag = cached_result_etag(cache_key, max_age, fields, include)
+            if matches_etag(etag):
+                return not_modified(etag)
+        
+        # Scrape data (or serve it from the result cache); the ASGI server may have already scraped it
+        prefetched = request.environ.get(PREFETCHED_SCRAPE)
+        if prefetched:
+            raw_data, cache_info = prefetched()
+        else:
+            raw_data, cache_info = skraper_service.scrape_with_cache(
+                url=url,
+                content_type=content_type,
+                limit=limit,
+                output_format=output_format,
+                use_cache=use_cache,
+                max_age=max_age,
+                tenant=tenant
+            )
+        
+        # Format results
         formatted_results = skraper_service.format_results_for_web(
-            raw_data, url, platform, limit
+            raw_data, url, platform, limit, statistics='statistics' in include
         )
+        formatted_results['metadata']['cache'] = cache_info
+        if download_media:
+            attach_media(formatted_results)
         
-        return jsonify(formatted_results)
+        with metrics.timer('serialize', platform=platform):
+            response = jsonify(project_response(formatted_results, fields, include, 'data', SCRAPE_SECTIONS))
+        if cache_key:
+            etag = cached_result_etag(cache_key, max_age, fields, include)
+            if etag:
+                response.set_etag(etag, weak=True)
+        return response
         
+    except (ProjectionError, CacheOptionError) as e:
+        return jsonify({"error": str(e), "success": False}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e), "success": False}), 503
     except Exception as e:
         logger.error(f"Scraping error: {str(e)}")
         return jsonify({
@@ -350,16 +898,173 @@ def scrape_endpoint():
             "success": False
         }), 500
 
+@app.route('/api/scrape/batch', methods=['POST'])
+def scrape_batch_endpoint():
+    """Scrape many URLs concurrently, with results and errors keyed by URL"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        entries = data.get('items') or data.get('urls')
+        if not isinstance(entries, list) or not entries:
+            return jsonify({"error": "items must be a non-empty list"}), 400
+        if len(entries) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"A batch can contain at most {BATCH_MAX_ITEMS} items"}), 400
+        
+        # Items may be bare URLs or objects with their own limit/content_type
+        use_cache, max_age = parse_cache_options(data)
+        tenant = request_tenant(data)
+        items = [batch_item(entry, index, data, use_cache, max_age, tenant) for index, entry in enumerate(entries)]
+        
+        if wants_async(data):
+            job_id = job_manager.submit('scrape_batch', run_batch_job, items=items)
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}"
+            }), 202
+        
+        results, summary = batch_runner.run(items)
+        return jsonify({"results": results, "summary": summary})
+        
+    except CacheOptionError as e:
+        return jsonify({"error": str(e), "success": False}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e), "success": False}), 503
+    except Exception as e:
+        logger.error(f"Batch scraping error: {str(e)}")
+        return jsonify({
+            "error": str(e),
+            "success": False
+        }), 500
+
+@app.route('/api/media/fetch', methods=['POST'])
+def media_fetch_endpoint():
+    """Download a list of media URLs into the content-addressed media store"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        urls = data.get('urls')
+        if not isinstance(urls, list) or not urls:
+            return jsonify({"error": "urls must be a non-empty list"}), 400
+        if len(urls) > MEDIA_MAX_URLS:
+            return jsonify({"error": f"At most {MEDIA_MAX_URLS} URLs can be fetched per request"}), 400
+        
+        if wants_async(data):
+            job_id = job_manager.submit('media_fetch', run_media_job, urls=urls)
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}"
+            }), 202
+        
+        return jsonify({"media": media_results(urls)})
+        
+    except JobQueueFull as e:
+        return jsonify({"error": str(e), "success": False}), 503
+    except Exception as e:
+        logger.error(f"Media fetch error: {str(e)}")
+        return jsonify({
+            "error": str(e),
+            "success": False
+        }), 500
+
+@app.route('/api/media/<sha256>')
+def get_media(sha256):
+    """A downloaded media file by its SHA-256"""
+    path = media_fetcher.store.object_path(sha256)
+    if not path or not os.path.exists(path):
+        return jsonify({"error": "Media not found"}), 404
+    # Only image/video/audio types are served inline; anything else is a download, never a page of ours
+    media_type = servable_media_type(media_fetcher.store.content_type(sha256))
+    media_fetcher.store.touch(sha256)  # Recently served files are evicted last
+    try:
+        response = send_file(path, mimetype=media_type or 'application/octet-stream', as_attachment=media_type is None,
+                             download_name=sha256, conditional=True, etag=sha256, max_age=MEDIA_MAX_AGE)
+    except FileNotFoundError:
+        return jsonify({"error": "Media not found"}), 404  # Evicted since the check above
+    response.headers['Cache-Control'] += ', immutable'  # Content never changes under its hash
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+# Fields of /api/history posts that fields= can select
+HISTORY_FIELDS = PostRecord.FIELDS + ('platform', 'first_seen', 'last_seen')
+
+@app.route('/api/history')
+def history_endpoint():
+    """Stored posts by account and publish time, newest or top-N first; never runs Skraper"""
+    try:
+        args = request.args
+        fields = parse_list(args.get('fields'))
+        unknown = [field for field in fields or () if field not in HISTORY_FIELDS]
+        if unknown:
+            raise ProjectionError(f"Unknown fields: {', '.join(unknown)}. Valid fields: {', '.join(HISTORY_FIELDS)}")
+        
+        since, until = parse_time(args.get('since')), parse_time(args.get('until'))
+        for name, value in (('since', since), ('until', until)):
+            if args.get(name) and value is None:
+                raise ProjectionError(f"{name} must be an ISO-8601 time or epoch seconds")
+        
+        with metrics.timer('history'):
+            posts = skraper_service.posts.history(
+                platform=args.get('platform'),
+                username=args.get('username'),
+                since=since,
+                until=until,
+                sort=args.get('sort', 'timestamp'),
+                order=args.get('order', 'desc'),
+                limit=args.get('limit', 50),
+                offset=args.get('offset', 0)
+            )
+        if fields:
+            posts = [{field: post.get(field) for field in fields} for post in posts]
+        
+        return jsonify({
+            "posts": posts,
+            "count": len(posts),
+            "query": {key: args.get(key) for key in
+                      ('platform', 'username', 'since', 'until', 'sort', 'order', 'limit', 'offset') if args.get(key)}
+        })
+        
+    except (ProjectionError, ValueError) as e:
+        return jsonify({"error": str(e), "success": False}), 400
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Status, progress and result of a background scrape job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job)
+
 @app.route('/api/scrape/status')
 def scrape_status():
     """Check scraping service status"""
     return jsonify({
         "skraper_available": skraper_service.skraper_path is not None,
         "skraper_path": skraper_service.skraper_path,
+        "skraper_probe": skraper_probe.state(),
+        "pool": skraper_service.pool.health(),
+        "cache": skraper_service.cache.stats(),
+        "history": skraper_service.posts.stats(),
+        "media": media_fetcher.store.stats(),
+        "in_flight_scrapes": skraper_service.flights.in_flight(),
+        "batch_slots": batch_runner.limits.snapshot(),
+        "rate_limits": skraper_service.scheduler.snapshot(),
         "supported_platforms": len(SUPPORTED_PLATFORMS),
         "timestamp": datetime.utcnow().isoformat()
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics, aggregated over every worker on this host"""
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -6,23 +6,39 @@ Provides enhanced data analysis for AI-powered content creation
 
 import os
 import json
-import subprocess
 import logging
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 import tempfile
 import random
-from collections import Counter
 import hashlib
+from scrape_jobs import JobManager, JobQueueFull
+from platform_router import detect_platform
+from brand_analytics import BrandAnalytics, ANALYTICS_PARTS, identify_themes
+from post_frame import PostFrame
+from result_cache import ResultCache, CacheOptionError, parse_cache_options
+from post_labeler import get_labeler, call_to_action, sentiment_summary
+from account_analytics import AccountStateStore
+from post_record import EnhancedPostRecord
+from json_provider import make_json_provider
+from response_fields import ProjectionError, parse_projection, parse_sections, project_response
+from http_delivery import init_compression, resource_etag, matches_etag, not_modified
+from metrics import metrics, init_request_metrics, PROMETHEUS_CONTENT_TYPE
+from skraper_probe import skraper_probe
+from request_profiler import profiler, init_profile_routes
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = make_json_provider(app)
+init_request_metrics(app, metrics)  # Registered first so its timing includes compression
+init_compression(app)
+init_profile_routes(app, profiler)
 CORS(app)  # Enable CORS for all routes
 
 # Supported platforms mapping
@@ -47,50 +63,35 @@ SUPPORTED_PLATFORMS = {
     'pikabu': 'pikabu'
 }
 
+# Top-level sections of the enhanced response that include= can select
+ENHANCED_SECTIONS = ('posts', 'brand_analysis', 'ai_agent_recommendations')
+ANALYSIS_SECTIONS = {'brand_analysis', 'ai_agent_recommendations'}
+
+# Sections of /api/ai-agent/brand-analysis and the analytics parts each one needs
+AI_AGENT_SECTIONS = {
+    'brand_profile': (),
+    'content_strategy': ('voice',),
+    'engagement_insights': ('engagement',),
+    'content_themes': ('themes',),
+    'ai_recommendations': ('voice', 'engagement'),
+    'sample_posts': ()
+}
+
 class EnhancedSkraperService:
     """Enhanced service class with AI agent data analysis"""
     
     def __init__(self):
-        self.skraper_available = self._check_skraper_availability()
+        self.cache = ResultCache()
+        self.accounts = AccountStateStore()
     
-    def _check_skraper_availability(self):
-        """Check if Skraper CLI is available"""
-        try:
-            # Try to run skraper --help
-            result = subprocess.run(['skraper', '--help'], 
-                                  capture_output=True, text=True, timeout=5)
-            return result.returncode == 0
-        except:
-            return False
+    @property
+    def skraper_available(self):
+        """Whether Skraper CLI is available, from the host's cached probe"""
+        return skraper_probe.state()['available']
     
     def detect_platform(self, url):
         """Detect social media platform from URL"""
-        patterns = {
-            'instagram': r'(?:instagram\.com|instagr\.am)',
-            'tiktok': r'tiktok\.com',
-            'twitter': r'(?:twitter\.com|x\.com)',
-            'youtube': r'(?:youtube\.com|youtu\.be)',
-            'facebook': r'facebook\.com',
-            'reddit': r'reddit\.com',
-            'pinterest': r'pinterest\.com',
-            'flickr': r'flickr\.com',
-            'tumblr': r'tumblr\.com',
-            'telegram': r't\.me',
-            'twitch': r'twitch\.tv',
-            'vimeo': r'vimeo\.com',
-            'vk': r'vk\.com',
-            '9gag': r'9gag\.com',
-            'ifunny': r'ifunny\.co',
-            'coub': r'coub\.com',
-            'odnoklassniki': r'odnoklassniki\.ru',
-            'pikabu': r'pikabu\.ru'
-        }
-        
-        for platform, pattern in patterns.items():
-            if re.search(pattern, url, re.IGNORECASE):
-                return platform
-        
-        return None
+        return detect_platform(url)
     
     def extract_path_from_url(self, url, platform):
         """Extract the path component needed by Skraper"""
@@ -151,24 +152,20 @@ class EnhancedSkraperService:
         for i in range(min(limit, 20)):  # Generate up to 20 posts
             content = platform_content[i % len(platform_content)]
             
-            post = {
-                "id": f"post_{i+1}",
-                "username": self.extract_username_from_url(url),
-                "content": content,
-                "timestamp": self.generate_timestamp(i),
-                "likes": random.randint(50, 5000),
-                "comments": random.randint(5, 200),
-                "shares": random.randint(0, 50),
-                "media_url": f"https://example.com/media_{i+1}.jpg",
-                "caption": content,
-                "hashtags": self.extract_hashtags(content),
-                "mentions": self.extract_mentions(content),
-                "media_type": random.choice(['image', 'video', 'carousel']),
-                "post_length": len(content),
-                "emoji_count": len([c for c in content if c in ['😀', '😍', '🚀', '✨', '💫', '🔥', '💡', '🌍', '🧠', '💰', '🏠', '📊', '🚢']]),
-                "call_to_action": self.detect_call_to_action(content),
-                "sentiment": self.analyze_sentiment(content)
-            }
+            post = EnhancedPostRecord(
+                id=f"post_{i+1}",
+                username=self.extract_username_from_url(url),
+                content=content,
+                timestamp=self.generate_timestamp(i),
+                likes=random.randint(50, 5000),
+                comments=random.randint(5, 200),
+                shares=random.randint(0, 50),
+                media_url=f"https://example.com/media_{i+1}.jpg",
+                caption=content,
+                hashtags=self.extract_hashtags(content),
+                mentions=self.extract_mentions(content),
+                media_type=random.choice(['image', 'video', 'carousel'])
+            )
             posts.append(post)
         
         return posts
@@ -186,8 +183,7 @@ class EnhancedSkraperService:
         hours_back = random.randint(0, 23)
         minutes_back = random.randint(0, 59)
         
-        post_time = base_time.replace(
-            day=base_time.day - days_back,
+        post_time = (base_time - timedelta(days=days_back)).replace(
             hour=hours_back,
             minute=minutes_back,
             second=0,
@@ -205,164 +201,34 @@ class EnhancedSkraperService:
         mentions = re.findall(r'@\w+', content)
         return mentions
     
-    def detect_call_to_action(self, content):
+    def detect_call_to_action(self, content, labels=None):
         """Detect call-to-action phrases"""
-        cta_keywords = [
-            'click', 'swipe', 'link in bio', 'check out', 'visit', 'shop now',
-            'buy now', 'order', 'subscribe', 'follow', 'share', 'comment',
-            'tell us', 'what do you think', 'change my mind', 'pro tip',
-            'reminder', 'alert', 'don\'t miss'
-        ]
-        
-        content_lower = content.lower()
-        detected_ctas = [keyword for keyword in cta_keywords if keyword in content_lower]
-        
-        return {
-            "has_cta": len(detected_ctas) > 0,
-            "cta_types": detected_ctas,
-            "cta_strength": len(detected_ctas)
-        }
+        labels = labels or get_labeler().label(content)
+        return call_to_action(labels['cta_types'])
     
-    def analyze_sentiment(self, content):
+    def analyze_sentiment(self, content, labels=None):
         """Basic sentiment analysis"""
-        positive_words = ['amazing', 'awesome', 'great', 'excellent', 'fantastic', 'love', 'perfect', 'incredible', 'outstanding', 'brilliant', 'excited', 'happy', 'thrilled', 'proud', 'grateful']
-        negative_words = ['terrible', 'awful', 'horrible', 'hate', 'disappointed', 'frustrated', 'angry', 'sad', 'annoyed', 'upset', 'worried', 'concerned']
-        
-        content_lower = content.lower()
-        positive_count = sum(1 for word in positive_words if word in content_lower)
-        negative_count = sum(1 for word in negative_words if word in content_lower)
-        
-        if positive_count > negative_count:
-            sentiment = "positive"
-        elif negative_count > positive_count:
-            sentiment = "negative"
-        else:
-            sentiment = "neutral"
-        
-        return {
-            "sentiment": sentiment,
-            "positive_score": positive_count,
-            "negative_score": negative_count,
-            "sentiment_strength": abs(positive_count - negative_count)
-        }
+        labels = labels or get_labeler().label(content)
+        return sentiment_summary(labels['positive_score'], labels['negative_score'])
     
     def analyze_brand_voice(self, posts):
         """Analyze brand voice patterns"""
-        all_content = " ".join([post['content'] for post in posts])
-        
-        # Analyze language patterns
-        avg_length = sum(len(post['content']) for post in posts) / len(posts)
-        total_emojis = sum(post['emoji_count'] for post in posts)
-        avg_emojis = total_emojis / len(posts)
-        
-        # CTA analysis
-        cta_posts = sum(1 for post in posts if post['call_to_action']['has_cta'])
-        cta_frequency = cta_posts / len(posts)
-        
-        # Sentiment analysis
-        sentiments = [post['sentiment']['sentiment'] for post in posts]
-        sentiment_distribution = Counter(sentiments)
-        
-        return {
-            "average_caption_length": round(avg_length, 1),
-            "average_emoji_count": round(avg_emojis, 2),
-            "cta_frequency": round(cta_frequency, 2),
-            "sentiment_distribution": dict(sentiment_distribution),
-            "primary_sentiment": sentiment_distribution.most_common(1)[0][0],
-            "tone_indicators": {
-                "professional": avg_length > 100,
-                "casual": avg_emojis > 1,
-                "engaging": cta_frequency > 0.3,
-                "positive": sentiment_distribution.get("positive", 0) > len(posts) * 0.6
-            }
-        }
+        return BrandAnalytics.from_posts(posts).voice_analysis()
     
     def analyze_engagement_patterns(self, posts):
         """Analyze engagement patterns"""
-        total_likes = sum(post['likes'] for post in posts)
-        total_comments = sum(post['comments'] for post in posts)
-        total_shares = sum(post['shares'] for post in posts)
-        
-        avg_likes = total_likes / len(posts)
-        avg_comments = total_comments / len(posts)
-        avg_shares = total_shares / len(posts)
-        
-        # Engagement rate calculation
-        # Assuming follower count (use 10000 as baseline)
-        baseline_followers = 10000
-        engagement_rate = ((total_likes + total_comments + total_shares) / len(posts)) / baseline_followers
-        
-        # Find best performing content
-        best_post = max(posts, key=lambda p: p['likes'] + p['comments'] + p['shares'])
-        worst_post = min(posts, key=lambda p: p['likes'] + p['comments'] + p['shares'])
-        
-        return {
-            "total_engagement": {
-                "likes": total_likes,
-                "comments": total_comments,
-                "shares": total_shares
-            },
-            "average_engagement": {
-                "likes": round(avg_likes, 1),
-                "comments": round(avg_comments, 1),
-                "shares": round(avg_shares, 1)
-            },
-            "engagement_rate": round(engagement_rate, 4),
-            "best_performing_post": {
-                "id": best_post['id'],
-                "engagement": best_post['likes'] + best_post['comments'] + best_post['shares'],
-                "content_preview": best_post['content'][:50] + "..."
-            },
-            "worst_performing_post": {
-                "id": worst_post['id'],
-                "engagement": worst_post['likes'] + worst_post['comments'] + worst_post['shares'],
-                "content_preview": worst_post['content'][:50] + "..."
-            }
-        }
+        return BrandAnalytics.from_posts(posts, parts=('engagement',)).engagement_patterns()
     
     def analyze_content_themes(self, posts):
         """Analyze content themes and patterns"""
-        all_content = " ".join([post['content'] for post in posts])
-        all_hashtags = []
-        for post in posts:
-            all_hashtags.extend(post['hashtags'])
-        
-        # Common words analysis
-        words = re.findall(r'\b\w+\b', all_content.lower())
-        common_words = Counter(words)
-        
-        # Hashtag analysis
-        hashtag_counter = Counter(all_hashtags)
-        
-        # Media type analysis
-        media_types = Counter([post['media_type'] for post in posts])
-        
-        return {
-            "most_common_words": dict(common_words.most_common(10)),
-            "most_used_hashtags": dict(hashtag_counter.most_common(10)),
-            "media_type_distribution": dict(media_types),
-            "content_themes": self.identify_themes(common_words),
-            "hashtag_strategy": {
-                "branded_hashtags": len([h for h in hashtag_counter.keys() if 'brand' in h.lower()]),
-                "trending_hashtags": len([h for h in hashtag_counter.keys() if len(h) > 10]),
-                "average_hashtags_per_post": len(all_hashtags) / len(posts)
-            }
-        }
+        return BrandAnalytics.from_posts(posts).content_themes()
     
     def identify_themes(self, word_counter):
         """Identify content themes from words"""
-        themes = {
-            "product_focused": any(word in str(word_counter) for word in ['product', 'launch', 'new', 'available']),
-            "behind_scenes": any(word in str(word_counter) for word in ['behind', 'scenes', 'process', 'making']),
-            "customer_focused": any(word in str(word_counter) for word in ['customer', 'client', 'review', 'testimonial']),
-            "educational": any(word in str(word_counter) for word in ['tip', 'how', 'guide', 'learn', 'tutorial']),
-            "promotional": any(word in str(word_counter) for word in ['sale', 'discount', 'offer', 'deal', 'limited']),
-            "community": any(word in str(word_counter) for word in ['community', 'family', 'team', 'together'])
-        }
-        
-        return [theme for theme, present in themes.items() if present]
+        return identify_themes(word_counter)
     
-    def scrape_enhanced_data(self, url, content_type='posts', limit=50):
+    def scrape_enhanced_data(self, url, content_type='posts', limit=50, use_cache=True, max_age=None,
+                             incremental=False, include=ENHANCED_SECTIONS):
         """Scrape and enhance data for AI agent"""
         
         # Detect platform
@@ -370,13 +236,28 @@ class EnhancedSkraperService:
         if not platform:
             raise Exception(f"Unsupported platform for URL: {url}")
         
+        # Serve repeat requests from the shared result cache
+        cache_key = self.cache_key(url, platform, limit, content_type)
+        if use_cache:
+            cached, age = self.cache.get(cache_key, max_age=max_age)
+            if cached is not None:
+                metrics.inc('skraper_cache_requests_total', status='hit')
+                cached['metadata']['cache'] = {"status": "hit", "age_seconds": age}
+                if incremental:
+                    self.apply_account_history(cached, platform, url)
+                return cached
+        
         # Generate enhanced mock data (replace with real Skraper call when available)
-        posts = self.generate_enhanced_mock_data(platform, url, limit)
+        with metrics.timer('generate', platform=platform):
+            posts = self.generate_enhanced_mock_data(platform, url, limit)
         
-        # Perform enhanced analysis
-        brand_voice = self.analyze_brand_voice(posts)
-        engagement_patterns = self.analyze_engagement_patterns(posts)
-        content_themes = self.analyze_content_themes(posts)
+        # Perform enhanced analysis in a single pass over the posts, unless no analysis was asked for
+        analyzed = bool(ANALYSIS_SECTIONS & set(include))
+        analysis = {}
+        if analyzed:
+            with metrics.timer('analysis', platform=platform):
+                analysis = BrandAnalytics.from_posts(posts).report()
+                analysis['brand_analysis']['engagement_distribution'] = PostFrame.from_posts(posts).distribution_report()
         
         # Create comprehensive dataset
         enhanced_data = {
@@ -389,77 +270,137 @@ class EnhancedSkraperService:
                 "total_posts": len(posts)
             },
             "posts": posts,
-            "brand_analysis": {
-                "voice_analysis": brand_voice,
-                "engagement_patterns": engagement_patterns,
-                "content_themes": content_themes,
-                "overall_performance": {
-                    "total_likes": sum(p['likes'] for p in posts),
-                    "total_comments": sum(p['comments'] for p in posts),
-                    "total_shares": sum(p['shares'] for p in posts),
-                    "average_engagement_per_post": sum(p['likes'] + p['comments'] + p['shares'] for p in posts) / len(posts)
-                }
-            },
-            "ai_agent_recommendations": self.generate_ai_recommendations(posts, brand_voice, engagement_patterns)
+            **analysis
         }
         
-        return enhanced_data
-    
-    def generate_ai_recommendations(self, posts, brand_voice, engagement_patterns):
-        """Generate recommendations for AI agent"""
+        # Only complete results are cached, so a later full request never gets a partial one
+        if use_cache and analyzed:
+            self.cache.put(cache_key, enhanced_data, self.cache.ttl_for(platform))
+        enhanced_data['metadata']['cache'] = {"status": "miss" if use_cache else "bypass"}
+        metrics.inc('skraper_cache_requests_total', status=enhanced_data['metadata']['cache']['status'])
         
-        recommendations = {
-            "content_strategy": {
-                "optimal_post_length": brand_voice['average_caption_length'],
-                "recommended_emoji_usage": brand_voice['average_emoji_count'],
-                "cta_frequency": brand_voice['cta_frequency'],
-                "tone_guidelines": brand_voice['tone_indicators']
-            },
-            "engagement_optimization": {
-                "best_performing_content_type": engagement_patterns['best_performing_post']['content_preview'],
-                "engagement_rate": engagement_patterns['engagement_rate'],
-                "optimal_hashtag_count": sum(len(post['hashtags']) for post in posts) / len(posts)
-            },
-            "brand_voice_guidelines": {
-                "primary_tone": brand_voice['primary_sentiment'],
-                "formality_level": "semi_formal" if brand_voice['average_caption_length'] > 100 else "casual",
-                "emoji_strategy": "moderate" if brand_voice['average_emoji_count'] > 1 else "minimal",
-                "cta_approach": "frequent" if brand_voice['cta_frequency'] > 0.3 else "occasional"
-            },
-            "content_ideas": self.generate_content_ideas(posts, brand_voice)
-        }
+        if incremental:
+            self.apply_account_history(enhanced_data, platform, url)
         
-        return recommendations
+        return enhanced_data
     
-    def generate_content_ideas(self, posts, brand_voice):
-        """Generate content ideas based on analysis"""
-        
-        ideas = []
+    def ai_agent_analysis(self, url, limit=50, sections=tuple(AI_AGENT_SECTIONS), use_cache=True, max_age=None,
+                          incremental=False):
+        """AI agent view of a brand, running only the analyzers the requested sections need
         
-        # Based on brand voice
-        if brand_voice['tone_indicators'].get('professional', False):
-            ideas.append("Industry insights and thought leadership content")
-            ideas.append("Behind-the-scenes of business operations")
+        Full requests share the enhanced endpoint's cached result. A subset is
+        served from that cached result when present; otherwise posts are
+        generated and only the needed analytics parts are aggregated (post
+        labels are never computed when no voice section is asked for).
+        """
+        parts = {part for section in sections for part in AI_AGENT_SECTIONS[section]}
         
-        if brand_voice['tone_indicators'].get('casual', False):
-            ideas.append("Team culture and workplace content")
-            ideas.append("User-generated content and community features")
-        
-        if brand_voice['tone_indicators'].get('engaging', False):
-            ideas.append("Interactive polls and Q&A sessions")
-            ideas.append("Challenges and contests")
+        platform = self.detect_platform(url)
+        if not platform:
+            raise Exception(f"Unsupported platform for URL: {url}")
         
-        # Based on performance
-        best_post = max(posts, key=lambda p: p['likes'] + p['comments'] + p['shares'])
-        if best_post['media_type'] == 'video':
-            ideas.append("More video content and tutorials")
+        enhanced_data = None
+        if parts == set(ANALYTICS_PARTS) or incremental:
+            enhanced_data = self.scrape_enhanced_data(
+                url=url, limit=limit, use_cache=use_cache, max_age=max_age, incremental=incremental
+            )
+        elif use_cache:
+            enhanced_data, _ = self.cache.get(self.cache_key(url, platform, limit, 'posts'), max_age=max_age)
+        
+        if enhanced_data is not None:
+            posts = enhanced_data['posts']
+            brand_analysis = enhanced_data['brand_analysis']
+            analyzers = {
+                'content_strategy': lambda: brand_analysis['voice_analysis'],
+                'engagement_insights': lambda: brand_analysis['engagement_patterns'],
+                'content_themes': lambda: brand_analysis['content_themes'],
+                'ai_recommendations': lambda: enhanced_data['ai_agent_recommendations']
+            }
         else:
-            ideas.append("High-quality image carousels")
+            with metrics.timer('generate', platform=platform):
+                posts = self.generate_enhanced_mock_data(platform, url, limit)
+            with metrics.timer('analysis', platform=platform):
+                analytics = BrandAnalytics.from_posts(posts, parts=parts)
+            analyzers = {
+                'content_strategy': analytics.voice_analysis,
+                'engagement_insights': analytics.engagement_patterns,
+                'content_themes': analytics.content_themes,
+                'ai_recommendations': analytics.recommendations
+            }
         
-        return ideas
+        ai_data = {}
+        for section in sections:
+            if section == 'brand_profile':
+                ai_data[section] = {
+                    "platform": platform,
+                    "username": posts[0]['username'] if posts else 'unknown',
+                    "total_posts_analyzed": len(posts)
+                }
+            elif section == 'sample_posts':
+                ai_data[section] = posts[:5]  # Include sample posts for context
+            else:
+                ai_data[section] = analyzers[section]()
+        return ai_data
+    
+    def cache_key(self, url, platform, limit, content_type):
+        return self.cache.make_key('enhanced', platform, self.extract_path_from_url(url, platform), limit, content_type)
+    
+    def account_key(self, platform, url):
+        return f"{platform}:{self.extract_path_from_url(url, platform)}"
+    
+    def apply_account_history(self, enhanced_data, platform, url):
+        """Fold this batch into the account's stored analytics and report over the retained history"""
+        state, added, expired = self.accounts.update(self.account_key(platform, url), enhanced_data['posts'])
+        distribution = enhanced_data.get('brand_analysis', {}).get('engagement_distribution')
+        enhanced_data.update(state.merged().report())
+        if distribution is not None:
+            enhanced_data['brand_analysis']['engagement_distribution'] = distribution  # Still this batch only
+        enhanced_data['metadata']['account_history'] = {
+            **state.summary(self.accounts.retention_days),
+            "new_posts": added,
+            "expired_posts": expired
+        }
+    
+    def generate_ai_recommendations(self, posts, brand_voice, engagement_patterns):
+        """Generate recommendations for AI agent"""
+        return BrandAnalytics.from_posts(posts).recommendations(brand_voice, engagement_patterns)
+    
+    def generate_content_ideas(self, posts, brand_voice):
+        """Generate content ideas based on analysis"""
+        return BrandAnalytics.from_posts(posts).content_ideas(brand_voice)
 
 # Initialize service
 skraper_service = EnhancedSkraperService()
+job_manager = JobManager()
+
+metrics.register_gauge('skraper_jobs_in_flight', "Background jobs queued or running",
+                       job_manager.in_flight, label='state')
+metrics.register_gauge('skraper_cache_bytes', "Size of the shared result cache",
+                       lambda: skraper_service.cache.stats()['bytes'], per_worker=False)
+
+def run_enhanced_job(progress, url, content_type, limit, use_cache=True, max_age=None, incremental=False,
+                     fields=None, include=ENHANCED_SECTIONS):
+    """Background job: scrape and analyze"""
+    progress('scraping', 0.1)
+    enhanced_data = skraper_service.scrape_enhanced_data(
+        url=url,
+        content_type=content_type,
+        limit=limit,
+        use_cache=use_cache,
+        max_age=max_age,
+        incremental=incremental,
+        include=include
+    )
+    return project_response(enhanced_data, fields, include, 'posts', ENHANCED_SECTIONS)
+
+def cached_result_etag(cache_key, max_age, fields, include):
+    """ETag of the cached result a request would be served from, or None"""
+    version = skraper_service.cache.version(cache_key, max_age=max_age)
+    return resource_etag(cache_key, version, fields, sorted(include)) if version else None
+
+def wants_async(data):
+    """Whether the client asked for an asynchronous job"""
+    return bool(data.get('async')) or request.args.get('async') in ('1', 'true')
 
 @app.route('/')
 def index():
@@ -478,19 +419,25 @@ def index():
         ],
         "endpoints": {
             "GET /health": "Health check",
-            "POST /api/scrape/enhanced": "Enhanced scraping with AI analysis",
+            "POST /api/scrape/enhanced": "Enhanced scraping with AI analysis (pass \"async\": true for a background job, \"incremental\": true to analyze the account's stored history, \"fields\"/\"include\" to project the response)",
+            "GET /api/jobs/<job_id>": "Get status and result of a background scrape job",
             "GET /api/platforms": "Get supported platforms",
-            "GET /api/scrape/status": "Check scraping service status"
+            "GET /api/scrape/status": "Check scraping service status",
+            "POST /api/ai-agent/brand-analysis": "Brand analysis for AI agents (pass \"sections\" to compute only some of: brand_profile, content_strategy, engagement_insights, content_themes, ai_recommendations, sample_posts)",
+            "GET /metrics": "Prometheus metrics for all workers on this host",
+            "GET /api/profiles/<profile_id>": "Stored request profile (send \"X-Profile: 1\" with an X-Profile-Token to profile a scrape)"
         }
     })
 
 @app.route('/health')
 def health():
-    """Health check endpoint"""
+    """Health check endpoint (answers from the cached Skraper probe, never runs it)"""
+    probe = skraper_probe.state()
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "skraper_available": skraper_service.skraper_available,
+        "skraper_available": probe['available'],
+        "skraper_probe": {"status": probe['status'], "checked_at": probe['checked_at']},
         "enhanced_features": True
     })
 
@@ -504,6 +451,7 @@ def get_platforms():
     })
 
 @app.route('/api/scrape/enhanced', methods=['POST'])
+@profiler.profiled
 def scrape_enhanced_endpoint():
     """Enhanced scraping endpoint with AI agent data"""
     try:
@@ -519,16 +467,61 @@ def scrape_enhanced_endpoint():
         # Optional parameters
         content_type = data.get('content_type', 'posts')
         limit = min(int(data.get('limit', 50)), 100)  # Max 100 posts
+        use_cache, max_age = parse_cache_options(data)
+        incremental = bool(data.get('incremental'))
+        fields, include = parse_projection(data, request.args, EnhancedPostRecord.FIELDS, ENHANCED_SECTIONS)
+        
+        if wants_async(data):
+            job_id = job_manager.submit(
+                'scrape_enhanced',
+                run_enhanced_job,
+                url=url,
+                content_type=content_type,
+                limit=limit,
+                use_cache=use_cache,
+                max_age=max_age,
+                incremental=incremental,
+                fields=fields,
+                include=sorted(include)
+            )
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}"
+            }), 202
+        
+        # Conditional request: a matching ETag is answered from the cache entry's version alone
+        platform = skraper_service.detect_platform(url)
+        cache_key = None
+        if use_cache and not incremental and platform:
+            cache_key = skraper_service.cache_key(url, platform, limit, content_type)
+            etag = cached_result_etag(cache_key, max_age, fields, include)
+            if matches_etag(etag):
+                return not_modified(etag)
         
         # Scrape enhanced data
         enhanced_data = skraper_service.scrape_enhanced_data(
             url=url,
             content_type=content_type,
-            limit=limit
+            limit=limit,
+            use_cache=use_cache,
+            max_age=max_age,
+            incremental=incremental,
+            include=include
         )
         
-        return jsonify(enhanced_data)
-        
+        with metrics.timer('serialize', platform=enhanced_data['metadata']['platform']):
+            response = jsonify(project_response(enhanced_data, fields, include, 'posts', ENHANCED_SECTIONS))
+        if cache_key:
+            etag = cached_result_etag(cache_key, max_age, fields, include)
+            if etag:
+                response.set_etag(etag, weak=True)
+        return response
+        
+    except (ProjectionError, CacheOptionError) as e:
+        return jsonify({"error": str(e), "success": False}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e), "success": False}), 503
     except Exception as e:
         logger.error(f"Enhanced scraping error: {str(e)}")
         return jsonify({
@@ -537,12 +530,22 @@ def scrape_enhanced_endpoint():
             "note": "This is an enhanced mock implementation. Install Skraper CLI for real data."
         }), 500
 
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Status, progress and result of a background scrape job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job)
+
 @app.route('/api/scrape/status')
 def scrape_status():
     """Check scraping service status"""
     return jsonify({
         "skraper_available": skraper_service.skraper_available,
+        "skraper_probe": skraper_probe.state(),
         "enhanced_features": True,
+        "cache": skraper_service.cache.stats(),
         "supported_platforms": len(SUPPORTED_PLATFORMS),
         "timestamp": datetime.utcnow().isoformat(),
         "note": "Enhanced version with AI agent data analysis"
@@ -558,28 +561,27 @@ def ai_agent_brand_analysis():
         if not data or not data.get('url'):
             return jsonify({"error": "URL is required"}), 400
         
-        # Get enhanced data
-        enhanced_data = skraper_service.scrape_enhanced_data(
+        try:
+            limit = max(1, min(int(data.get('limit', 50)), 100))  # Max 100 posts, as on /api/scrape
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be an integer", "success": False}), 400
+        
+        # Compute only the requested sections (all of them by default)
+        sections = parse_sections(data.get('sections', request.args.get('sections')), AI_AGENT_SECTIONS)
+        use_cache, max_age = parse_cache_options(data)
+        ai_data = skraper_service.ai_agent_analysis(
             url=data.get('url'),
-            limit=data.get('limit', 50)
+            limit=limit,
+            sections=sections,
+            use_cache=use_cache,
+            max_age=max_age,
+            incremental=bool(data.get('incremental'))
         )
         
-        # Extract AI-specific data
-        ai_data = {
-            "brand_profile": {
-                "platform": enhanced_data['metadata']['platform'],
-                "username": enhanced_data['posts'][0]['username'] if enhanced_data['posts'] else 'unknown',
-                "total_posts_analyzed": len(enhanced_data['posts'])
-            },
-            "content_strategy": enhanced_data['brand_analysis']['voice_analysis'],
-            "engagement_insights": enhanced_data['brand_analysis']['engagement_patterns'],
-            "content_themes": enhanced_data['brand_analysis']['content_themes'],
-            "ai_recommendations": enhanced_data['ai_agent_recommendations'],
-            "sample_posts": enhanced_data['posts'][:5]  # Include sample posts for context
-        }
-        
         return jsonify(ai_data)
         
+    except (ProjectionError, CacheOptionError) as e:
+        return jsonify({"error": str(e), "success": False}), 400
     except Exception as e:
         logger.error(f"AI agent analysis error: {str(e)}")
         return jsonify({
@@ -587,6 +589,11 @@ def ai_agent_brand_analysis():
             "success": False
         }), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics, aggregated over every worker on this host"""
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -597,8 +604,8 @@ def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
-    # Check if skraper is available
-    if not skraper_service.skraper_available:
+    # Check if skraper is available (probing now if no host-wide result exists yet)
+    if not skraper_probe.state(wait=True)['available']:
         logger.warning("Skraper CLI not available. Using enhanced mock data.")
         logger.info("To enable real data scraping, install Skraper CLI:")
         logger.info("https://github.com/sokomishalov/skraper")
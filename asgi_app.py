@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+ASGI Serving Mode
+Serves the API from an asyncio event loop, with Skraper run as non-blocking subprocesses
+
+The route set is the gunicorn deployment's: app_enhanced's routes, plus
+app.py's for every path app_enhanced does not have (/api/scrape, batch,
+media, history).
+
+Blocking scrapes (POST /api/scrape without async, pagination, streaming or
+since=last) run Skraper with asyncio.create_subprocess_exec on the event
+loop. Their rate-limit turn and host lease are awaited on the loop too, so a
+request waiting on either or on its JVM holds no thread and no worker
+process. Only short cache and history reads/writes borrow one of
+SKRAPER_ASYNC_IO_THREADS threads. At most SKRAPER_ASYNC_CONCURRENCY Skraper
+processes run at once per process; more scrapes wait for a slot. Once the
+raw data is in, the unchanged Flask view formats and serializes it in a
+thread. That keeps the JSON shapes, caching and metrics identical to the
+gunicorn deployment.
+
+Every other route runs its Flask view in one of SKRAPER_ASYNC_THREADS
+threads. Streams, pages, since=last, batches and background jobs still run
+Skraper from such a thread, so at most that many of them are in progress
+per process; the enhanced routes do not run Skraper.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from io import BytesIO
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import NotFound, HTTPException
+
+from app import (app as flask_app, skraper_service, scrape_options, request_tenant, wants_async,
+                 SCRAPE_SECTIONS, PREFETCHED_SCRAPE)
+from app_enhanced import app as enhanced_app
+from post_record import PostRecord
+from response_fields import parse_projection
+from skraper_stream import negotiate_stream_format
+from skraper_probe import skraper_probe
+from rate_limit import DEFAULT_TENANT
+from skraper_pool import skraper_env
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ASYNC_CONCURRENCY = int(os.environ.get('SKRAPER_ASYNC_CONCURRENCY', 200))  # Skraper processes per process
+ASYNC_THREADS = int(os.environ.get('SKRAPER_ASYNC_THREADS', 32))  # Threads running Flask views
+ASYNC_IO_THREADS = int(os.environ.get('SKRAPER_ASYNC_IO_THREADS', 8))  # Threads for cache and history I/O
+SCRAPE_TIMEOUT = 300
+
+
+class AsyncSkraper:
+    """Runs scrapes for a SkraperService on the event loop, through the service's own steps"""
+
+    def __init__(self, service, concurrency=ASYNC_CONCURRENCY, io_threads=ASYNC_IO_THREADS):
+        self.service = service
+        self.concurrency = concurrency
+        self._slots = None  # Created on the running loop
+        self._flights = {}
+        # SQLite reads and writes are short but blocking; nothing that waits on others runs here
+        self._io = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix='skraper-io')
+
+    async def _blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, func, *args)
+
+    async def run(self, cmd, timeout=SCRAPE_TIMEOUT):
+        """Run a Skraper command; same result shape as SkraperPool.run"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=skraper_env()
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise
+            except asyncio.CancelledError:
+                process.kill()  # Server shutdown; never leave Skraper running
+                await process.wait()
+                raise
+        return {
+            "returncode": process.returncode,
+            "stdout": stdout.decode('utf-8', errors='replace'),
+            "stderr": stderr.decode('utf-8', errors='replace')
+        }
+
+    async def scrape_data(self, url, content_type='posts', limit=50, output_format='json', tenant=DEFAULT_TENANT):
+        """SkraperService.scrape_data without blocking the loop"""
+        service = self.service
+        platform, cmd = service.build_command(url, content_type, limit, output_format)
+
+        with metrics.timer('rate_limit_wait', platform=platform):
+            await service.scheduler.acquire_async(platform, tenant)
+
+        logger.info(f"Running command: {' '.join(cmd)}")
+
+        with service.scrape_outcome(platform):
+            with metrics.timer('subprocess', platform=platform):
+                result = await self.run(cmd)
+            return service.parse_output(result, output_format, platform)
+
+    async def scrape_with_cache(self, url, content_type='posts', limit=50, output_format='json',
+                                use_cache=True, max_age=None, tenant=DEFAULT_TENANT):
+        """SkraperService.scrape_with_cache without blocking the loop
+
+        Identical concurrent scrapes in this process share one task; across
+        processes the same host lease as the sync service is used.
+        """
+        service = self.service
+        platform, key = service.scrape_key(url, content_type, limit, output_format)
+
+        if use_cache:
+            hit = await self._blocking(service.cached_scrape, key, max_age)
+            if hit:
+                return hit
+
+        requested_at = time.time()
+
+        async def run_scrape():
+            async with service.flights.host_lease_async(key):
+                fresh = await self._blocking(service.peer_scrape, key, requested_at)
+                if fresh is not None:
+                    return fresh, True
+
+                raw_data = await self.scrape_data(url, content_type, limit, output_format, tenant)
+                await self._blocking(service.keep_scrape, key, raw_data, url, platform, output_format)
+                return raw_data, False
+
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if not shared:
+            flight = self._flights[key] = asyncio.ensure_future(run_scrape())
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        # A waiter that disconnects must not cancel the scrape the others are waiting for
+        raw_data, from_peer = await asyncio.shield(flight)
+        return raw_data, service.scrape_cache_info(shared or from_peer, use_cache)
+
+    async def prefetch(self, data, headers, args):
+        """Run the scrape of a blocking POST /api/scrape on the loop; None when Flask should handle it all
+
+        Requests Flask answers without scraping (cache hits, bad input, jobs,
+        pages, streams) are left to it.
+        """
+        if not isinstance(data, dict) or not data.get('url') or data.get('cursor') or data.get('paginate'):
+            return None
+        if data.get('since') or args.get('since'):
+            return None  # since=last streams Skraper output in the view
+        if wants_async(data, args) or negotiate_stream_format(headers.get('Accept')):
+            return None
+        try:
+            options = scrape_options(data)
+            parse_projection(data, args, PostRecord.FIELDS, SCRAPE_SECTIONS)
+            platform, _ = self.service.build_command(
+                data['url'], options['content_type'], options['limit'], options['output_format']
+            )
+        except Exception:
+            return None  # Flask reports the error
+
+        if options['use_cache']:
+            key = self.service.cache_key(
+                data['url'], platform, options['limit'], options['content_type'], options['output_format']
+            )
+            if await self._blocking(self.service.cache.version, key, options['max_age']):
+                return None
+
+        try:
+            result = await self.scrape_with_cache(
+                url=data['url'],
+                content_type=options['content_type'],
+                limit=options['limit'],
+                output_format=options['output_format'],
+                use_cache=options['use_cache'],
+                max_age=options['max_age'],
+                tenant=request_tenant(data, headers)
+            )
+        except Exception as e:
+            error = e
+
+            def prefetched():
+                raise error
+            return prefetched
+        return lambda: result
+
+
+class _Headers(dict):
+    """Case-insensitive view of ASGI request headers"""
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its complete request body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class MountedApps:
+    """WSGI app answering with primary for every path it routes and with fallback for the rest"""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def __call__(self, environ, start_response):
+        try:
+            self.primary.url_map.bind_to_environ(environ).match()
+        except NotFound:
+            return self.fallback(environ, start_response)
+        except HTTPException:
+            pass  # Wrong method or a redirect: the primary app answers it
+        return self.primary(environ, start_response)
+
+
+class AsgiApp:
+    """ASGI application: async scrapes on the loop, everything else through the Flask WSGI app"""
+
+    def __init__(self, wsgi_app, scraper, threads=ASYNC_THREADS):
+        self.wsgi_app = wsgi_app
+        self.scraper = scraper
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='flask-view')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                skraper_probe.refresh_async()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        body = bytes(body)
+
+        environ = wsgi_environ(scope, body)
+        if scope['method'] == 'POST' and scope['path'] == '/api/scrape':
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                data = None
+            headers = _Headers((name.decode('latin-1').lower(), value.decode('latin-1'))
+                               for name, value in scope.get('headers', []))
+            args = dict(parse_qsl(environ['QUERY_STRING']))
+            prefetched = await self.scraper.prefetch(data, headers, args)
+            if prefetched:
+                environ[PREFETCHED_SCRAPE] = prefetched
+
+        await self._call_wsgi(environ, receive, send)
+
+    async def _call_wsgi(self, environ, receive, send):
+        """Run the WSGI app on one thread, relaying its response as it is produced"""
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        disconnected = False
+
+        def put(message):
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        def start_response(status, headers, exc_info=None):
+            put(('start', int(status.split(' ', 1)[0]), headers))
+            return lambda data: put(('body', data))
+
+        def run():
+            # One thread for the whole response: streamed views keep their request context
+            try:
+                result = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if disconnected:
+                            break
+                        if chunk:
+                            put(('body', chunk))
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                put(('end',))
+            except BaseException as e:
+                put(('error', e))
+
+        async def watch_disconnect():
+            nonlocal disconnected
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected = True
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        worker = loop.run_in_executor(self._threads, run)
+        try:
+            while True:
+                message = await messages.get()
+                if message[0] == 'start':
+                    await send({
+                        'type': 'http.response.start',
+                        'status': message[1],
+                        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                    for name, value in message[2]]
+                    })
+                elif message[0] == 'body':
+                    await send({'type': 'http.response.body', 'body': message[1], 'more_body': True})
+                elif message[0] == 'end':
+                    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                    break
+                else:
+                    raise message[1]
+        finally:
+            watcher.cancel()
+            await worker
+
+
+# Same routes as gunicorn's app_enhanced:app, plus app.py's scrape API
+app = AsgiApp(MountedApps(enhanced_app, flask_app), AsyncSkraper(skraper_service))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: stdlib vs orjson encoding of enhanced scrape responses, full and projected
+
+Run from the repository root:
+    python benchmarks/bench_json_encoding.py
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from brand_analytics import BrandAnalytics
+from post_record import EnhancedPostRecord, PostJSONProvider
+from json_provider import OrjsonProvider, orjson
+from response_fields import project_response
+from app_enhanced import ENHANCED_SECTIONS
+
+CONTENTS = [
+    'Amazing product launch! 🚀 Our new collection is finally here. What do you think? #ProductLaunch #Innovation',
+    'Flash sale alert! 🔥 50% off everything for the next 24 hours. Don\'t miss out! #FlashSale #LimitedTime',
+    'Pro tip: Always test your assumptions. What worked yesterday might not work tomorrow. #BusinessAdvice',
+    'Behind the scenes look at our creative process ✨ Swipe to see how we bring ideas to life! #BTS',
+]
+
+
+def make_response(count, seed=11):
+    rng = random.Random(seed)
+    posts = []
+    for i in range(count):
+        content = CONTENTS[i % len(CONTENTS)]
+        posts.append(EnhancedPostRecord(
+            id=f"post_{i + 1}",
+            username='brand',
+            content=content,
+            timestamp=f"2024-01-{1 + i % 28:02d}T{i % 24:02d}:00:00Z",
+            likes=rng.randint(50, 5000),
+            comments=rng.randint(5, 200),
+            shares=rng.randint(0, 50),
+            media_url=f"https://example.com/media_{i + 1}.jpg",
+            caption=content,
+            hashtags=[word for word in content.split() if word.startswith('#')],
+            mentions=[],
+            media_type=rng.choice(['image', 'video', 'carousel'])
+        ))
+    return {
+        "metadata": {"url": "https://instagram.com/brand", "platform": "instagram", "total_posts": count},
+        "posts": posts,
+        **BrandAnalytics.from_posts(posts).report()
+    }
+
+
+def main():
+    app = Flask(__name__)
+    providers = [("stdlib jsonify", PostJSONProvider(app))]
+    if orjson:
+        providers.append(("orjson", OrjsonProvider(app)))
+    else:
+        print("orjson not installed; only the stdlib provider is measured")
+
+    print(f"{'payload':<30}{'provider':<16}{'ms/encode':>10}{'bytes':>12}")
+    for count in (100, 10000):
+        response = make_response(count)
+
+        def full():
+            return response
+
+        def projected():
+            # Projection is timed too: it is part of serving a fields=/include= request
+            return project_response(response, ('likes', 'hashtags'), {'posts'}, 'posts', ENHANCED_SECTIONS)
+
+        for label, payload in ((f"{count} posts, full", full),
+                               (f"{count} posts, likes+hashtags", projected)):
+            number = 200 if count == 100 else 3
+            for name, provider in providers:
+                with app.app_context():
+                    body = provider.response(payload()).get_data()
+                    seconds = timeit.timeit(lambda: provider.response(payload()), number=number)
+                print(f"{label:<30}{name:<16}{seconds / number * 1e3:>10.2f}{len(body):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent MediaFetcher vs. serial one-URL-at-a-time downloads
+
+Run from the repository root:
+    python benchmarks/bench_media_fetch.py [files] [latency_ms]
+
+Media is served by a local threaded HTTP server with Range / If-Range
+support and a fixed per-request latency, so no network is used. Also checks
+that duplicate content is stored once, that a second run downloads nothing
+and that an interrupted download resumes from its partial file.
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_fetcher import MediaFetcher, MediaStore, CHUNK_SIZE
+
+FILE_SIZE = 512 * 1024
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """GET /<name>: bytes of server.files[name], honouring Range when If-Range matches the ETag"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.server.files.get(self.path.lstrip('/'))
+        if body is None:
+            self.send_error(404)
+            return
+        time.sleep(self.server.latency)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range', etag) == etag:
+            start = int(range_header.split('=')[1].split('-')[0])
+        if self.path in self.server.truncate_once:
+            self.server.truncate_once.discard(self.path)
+            body = body[:len(body) // 2]  # Promise the full length, then hang up half-way
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.server.files[self.path.lstrip('/')])))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.send_header('Content-Length', str(len(body) - start))
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body[start:])
+        self.server.bytes_sent += len(body) - start
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(files, latency):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+    server.daemon_threads = True
+    server.files = files
+    server.latency = latency
+    server.truncate_once = set()
+    server.bytes_sent = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serial_download(urls, directory):
+    """What downstream jobs did: one requests.get per URL, whole body in memory"""
+    for i, url in enumerate(urls):
+        with open(os.path.join(directory, str(i)), 'wb') as f:
+            f.write(requests.get(url, timeout=30).content)
+
+
+def main(n=200, latency_ms=50):
+    # Every tenth file repeats an earlier one's content under another URL
+    files = {f"media_{i}.jpg": os.urandom(FILE_SIZE) for i in range(n)}
+    for i in range(0, n, 10):
+        files[f"copy_{i}.jpg"] = files[f"media_{i}.jpg"]
+    server = start_server(files, latency_ms / 1000.0)
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+    urls = [base + name for name in files]
+    work_dir = tempfile.mkdtemp(prefix='skraper-media-bench-')
+
+    try:
+        serial_dir = os.path.join(work_dir, 'serial')
+        os.makedirs(serial_dir)
+        started = time.perf_counter()
+        serial_download(urls, serial_dir)
+        serial_seconds = time.perf_counter() - started
+
+        fetcher = MediaFetcher(MediaStore(os.path.join(work_dir, 'store')), allow_private=True)
+        started = time.perf_counter()
+        first = fetcher.fetch_all(urls)
+        concurrent_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        second = fetcher.fetch_all(urls)
+        repeat_seconds = time.perf_counter() - started
+
+        statuses = {}
+        for result in first.values():
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        stats = fetcher.store.stats()
+
+        # Interrupted transfer: the first attempt gets half the body, the retry asks for the rest
+        resume_name = 'resume.jpg'
+        files[resume_name] = os.urandom(4 * CHUNK_SIZE)
+        server.truncate_once.add('/' + resume_name)
+        server.bytes_sent = 0
+        resumed = fetcher.fetch(base + resume_name)
+        resumed_ok = resumed.get('sha256') == hashlib.sha256(files[resume_name]).hexdigest()
+
+        print(f"{len(urls)} URLs of {FILE_SIZE // 1024} KiB, {latency_ms} ms server latency, "
+              f"{fetcher.workers} workers, {fetcher.per_host} per host")
+        print(f"  {'serial requests.get':<36}{serial_seconds:>10.2f} s")
+        print(f"  {'MediaFetcher.fetch_all':<36}{concurrent_seconds:>10.2f} s"
+              f"  ({serial_seconds / concurrent_seconds:.1f}x)")
+        print(f"  {'MediaFetcher.fetch_all (repeat)':<36}{repeat_seconds:>10.2f} s"
+              f"  ({sum(r['status'] == 'cached' for r in second.values())} cached)")
+        print(f"  statuses: {statuses}; stored {stats['files']} files for {stats['urls']} URLs")
+        print(f"  resumed download: {'ok' if resumed_ok else 'FAILED'}, "
+              f"{server.bytes_sent} of {len(files[resume_name])} bytes re-sent after the interruption")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 50)
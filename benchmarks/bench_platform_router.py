@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: compiled platform router vs. the old per-call regex loop
+
+Run from the repository root:
+    python benchmarks/bench_platform_router.py
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from platform_router import detect_platform, classify
+
+
+def legacy_detect_platform(url):
+    """The previous implementation: rebuild the pattern dict and regex-scan the whole URL"""
+    patterns = {
+        'instagram': r'(?:instagram\.com|instagr\.am)',
+        'tiktok': r'tiktok\.com',
+        'twitter': r'(?:twitter\.com|x\.com)',
+        'youtube': r'(?:youtube\.com|youtu\.be)',
+        'facebook': r'facebook\.com',
+        'reddit': r'reddit\.com',
+        'pinterest': r'pinterest\.com',
+        'flickr': r'flickr\.com',
+        'tumblr': r'tumblr\.com',
+        'telegram': r't\.me',
+        'twitch': r'twitch\.tv',
+        'vimeo': r'vimeo\.com',
+        'vk': r'vk\.com',
+        '9gag': r'9gag\.com',
+        'ifunny': r'ifunny\.co',
+        'coub': r'coub\.com',
+        'odnoklassniki': r'odnoklassniki\.ru',
+        'pikabu': r'pikabu\.ru'
+    }
+
+    for platform, pattern in patterns.items():
+        if re.search(pattern, url, re.IGNORECASE):
+            return platform
+
+    return None
+
+
+SAMPLE_URLS = [
+    'https://www.instagram.com/nike/',
+    'https://www.tiktok.com/@nike',
+    'https://twitter.com/nike',
+    'https://www.youtube.com/c/nike/videos',
+    'https://vimeo.com/channels/staffpicks',
+    'https://pikabu.ru/@someone',
+    'https://staff.tumblr.com/',
+    'https://t.me/durov',
+    'https://example.com/unsupported',
+]
+
+
+def main(number=20000):
+    urls = SAMPLE_URLS * 10
+    unique = [f"https://www.pikabu.ru/@user{i}" for i in range(len(urls))]
+
+    legacy = timeit.timeit(lambda: [legacy_detect_platform(u) for u in urls], number=number // 10)
+    cold = timeit.timeit(lambda: (detect_platform.cache_clear(), [detect_platform(u) for u in unique]),
+                         number=number // 10)
+    warm = timeit.timeit(lambda: classify(urls), number=number // 10)
+
+    calls = len(urls) * (number // 10)
+    print(f"{'implementation':<28}{'ns/call':>10}{'speedup':>10}")
+    for name, seconds in (("legacy regex loop", legacy),
+                          ("router, uncached URLs", cold),
+                          ("router, memoized (classify)", warm)):
+        print(f"{name:<28}{seconds / calls * 1e9:>10.0f}{legacy / seconds:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: columnar PostFrame vs. Python sum()/max() over lists of post dicts
+
+Run from the repository root:
+    python benchmarks/bench_post_frame.py [posts]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from post_frame import PostFrame
+
+
+def make_posts(n):
+    random.seed(42)
+    return [
+        {
+            "id": f"post_{i + 1}",
+            "content": "Sample post content #tag",
+            "timestamp": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00Z",
+            "likes": random.randint(50, 5000),
+            "comments": random.randint(5, 200),
+            "shares": random.randint(0, 50),
+            "media_url": "https://example.com/media.jpg",
+            "emoji_count": i % 3
+        }
+        for i in range(n)
+    ]
+
+
+def python_engagement(posts):
+    """The dict-based aggregation the analyzers used to do"""
+    total_likes = sum(post['likes'] for post in posts)
+    total_comments = sum(post['comments'] for post in posts)
+    total_shares = sum(post['shares'] for post in posts)
+    best = max(posts, key=lambda p: p['likes'] + p['comments'] + p['shares'])
+    worst = min(posts, key=lambda p: p['likes'] + p['comments'] + p['shares'])
+    engagement = sorted(p['likes'] + p['comments'] + p['shares'] for p in posts)
+    median = engagement[len(engagement) // 2]
+    return total_likes, total_comments, total_shares, best, worst, median
+
+
+def timed(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(n=100_000):
+    posts = make_posts(n)
+    frame = PostFrame.from_posts(posts)
+
+    rows = [
+        ("python sum/max/sort over dicts", timed(lambda: python_engagement(posts))),
+        ("PostFrame.from_posts (build once)", timed(lambda: PostFrame.from_posts(posts), repeat=2)),
+        ("  + timestamps parsed on first use", timed(lambda: PostFrame.from_posts(posts).timestamps, repeat=2)),
+        ("PostFrame.engagement_summary", timed(frame.engagement_summary)),
+        ("PostFrame.percentiles", timed(frame.percentiles)),
+        ("PostFrame.engagement_rate_distribution", timed(frame.engagement_rate_distribution)),
+        ("PostFrame.time_buckets('day')", timed(lambda: frame.time_buckets('day'))),
+        ("PostFrame.distribution_report", timed(frame.distribution_report)),
+    ]
+
+    print(f"{n} posts")
+    for name, ms in rows:
+        print(f"  {name:<42}{ms:>10.2f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
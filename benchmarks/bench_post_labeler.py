@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: one Aho-Corasick pass vs. the old per-lexicon substring scans
+
+Run from the repository root:
+    python benchmarks/bench_post_labeler.py
+"""
+
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from post_labeler import (PostLabeler, CTA_KEYWORDS, EMOJIS, THEME_KEYWORDS,
+                          POSITIVE_WORDS, NEGATIVE_WORDS)
+
+
+def legacy_label(text):
+    """The previous implementation: one `in` scan per keyword plus a per-character emoji scan"""
+    lower = text.lower()
+    return {
+        "cta_types": [keyword for keyword in CTA_KEYWORDS if keyword in lower],
+        "emoji_count": len([c for c in text if c in EMOJIS]),
+        "themes": [theme for theme, keywords in THEME_KEYWORDS.items()
+                   if any(keyword in lower for keyword in keywords)],
+        "positive_score": sum(1 for word in POSITIVE_WORDS if word in lower),
+        "negative_score": sum(1 for word in NEGATIVE_WORDS if word in lower)
+    }
+
+
+def make_posts(count, seed=7):
+    rng = random.Random(seed)
+    words = ['the', 'our', 'brand', 'today', 'with', 'you', 'and'] * 6
+    words += CTA_KEYWORDS + EMOJIS + POSITIVE_WORDS + NEGATIVE_WORDS
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(10, 60))) for _ in range(count)]
+
+
+def main(number=5):
+    posts = make_posts(2000)
+    labeler = PostLabeler()
+    assert [legacy_label(p) for p in posts] == labeler.label_posts(posts)
+
+    legacy = timeit.timeit(lambda: [legacy_label(p) for p in posts], number=number)
+    automaton = timeit.timeit(lambda: labeler.label_posts(posts), number=number)
+    build = timeit.timeit(PostLabeler, number=number)
+
+    calls = len(posts) * number
+    lexicon_size = len(CTA_KEYWORDS) + len(EMOJIS) + len(POSITIVE_WORDS) + len(NEGATIVE_WORDS) \
+        + sum(len(keywords) for keywords in THEME_KEYWORDS.values())
+    print(f"{lexicon_size} patterns, {len(posts)} posts")
+    print(f"{'implementation':<28}{'us/post':>10}{'speedup':>10}")
+    for name, seconds in (("legacy substring scans", legacy),
+                          ("aho-corasick single pass", automaton)):
+        print(f"{name:<28}{seconds / calls * 1e6:>10.1f}{legacy / seconds:>9.2f}x")
+    print(f"automaton build: {build / number * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
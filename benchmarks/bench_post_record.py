@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: slotted post records vs. the previous per-post dicts
+
+Run from the repository root:
+    python benchmarks/bench_post_record.py
+"""
+
+import os
+import sys
+import gc
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from post_labeler import get_labeler, call_to_action, sentiment_summary
+from post_record import PostRecord, EnhancedPostRecord
+
+CONTENTS = [
+    'Amazing product launch! 🚀 Our new collection is finally here. What do you think? #ProductLaunch #Innovation',
+    'Flash sale alert! 🔥 50% off everything for the next 24 hours. Don\'t miss out! #FlashSale #LimitedTime',
+    'Pro tip: Always test your assumptions. What worked yesterday might not work tomorrow. #BusinessAdvice',
+]
+
+
+def raw_item(i):
+    return {
+        "id": f"post_{i}",
+        "username": "brand",
+        "content": CONTENTS[i % len(CONTENTS)],
+        "timestamp": "2024-01-01T00:00:00Z",
+        "likes": 1000 + i,
+        "comments": 10 + i % 100,
+        "shares": i % 50,
+        "media_url": f"https://example.com/media_{i}.jpg",
+        "hashtags": ['#tag'],
+        "mentions": []
+    }
+
+
+def legacy_web_post(item, index):
+    """The previous format_post_item for dict items"""
+    return {
+        "id": item.get('id', f"post_{index + 1}"),
+        "username": item.get('username', 'unknown'),
+        "content": item.get('content', item.get('text', item.get('caption', ''))),
+        "timestamp": item.get('timestamp', item.get('created_at')),
+        "likes": item.get('likes', item.get('like_count', 0)),
+        "comments": item.get('comments', item.get('comment_count', 0)),
+        "shares": item.get('shares', item.get('share_count', 0)),
+        "media_url": item.get('media_url', item.get('image_url', item.get('video_url', ''))),
+        "caption": item.get('caption', ''),
+        "hashtags": item.get('hashtags', []),
+        "mentions": item.get('mentions', [])
+    }
+
+
+def legacy_enhanced_post(item, index):
+    """The previous enhanced mock post: every derived field materialized as nested dicts"""
+    post = legacy_web_post(item, index)
+    labels = get_labeler().label(post['content'])
+    post.update({
+        "caption": post['content'],
+        "media_type": 'image',
+        "post_length": len(post['content']),
+        "emoji_count": labels['emoji_count'],
+        "call_to_action": call_to_action(labels['cta_types']),
+        "sentiment": sentiment_summary(labels['positive_score'], labels['negative_score'])
+    })
+    return post
+
+
+def record_enhanced_post(item, index):
+    post = PostRecord.from_item(item, index)
+    return EnhancedPostRecord(
+        id=post.id, username=post.username, content=post.content, timestamp=post.timestamp,
+        likes=post.likes, comments=post.comments, shares=post.shares, media_url=post.media_url,
+        caption=post.content, hashtags=post.hashtags, mentions=post.mentions, media_type='image'
+    )
+
+
+def bytes_per_post(build, items, touch=None):
+    """Net bytes retained per post while a list of built posts is alive"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    posts = [build(item, i) for i, item in enumerate(items)]
+    if touch:
+        for post in posts:
+            touch(post)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(posts)
+
+
+def main(count=20000):
+    items = [raw_item(i) for i in range(count)]
+
+    def analyze(post):
+        return post['call_to_action'], post['sentiment'], post['emoji_count']
+
+    rows = [
+        ("web: dict", bytes_per_post(legacy_web_post, items)),
+        ("web: PostRecord", bytes_per_post(PostRecord.from_item, items)),
+        ("enhanced: dict", bytes_per_post(legacy_enhanced_post, items)),
+        ("enhanced: record, unlabeled", bytes_per_post(record_enhanced_post, items)),
+        ("enhanced: record, labeled", bytes_per_post(record_enhanced_post, items, touch=analyze)),
+    ]
+    print(f"{count} posts (shared strings and lists are not counted per post)")
+    print(f"{'layout':<30}{'bytes/post':>12}")
+    for name, size in rows:
+        print(f"{name:<30}{size:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the scrape and analysis hot paths
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 10,1000 --compare benchmarks/results/<earlier run>.json
+
+Covers URL routing, post formatting, every EnhancedSkraperService analyzer at
+10, 1k and 100k posts, and full request latency through the Flask test
+client. Upstream calls go to benchmarks/stub/skraper, so subprocess and pool
+overhead are included without any network. Results are written as JSON to
+benchmarks/results/ for comparison between runs. A few behaviour checks run
+alongside and fail the run if a fast path returns the wrong answer.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_DIR = os.path.join(ROOT, 'benchmarks', 'stub')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = (10, 1000, 100000)
+BENCH_PLATFORMS = ('instagram', 'tiktok', 'twitter', 'youtube')
+
+
+def isolate_environment(stub_delay):
+    """Private state directory, the stub on PATH and no upstream rate limiting; call before importing the apps"""
+    state_dir = tempfile.mkdtemp(prefix='skraper-bench-')
+    for name, filename in (('SKRAPER_CACHE_DB', 'cache.db'), ('SKRAPER_JOBS_DB', 'jobs.db'),
+                           ('SKRAPER_RATE_DB', 'ratelimit.db'), ('SKRAPER_ANALYTICS_DB', 'analytics.db'),
+                           ('SKRAPER_POSTS_DB', 'posts.db'), ('SKRAPER_METRICS_DB', 'metrics.db')):
+        os.environ[name] = os.path.join(state_dir, filename)
+    for name, dirname in (('SKRAPER_PAGES_DIR', 'pages'), ('SKRAPER_LOCK_DIR', 'locks'),
+                          ('SKRAPER_MEDIA_DIR', 'media'), ('SKRAPER_PROFILE_DIR', 'profiles')):
+        os.environ[name] = os.path.join(state_dir, dirname)
+    os.environ['SKRAPER_PROBE_FILE'] = os.path.join(state_dir, 'probe.json')  # Probe the stub, not the host's binary
+    os.environ['SKRAPER_RATE_LIMITS'] = ",".join(f"{name}=1000000:1000000" for name in BENCH_PLATFORMS)
+    os.environ['SKRAPER_STUB_DELAY'] = str(stub_delay)
+    os.environ['PATH'] = STUB_DIR + os.pathsep + os.environ.get('PATH', '')
+    os.environ.pop('SKRAPER_POOL_SOCKET', None)
+    return state_dir
+
+
+def measure(func, setup=None, repeat=5, min_sample=0.05):
+    """Seconds per call of func(arg) with arg = setup() prepared outside the timer
+
+    Fast calls are batched until one sample takes at least min_sample seconds.
+    """
+    arg = setup() if setup else None
+    start = time.perf_counter()
+    func(arg)
+    first = time.perf_counter() - start
+    number = max(1, int(min_sample / first)) if first > 0 else 1000
+
+    samples = []
+    for _ in range(repeat):
+        args = [setup() if setup else None for _ in range(number)]
+        start = time.perf_counter()
+        for arg in args:
+            func(arg)
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+def summarize(samples, items=None):
+    median = statistics.median(samples)
+    result = {
+        "seconds": median,
+        "min_seconds": min(samples),
+        "mean_seconds": statistics.mean(samples),
+        "samples": len(samples)
+    }
+    if items:
+        result["items"] = items
+        result["us_per_item"] = median / items * 1e6
+    return result
+
+
+class Suite:
+    def __init__(self, sizes, repeat):
+        self.sizes = sizes
+        self.repeat = repeat
+        self.results = {}
+
+    def record(self, name, samples, items=None):
+        self.results[name] = summarize(samples, items)
+        entry = self.results[name]
+        per_item = f"{entry['us_per_item']:>12.2f} us/item" if items else ""
+        print(f"{name:<52}{entry['seconds'] * 1e3:>12.3f} ms{per_item}", flush=True)
+
+    def repeat_for(self, size):
+        return 3 if size >= 100000 else self.repeat
+
+    # URL handling and formatting (app.py)
+
+    def bench_routing(self, app_module, enhanced_module, size):
+        rng = random.Random(size)
+        urls = [
+            f"https://www.{rng.choice(['instagram.com', 'tiktok.com', 'twitter.com', 'youtube.com'])}/user{i}/"
+            for i in range(size)
+        ]
+        service = app_module.skraper_service
+        enhanced = enhanced_module.skraper_service
+        platforms = [service.detect_platform(url) for url in urls]
+        repeat = self.repeat_for(size)
+
+        self.record(f"detect_platform@{size}",
+                    measure(lambda _: [service.detect_platform(url) for url in urls], repeat=repeat), size)
+        self.record(f"extract_path_from_url@{size}",
+                    measure(lambda _: [service.extract_path_from_url(u, p) for u, p in zip(urls, platforms)],
+                            repeat=repeat), size)
+        self.record(f"enhanced.extract_path_from_url@{size}",
+                    measure(lambda _: [enhanced.extract_path_from_url(u, p) for u, p in zip(urls, platforms)],
+                            repeat=repeat), size)
+
+    def bench_formatting(self, app_module, size):
+        stub = subprocess.run(
+            [os.path.join(STUB_DIR, 'skraper'), 'youtube', '/c/bench', '-n', str(size), '-t', 'json'],
+            capture_output=True, text=True, check=True, env=dict(os.environ, SKRAPER_STUB_DELAY='0')
+        )
+        raw = json.loads(stub.stdout)
+        service = app_module.skraper_service
+        repeat = self.repeat_for(size)
+
+        self.record(f"format_post_item@{size}",
+                    measure(lambda _: [service.format_post_item(item, 'youtube', i) for i, item in enumerate(raw)],
+                            repeat=repeat), size)
+        self.record(f"format_results_for_web@{size}",
+                    measure(lambda _: service.format_results_for_web(raw, 'https://youtube.com/c/bench',
+                                                                     'youtube', size),
+                            repeat=repeat), size)
+
+    # Enhanced analyzers (app_enhanced.py)
+
+    def bench_analyzers(self, enhanced_module, size):
+        service = enhanced_module.skraper_service
+        templates = []
+        for name in BENCH_PLATFORMS[:3]:
+            templates.extend(service.generate_enhanced_mock_data(name, f"https://{name}.com/brand", 20))
+
+        def fresh_posts():
+            # New records every sample so lazily derived labels are recomputed
+            rng = random.Random(size)
+            record_type = type(templates[0])
+            return [
+                record_type(
+                    id=f"post_{i + 1}", username='brand', content=t.content, timestamp=t.timestamp,
+                    likes=rng.randint(50, 5000), comments=rng.randint(5, 200), shares=rng.randint(0, 50),
+                    media_url=t.media_url, caption=t.content, hashtags=t.hashtags, mentions=t.mentions,
+                    media_type=t.media_type
+                )
+                for i, t in ((i, templates[i % len(templates)]) for i in range(size))
+            ]
+
+        contents = [post.content for post in fresh_posts()]
+        repeat = self.repeat_for(size)
+        labeled = fresh_posts()
+        brand_voice = service.analyze_brand_voice(labeled)
+        engagement = service.analyze_engagement_patterns(labeled)
+        words = enhanced_module.BrandAnalytics.from_posts(labeled).words
+
+        per_post = {
+            "detect_call_to_action": service.detect_call_to_action,
+            "analyze_sentiment": service.analyze_sentiment,
+            "extract_hashtags": service.extract_hashtags,
+            "extract_mentions": service.extract_mentions,
+        }
+        for name, analyzer in per_post.items():
+            self.record(f"{name}@{size}",
+                        measure(lambda _, analyzer=analyzer: [analyzer(content) for content in contents],
+                                repeat=repeat), size)
+
+        whole = {
+            "analyze_brand_voice": service.analyze_brand_voice,
+            "analyze_engagement_patterns": service.analyze_engagement_patterns,
+            "analyze_content_themes": service.analyze_content_themes,
+            "generate_ai_recommendations": lambda posts: service.generate_ai_recommendations(posts, brand_voice,
+                                                                                             engagement),
+            "generate_content_ideas": lambda posts: service.generate_content_ideas(posts, brand_voice),
+        }
+        for name, analyzer in whole.items():
+            self.record(f"{name}@{size}", measure(analyzer, setup=fresh_posts, repeat=repeat), size)
+
+        self.record(f"identify_themes@{size}", measure(lambda _: service.identify_themes(words), repeat=repeat))
+
+    # Full requests through the Flask test client
+
+    def bench_requests(self, app_module, enhanced_module):
+        app_module.skraper_service.skraper_path = os.path.join(STUB_DIR, 'skraper')
+        client = app_module.app.test_client()
+        enhanced_client = enhanced_module.app.test_client()
+        scrape = {"url": "https://youtube.com/c/bench", "limit": 100}
+        cases = [
+            ("POST /api/scrape (stub skraper, no cache)", client,
+             '/api/scrape', dict(scrape, cache=False), {}),
+            ("POST /api/scrape (cache hit)", client, '/api/scrape', scrape, {}),
+            ("POST /api/scrape (NDJSON stream, no cache)", client,
+             '/api/scrape', dict(scrape, cache=False), {"Accept": "application/x-ndjson"}),
+            ("POST /api/scrape (cache hit, gzip)", client, '/api/scrape', scrape, {"Accept-Encoding": "gzip"}),
+            ("POST /api/scrape/enhanced (no cache)", enhanced_client,
+             '/api/scrape/enhanced', {"url": "https://instagram.com/brand", "limit": 20, "cache": False}, {}),
+            ("POST /api/scrape/enhanced (cache hit)", enhanced_client,
+             '/api/scrape/enhanced', {"url": "https://instagram.com/brand", "limit": 20}, {}),
+            ("POST /api/ai-agent/brand-analysis (no cache)", enhanced_client,
+             '/api/ai-agent/brand-analysis', {"url": "https://instagram.com/brand", "cache": False}, {}),
+        ]
+        for name, test_client, path, body, headers in cases:
+            def call(_, test_client=test_client, path=path, body=body, headers=headers):
+                response = test_client.post(path, json=body, headers=headers)
+                response.get_data()  # Drain streamed bodies
+                if response.status_code != 200:
+                    raise Exception(f"{path} returned {response.status_code}: {response.get_data()[:200]}")
+            self.record(name, measure(call, repeat=self.repeat, min_sample=0.2))
+
+    # Behaviour checks: fail the run instead of timing a wrong answer
+
+    def check_since_last(self, app_module):
+        """since=last with an old pinned post at the top of the profile still finds new posts"""
+        client = app_module.app.test_client()
+        pinned = {"id": "pinned", "text": "Pinned welcome post", "created_at": "2020-01-01T00:00:00Z"}
+        posts = [{"id": f"post_{i}", "text": f"Post {i}", "created_at": f"2024-06-{i:02d}T12:00:00Z"}
+                 for i in range(9, 0, -1)]
+        fixture = os.path.join(tempfile.mkdtemp(prefix='skraper-bench-fixture-'), 'posts.json')
+        os.environ['SKRAPER_STUB_FIXTURE'] = fixture
+        try:
+            new_posts = []
+            # First run sets the mark at post_6; the second sees post_9..post_7 above it
+            for listed in (posts[3:], posts):
+                with open(fixture, 'w') as f:
+                    json.dump([pinned] + listed, f)
+                response = client.post('/api/scrape', json={"url": "https://youtube.com/c/pinned",
+                                                             "limit": len(listed) + 1, "since": "last"})
+                if response.status_code != 200:
+                    raise Exception(f"since=last returned {response.status_code}: {response.get_data()[:200]}")
+                new_posts.append([post['id'] for post in response.get_json()['data']])
+        finally:
+            os.environ.pop('SKRAPER_STUB_FIXTURE', None)
+            shutil.rmtree(os.path.dirname(fixture), ignore_errors=True)
+        if new_posts[1] != ['post_9', 'post_8', 'post_7']:
+            raise Exception(f"since=last behind a pinned post returned {new_posts[1]}")
+        print(f"{'since=last behind a pinned post':<52}{'ok':>15}", flush=True)
+
+    def run(self, app_module, enhanced_module):
+        for size in self.sizes:
+            print(f"\n-- {size} posts", flush=True)
+            self.bench_routing(app_module, enhanced_module, size)
+            self.bench_formatting(app_module, size)
+            self.bench_analyzers(enhanced_module, size)
+        print("\n-- requests", flush=True)
+        self.bench_requests(app_module, enhanced_module)
+        self.check_since_last(app_module)
+        return self.results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    print(f"\n{'benchmark':<52}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name, entry in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['seconds'], entry['seconds']
+        print(f"{name:<52}{before * 1e3:>14.3f}{after * 1e3:>14.3f}{(after / before - 1) * 100:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated post counts")
+    parser.add_argument('--repeat', type=int, default=5, help="samples per benchmark")
+    parser.add_argument('--stub-delay', type=float, default=0.0, help="seconds the stub skraper sleeps per call")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    state_dir = isolate_environment(args.stub_delay)
+
+    import logging
+    logging.disable(logging.INFO)  # Per-request command logging would dominate the output
+    import app as app_module
+    import app_enhanced as enhanced_module
+
+    try:
+        results = Suite(sizes, args.repeat).run(app_module, enhanced_module)
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "sizes": sizes,
+        "stub_delay": args.stub_delay,
+        "results": results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Brand Analytics Engine
+Single-pass accumulator behind the enhanced brand analysis
+
+Every metric of the voice, engagement and theme analysis, plus the AI agent
+recommendations, is derived from running aggregates collected in one walk
+over the posts, with one tokenization per post.
+"""
+
+import re
+from collections import Counter
+
+from post_labeler import get_labeler
+
+# Assumed follower count used for the engagement rate
+BASELINE_FOLLOWERS = 10000
+
+_WORD = re.compile(r'\b\w+\b')
+
+# Aggregate groups: voice (text labels), engagement (counts, best/worst posts), themes (words, hashtags, media)
+ANALYTICS_PARTS = ('voice', 'engagement', 'themes')
+
+
+# Post fields kept for best/worst posts when state is serialized
+_POST_SUMMARY_FIELDS = ('id', 'media_type')
+
+
+def _engagement(post):
+    return post['likes'] + post['comments'] + post['shares']
+
+
+def identify_themes(word_counter):
+    """Identify content themes from words
+
+    A theme is present when one of its keywords occurs inside any word seen.
+    """
+    return get_labeler().label(" ".join(word_counter))['themes']
+
+
+class BrandAnalytics:
+    """Accumulates every brand analysis aggregate in a single pass over posts"""
+
+    def __init__(self, parts=ANALYTICS_PARTS):
+        self.parts = frozenset(parts)
+        self.post_count = 0
+        self.total_length = 0
+        self.total_emojis = 0
+        self.cta_posts = 0
+        self.total_likes = 0
+        self.total_comments = 0
+        self.total_shares = 0
+        self.total_hashtags = 0
+        self.sentiments = Counter()
+        self.words = Counter()
+        self.hashtags = Counter()
+        self.media_types = Counter()
+        self.best_post = None
+        self.worst_post = None
+        self._best_engagement = None
+        self._worst_engagement = None
+
+    @classmethod
+    def from_posts(cls, posts, parts=ANALYTICS_PARTS):
+        analytics = cls(parts)
+        for post in posts:
+            analytics.add(post)
+        return analytics
+
+    def add(self, post):
+        """Fold one post into the aggregates of the enabled parts"""
+        parts = self.parts
+        self.post_count += 1
+        self.total_hashtags += len(post['hashtags'])
+
+        if 'voice' in parts:
+            self.total_length += len(post['content'])
+            self.total_emojis += post['emoji_count']
+            self.cta_posts += 1 if post['call_to_action']['has_cta'] else 0
+            self.sentiments[post['sentiment']['sentiment']] += 1
+
+        if 'engagement' in parts:
+            engagement = _engagement(post)
+            self.total_likes += post['likes']
+            self.total_comments += post['comments']
+            self.total_shares += post['shares']
+
+            # Strict comparisons keep the first post on ties, like max()/min()
+            if self._best_engagement is None or engagement > self._best_engagement:
+                self.best_post, self._best_engagement = post, engagement
+            if self._worst_engagement is None or engagement < self._worst_engagement:
+                self.worst_post, self._worst_engagement = post, engagement
+
+        if 'themes' in parts:
+            self.words.update(_WORD.findall(post['content'].lower()))
+            self.hashtags.update(post['hashtags'])
+            self.media_types[post['media_type']] += 1
+
+    def merge(self, other):
+        """Fold another accumulator into this one, as if its posts were added after ours"""
+        if other.parts != self.parts:
+            raise Exception("Cannot merge analytics collected for different parts")
+        self.post_count += other.post_count
+        self.total_length += other.total_length
+        self.total_emojis += other.total_emojis
+        self.cta_posts += other.cta_posts
+        self.total_likes += other.total_likes
+        self.total_comments += other.total_comments
+        self.total_shares += other.total_shares
+        self.total_hashtags += other.total_hashtags
+        self.sentiments.update(other.sentiments)
+        self.words.update(other.words)
+        self.hashtags.update(other.hashtags)
+        self.media_types.update(other.media_types)
+
+        if other.best_post is not None and (self._best_engagement is None or other._best_engagement > self._best_engagement):
+            self.best_post, self._best_engagement = other.best_post, other._best_engagement
+        if other.worst_post is not None and (self._worst_engagement is None or other._worst_engagement < self._worst_engagement):
+            self.worst_post, self._worst_engagement = other.worst_post, other._worst_engagement
+        return self
+
+    def subtract(self, other):
+        """Take out the sums and counts of an accumulator merged in earlier
+
+        Best and worst posts cannot be un-merged; the caller picks them again
+        when the removed accumulator held either.
+        """
+        if other.parts != self.parts:
+            raise Exception("Cannot subtract analytics collected for different parts")
+        self.post_count -= other.post_count
+        self.total_length -= other.total_length
+        self.total_emojis -= other.total_emojis
+        self.cta_posts -= other.cta_posts
+        self.total_likes -= other.total_likes
+        self.total_comments -= other.total_comments
+        self.total_shares -= other.total_shares
+        self.total_hashtags -= other.total_hashtags
+        self.sentiments -= other.sentiments  # Counter subtraction drops keys that reach zero
+        self.words -= other.words
+        self.hashtags -= other.hashtags
+        self.media_types -= other.media_types
+        return self
+
+    def to_state(self):
+        """JSON-serializable aggregates; best/worst posts keep only what the report reads"""
+        def summary(post):
+            if post is None:
+                return None
+            kept = {field: post[field] for field in _POST_SUMMARY_FIELDS}
+            kept['content'] = post['content'][:50]  # Only the preview is reported
+            return kept
+
+        return {
+            "post_count": self.post_count,
+            "total_length": self.total_length,
+            "total_emojis": self.total_emojis,
+            "cta_posts": self.cta_posts,
+            "total_likes": self.total_likes,
+            "total_comments": self.total_comments,
+            "total_shares": self.total_shares,
+            "total_hashtags": self.total_hashtags,
+            "sentiments": dict(self.sentiments),
+            "words": dict(self.words),
+            "hashtags": dict(self.hashtags),
+            "media_types": dict(self.media_types),
+            "best_post": summary(self.best_post),
+            "worst_post": summary(self.worst_post),
+            "best_engagement": self._best_engagement,
+            "worst_engagement": self._worst_engagement,
+            "parts": sorted(self.parts)
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        analytics = cls(state.get('parts', ANALYTICS_PARTS))
+        for field in ('post_count', 'total_length', 'total_emojis', 'cta_posts',
+                      'total_likes', 'total_comments', 'total_shares', 'total_hashtags',
+                      'best_post', 'worst_post'):
+            setattr(analytics, field, state[field])
+        for field in ('sentiments', 'words', 'hashtags', 'media_types'):
+            setattr(analytics, field, Counter(state[field]))
+        analytics._best_engagement = state['best_engagement']
+        analytics._worst_engagement = state['worst_engagement']
+        return analytics
+
+    def _require_posts(self, *parts):
+        if not self.post_count:
+            raise Exception("No posts to analyze")
+        missing = [part for part in parts if part not in self.parts]
+        if missing:
+            raise Exception(f"Analytics were collected without: {', '.join(missing)}")
+        return self.post_count
+
+    def voice_analysis(self):
+        """Analyze brand voice patterns"""
+        n = self._require_posts('voice')
+        avg_length = self.total_length / n
+        avg_emojis = self.total_emojis / n
+        cta_frequency = self.cta_posts / n
+
+        return {
+            "average_caption_length": round(avg_length, 1),
+            "average_emoji_count": round(avg_emojis, 2),
+            "cta_frequency": round(cta_frequency, 2),
+            "sentiment_distribution": dict(self.sentiments),
+            "primary_sentiment": self.sentiments.most_common(1)[0][0],
+            "tone_indicators": {
+                "professional": avg_length > 100,
+                "casual": avg_emojis > 1,
+                "engaging": cta_frequency > 0.3,
+                "positive": self.sentiments.get("positive", 0) > n * 0.6
+            }
+        }
+
+    def engagement_patterns(self):
+        """Analyze engagement patterns"""
+        n = self._require_posts('engagement')
+        total = self.total_likes + self.total_comments + self.total_shares
+
+        return {
+            "total_engagement": {
+                "likes": self.total_likes,
+                "comments": self.total_comments,
+                "shares": self.total_shares
+            },
+            "average_engagement": {
+                "likes": round(self.total_likes / n, 1),
+                "comments": round(self.total_comments / n, 1),
+                "shares": round(self.total_shares / n, 1)
+            },
+            "engagement_rate": round((total / n) / BASELINE_FOLLOWERS, 4),
+            "best_performing_post": {
+                "id": self.best_post['id'],
+                "engagement": self._best_engagement,
+                "content_preview": self.best_post['content'][:50] + "..."
+            },
+            "worst_performing_post": {
+                "id": self.worst_post['id'],
+                "engagement": self._worst_engagement,
+                "content_preview": self.worst_post['content'][:50] + "..."
+            }
+        }
+
+    def content_themes(self):
+        """Analyze content themes and patterns"""
+        n = self._require_posts('themes')
+        hashtags = list(self.hashtags)
+
+        return {
+            "most_common_words": dict(self.words.most_common(10)),
+            "most_used_hashtags": dict(self.hashtags.most_common(10)),
+            "media_type_distribution": dict(self.media_types),
+            "content_themes": identify_themes(self.words),
+            "hashtag_strategy": {
+                "branded_hashtags": len([h for h in hashtags if 'brand' in h.lower()]),
+                "trending_hashtags": len([h for h in hashtags if len(h) > 10]),
+                "average_hashtags_per_post": self.total_hashtags / n
+            }
+        }
+
+    def overall_performance(self):
+        n = self._require_posts('engagement')
+        return {
+            "total_likes": self.total_likes,
+            "total_comments": self.total_comments,
+            "total_shares": self.total_shares,
+            "average_engagement_per_post": (self.total_likes + self.total_comments + self.total_shares) / n
+        }
+
+    def recommendations(self, brand_voice=None, engagement_patterns=None):
+        """Generate recommendations for AI agent"""
+        brand_voice = brand_voice or self.voice_analysis()
+        engagement_patterns = engagement_patterns or self.engagement_patterns()
+
+        return {
+            "content_strategy": {
+                "optimal_post_length": brand_voice['average_caption_length'],
+                "recommended_emoji_usage": brand_voice['average_emoji_count'],
+                "cta_frequency": brand_voice['cta_frequency'],
+                "tone_guidelines": brand_voice['tone_indicators']
+            },
+            "engagement_optimization": {
+                "best_performing_content_type": engagement_patterns['best_performing_post']['content_preview'],
+                "engagement_rate": engagement_patterns['engagement_rate'],
+                "optimal_hashtag_count": self.total_hashtags / self._require_posts()
+            },
+            "brand_voice_guidelines": {
+                "primary_tone": brand_voice['primary_sentiment'],
+                "formality_level": "semi_formal" if brand_voice['average_caption_length'] > 100 else "casual",
+                "emoji_strategy": "moderate" if brand_voice['average_emoji_count'] > 1 else "minimal",
+                "cta_approach": "frequent" if brand_voice['cta_frequency'] > 0.3 else "occasional"
+            },
+            "content_ideas": self.content_ideas(brand_voice)
+        }
+
+    def content_ideas(self, brand_voice=None):
+        """Generate content ideas based on analysis"""
+        brand_voice = brand_voice or self.voice_analysis()
+        self._require_posts('engagement')
+        ideas = []
+
+        # Based on brand voice
+        if brand_voice['tone_indicators'].get('professional', False):
+            ideas.append("Industry insights and thought leadership content")
+            ideas.append("Behind-the-scenes of business operations")
+
+        if brand_voice['tone_indicators'].get('casual', False):
+            ideas.append("Team culture and workplace content")
+            ideas.append("User-generated content and community features")
+
+        if brand_voice['tone_indicators'].get('engaging', False):
+            ideas.append("Interactive polls and Q&A sessions")
+            ideas.append("Challenges and contests")
+
+        # Based on performance
+        if self.best_post['media_type'] == 'video':
+            ideas.append("More video content and tutorials")
+        else:
+            ideas.append("High-quality image carousels")
+
+        return ideas
+
+    def report(self):
+        """brand_analysis and ai_agent_recommendations blocks of the enhanced response"""
+        brand_voice = self.voice_analysis()
+        engagement_patterns = self.engagement_patterns()
+
+        return {
+            "brand_analysis": {
+                "voice_analysis": brand_voice,
+                "engagement_patterns": engagement_patterns,
+                "content_themes": self.content_themes(),
+                "overall_performance": self.overall_performance()
+            },
+            "ai_agent_recommendations": self.recommendations(brand_voice, engagement_patterns)
+        }
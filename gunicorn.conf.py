@@ -0,0 +1,33 @@
+"""
+Gunicorn hooks - probes the Skraper binary once for the whole host and, when
+the served app runs Skraper through the pool (app:app), hosts the shared
+Skraper pool in the master process so every web worker on the host draws
+from the same slots
+"""
+
+import os
+
+# App modules whose scrapes go through skraper_pool
+POOL_APPS = {'app'}
+
+
+def when_ready(server):
+    from skraper_probe import skraper_probe
+
+    # Workers read the cached result; none of them has to start a JVM to fill it
+    skraper_probe.refresh_async()
+
+    app_uri = getattr(server.app, 'app_uri', None) or server.cfg.wsgi_app or ''
+    if app_uri.split(':')[0] not in POOL_APPS:
+        return
+
+    from skraper_pool import start_pool_server, POOL_SOCKET
+    server.skraper_pool = start_pool_server(POOL_SOCKET)
+    # Web workers are forked after this point and inherit the socket path
+    os.environ['SKRAPER_POOL_SOCKET'] = POOL_SOCKET
+
+
+def on_exit(server):
+    pool_server = getattr(server, 'skraper_pool', None)
+    if pool_server:
+        pool_server.close()
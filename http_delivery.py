@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Response Delivery
+gzip / brotli compression negotiated from Accept-Encoding, and ETags for conditional requests
+
+ETags identify a version of a cached scrape result (cache key, the time the
+entry was written, and the requested projection), so If-None-Match can be
+answered with 304 before the result is loaded or serialized. They are weak
+because the body also carries per-request metadata such as the cache age.
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import logging
+
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_BYTES = int(os.environ.get('SKRAPER_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('SKRAPER_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('SKRAPER_BROTLI_QUALITY', 5))  # Higher levels cost too much CPU per response
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain')
+
+
+def negotiate_encoding(accept_encoding):
+    """Best supported content coding for an Accept-Encoding header, or None"""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    supported = ['br', 'gzip'] if brotli else ['gzip']
+    candidates = [
+        (weights.get(coding, weights.get('*', 0.0)), -rank, coding)
+        for rank, coding in enumerate(supported)
+    ]
+    q, _, coding = max(candidates)
+    return coding if q > 0 else None
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encoding):
+    """Compress a complete, compressible 200 response in place"""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = negotiate_encoding(accept_encoding)
+    if not encoding:
+        return response
+
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    """Compress every eligible response of app"""
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+
+
+def resource_etag(key, version, *variant):
+    """ETag value for one version of a cached result and one projection of it"""
+    return hashlib.sha1(json.dumps([key, version, variant], default=str).encode()).hexdigest()
+
+
+def not_modified(etag):
+    """304 response for a matching If-None-Match; no body is built"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def matches_etag(etag):
+    """Whether the request's If-None-Match covers etag"""
+    return etag is not None and request.if_none_match.contains_weak(etag)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+JSON Encoding
+Pluggable Flask JSON provider: orjson when it is installed, stdlib otherwise
+
+Select with SKRAPER_JSON_PROVIDER=orjson|stdlib (default: orjson if
+available). Both providers sort keys and serialize post records, so
+responses only differ in that orjson writes non-ASCII text as raw UTF-8
+instead of \\u escapes.
+"""
+
+import os
+import logging
+
+from post_record import PostJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_PROVIDER = os.environ.get('SKRAPER_JSON_PROVIDER', 'orjson' if orjson else 'stdlib')
+
+
+class OrjsonProvider(PostJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    option = orjson.OPT_SORT_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode()
+        except TypeError:
+            # Out-of-range integers and other values orjson rejects
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.option
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        try:
+            body = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def make_json_provider(app, name=JSON_PROVIDER):
+    """JSON provider for app by name ('orjson' or 'stdlib')"""
+    if name == 'orjson':
+        if orjson:
+            return OrjsonProvider(app)
+        logger.warning("orjson is not installed, using the stdlib JSON provider")
+    return PostJSONProvider(app)
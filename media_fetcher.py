@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Media Fetcher
+Concurrent downloads of post media into a content-addressed store on local disk
+
+Each worker thread keeps its own pooled requests.Session, and at most
+SKRAPER_MEDIA_PER_HOST downloads hit one host at a time. Bodies are streamed
+to a partial file while they are hashed; an interrupted download resumes with
+a Range request (guarded by If-Range) on the next attempt; the partial file
+is flock'ed, so only one thread or process downloads a given URL at a time
+and the others wait and then find it stored. Finished files are
+stored once under their SHA-256, so the same image reached through different
+URLs is kept once, and a URL fetched before is not downloaded again.
+
+URLs come from clients and from scraped posts, so every connection (for
+each redirect hop too) resolves its host, refuses it when any address is
+loopback, private, link-local or otherwise non-public, and then dials the
+checked address itself: a DNS answer that changes between check and connect
+cannot redirect the request. Environment proxies are not used for media.
+
+The store is kept under SKRAPER_MEDIA_MAX_TOTAL_BYTES by deleting the least
+recently fetched or served files first.
+"""
+
+import os
+import re
+import json
+import fcntl
+import socket
+import ipaddress
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+MEDIA_DIR = os.environ.get('SKRAPER_MEDIA_DIR', os.path.join(tempfile.gettempdir(), 'skraper-media'))
+MEDIA_WORKERS = int(os.environ.get('SKRAPER_MEDIA_WORKERS', 16))
+MEDIA_PER_HOST = int(os.environ.get('SKRAPER_MEDIA_PER_HOST', 4))
+MEDIA_TIMEOUT = float(os.environ.get('SKRAPER_MEDIA_TIMEOUT', 30))
+MEDIA_MAX_BYTES = int(os.environ.get('SKRAPER_MEDIA_MAX_BYTES', 200 * 1024 * 1024))
+MEDIA_MAX_TOTAL_BYTES = int(os.environ.get('SKRAPER_MEDIA_MAX_TOTAL_BYTES', 2 * 1024 * 1024 * 1024))
+MEDIA_ALLOW_PRIVATE = os.environ.get('SKRAPER_MEDIA_ALLOW_PRIVATE', '').lower() in ('1', 'true')
+MEDIA_ATTEMPTS = 3
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 256 * 1024
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Content types served back under their own type; anything else is served as an attachment
+SERVABLE_MEDIA_PREFIXES = ('image/', 'video/', 'audio/')
+UNSERVABLE_MEDIA_TYPES = {'image/svg+xml'}  # SVG can carry scripts
+
+
+def servable_media_type(content_type):
+    """The media type of an upstream Content-Type if it is safe to serve from our origin, else None"""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type.startswith(SERVABLE_MEDIA_PREFIXES) and media_type not in UNSERVABLE_MEDIA_TYPES:
+        return media_type
+    return None
+
+
+class MediaTooLarge(Exception):
+    """A media file is larger than SKRAPER_MEDIA_MAX_BYTES"""
+
+
+class MediaBlocked(Exception):
+    """A media URL points at a host the service must not reach"""
+
+
+def public_addresses(host, port):
+    """Addresses host resolves to, in resolver order; MediaBlocked unless every one of them is public"""
+    try:
+        addresses = list(dict.fromkeys(
+            info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+        ))
+    except socket.gaierror as e:
+        raise MediaBlocked(f"Cannot resolve {host}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise MediaBlocked(f"{host} resolves to a non-public address ({ip})")
+    return addresses
+
+
+class _PublicConnectionMixin:
+    """Dials only addresses checked by public_addresses, while Host, SNI and certificate checks keep the name"""
+
+    def _new_conn(self):
+        error = None
+        for address in public_addresses(self.host, self.port):
+            self._dns_host = address  # What urllib3 connects to; self.host is left as the URL's name
+            try:
+                return super()._new_conn()
+            except (NewConnectionError, ConnectTimeoutError) as e:
+                error = e  # Try the next checked address, as create_connection would
+        raise error or MediaBlocked(f"{self.host} has no address")
+
+
+class _PublicHTTPConnection(_PublicConnectionMixin, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicAddressAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections go only to public addresses, checked on the address dialed"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PublicHTTPConnectionPool,
+            'https': _PublicHTTPSConnectionPool
+        }
+
+
+class MediaStore:
+    """Content-addressed media files plus a URL index, in one directory, under a byte budget"""
+
+    def __init__(self, root=MEDIA_DIR, max_bytes=MEDIA_MAX_TOTAL_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        for name in ('objects', 'partial'):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_type TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(media)")}
+            if 'last_access' not in columns:
+                conn.execute("ALTER TABLE media ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256)")
+            conn.execute("CREATE INDEX IF NOT EXISTS media_last_access ON media (last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(os.path.join(self.root, 'index.db'), timeout=10)
+
+    def object_path(self, sha256):
+        """Path of a stored file, or None for a malformed hash"""
+        if not SHA256_PATTERN.match(sha256 or ''):
+            return None
+        return os.path.join(self.root, 'objects', sha256[:2], sha256)
+
+    def partial_paths(self, url):
+        """(data, validator) paths of an unfinished download of url"""
+        name = hashlib.sha1(url.encode()).hexdigest()
+        base = os.path.join(self.root, 'partial', name)
+        return base + '.part', base + '.json'
+
+    def lookup(self, url):
+        """Index entry of a URL whose file is still on disk, or None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT sha256, size, content_type FROM media WHERE url = ?", (url,)).fetchone()
+            if row is None or not os.path.exists(self.object_path(row[0])):
+                return None
+            conn.execute("UPDATE media SET last_access = ? WHERE url = ?", (time.time(), url))
+        return {"sha256": row[0], "size": row[1], "content_type": row[2]}
+
+    def touch(self, sha256):
+        """Mark a stored file as used, e.g. when it is served, so eviction keeps it longer"""
+        with self._connect() as conn:
+            conn.execute("UPDATE media SET last_access = ? WHERE sha256 = ?", (time.time(), sha256))
+
+    def content_type(self, sha256):
+        with self._connect() as conn:
+            row = conn.execute("SELECT content_type FROM media WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def commit(self, url, part_path, sha256, size, content_type):
+        """Move a finished download into place; returns 'downloaded' or 'duplicate'"""
+        path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(part_path)
+            status = 'duplicate'
+        else:
+            os.replace(part_path, path)
+            status = 'downloaded'
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (url, sha256, size, content_type, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, sha256, size, content_type, now, now)
+            )
+            self._evict(conn, keep=sha256)
+        return status
+
+    def _evict(self, conn, keep):
+        """Delete least recently used files (with every URL pointing at them) until under max_bytes"""
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT sha256, MAX(size) FROM media WHERE sha256 != ? GROUP BY sha256 ORDER BY MAX(last_access)",
+            (keep,)
+        ).fetchall()
+        for sha256, size in rows:
+            conn.execute("DELETE FROM media WHERE sha256 = ?", (sha256,))
+            try:
+                os.remove(self.object_path(sha256))
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    def _total_bytes(conn):
+        return conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT sha256, MAX(size) AS size FROM media GROUP BY sha256)"
+        ).fetchone()[0]
+
+    def stats(self):
+        with self._connect() as conn:
+            urls, files = conn.execute("SELECT COUNT(*), COUNT(DISTINCT sha256) FROM media").fetchone()
+            total = self._total_bytes(conn)
+        return {"urls": urls, "files": files, "bytes": total, "max_bytes": self.max_bytes}
+
+
+class MediaFetcher:
+    """Downloads media URLs concurrently into a MediaStore"""
+
+    def __init__(self, store=None, workers=MEDIA_WORKERS, per_host=MEDIA_PER_HOST, timeout=MEDIA_TIMEOUT,
+                 attempts=MEDIA_ATTEMPTS, max_bytes=MEDIA_MAX_BYTES, allow_private=MEDIA_ALLOW_PRIVATE):
+        self._store = store
+        self.workers = workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.attempts = attempts
+        self.max_bytes = max_bytes
+        self.allow_private = allow_private  # Only for tests against a local server
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-fetch')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._host_slots = {}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = MediaStore()
+        return self._store
+
+    def _session(self):
+        """This thread's Session; its connection pool keeps per_host connections to each host alive"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['Accept-Encoding'] = 'identity'  # Range offsets count the bytes as stored
+            adapter_class = HTTPAdapter if self.allow_private else PublicAddressAdapter
+            if not self.allow_private:
+                session.trust_env = False  # A proxy would dial the media host on our behalf, unchecked
+            adapter = adapter_class(pool_connections=32, pool_maxsize=self.per_host)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def _slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+        return slot
+
+    def fetch_all(self, urls):
+        """Fetch every distinct http(s) URL; returns {url: result}"""
+        urls = list(dict.fromkeys(url for url in urls if isinstance(url, str) and url.startswith(('http://', 'https://'))))
+        return dict(zip(urls, self.executor.map(self.fetch, urls)))
+
+    def fetch(self, url):
+        """Download one URL unless it is already stored
+
+        The result has a status of cached, downloaded, duplicate (the content
+        was already stored under another URL) or error.
+        """
+        known = self.store.lookup(url)
+        if known:
+            return {"status": "cached", **known}
+
+        error = None
+        for _ in range(self.attempts):
+            try:
+                return self._attempt(url)
+            except MediaTooLarge as e:
+                error = e
+                break
+            except MediaBlocked as e:
+                error = e
+                break
+            except requests.HTTPError as e:
+                error = e
+                if e.response is not None and e.response.status_code < 500:
+                    break  # A client error will not go away on retry
+            except (requests.RequestException, OSError) as e:
+                error = e  # The partial file is kept and the next attempt resumes it
+        logger.error(f"Media download failed for {url}: {str(error)}")
+        return {"status": "error", "error": str(error)}
+
+    def _attempt(self, url):
+        """One download attempt, holding the URL's partial file locked until the result is stored"""
+        part_path = self.store.partial_paths(url)[0]
+        with self._locked_partial(part_path) as part:
+            known = self.store.lookup(url)  # Stored by whoever held the lock before us
+            if known:
+                self._discard_partial(url)
+                return {"status": "cached", **known}
+            try:
+                with self._slot(url):
+                    sha256, size, content_type = self._download(url, part)
+            except Exception as e:
+                # Keep the partial file only when a later attempt can resume it
+                if isinstance(e, MediaTooLarge) or self._read_validator(self.store.partial_paths(url)[1]) is None:
+                    self._discard_partial(url)
+                raise
+            status = self.store.commit(url, part_path, sha256, size, content_type)
+            self._clear_validator(url)
+        return {"status": status, "sha256": sha256, "size": size, "content_type": content_type}
+
+    @staticmethod
+    @contextmanager
+    def _locked_partial(part_path):
+        """The partial file opened for appending under an exclusive flock
+
+        The holder may move or remove the file, so after waiting for the lock
+        the path is reopened unless it still names the locked file.
+        """
+        while True:
+            part = open(part_path, 'a+b')
+            fcntl.flock(part, fcntl.LOCK_EX)
+            try:
+                if os.fstat(part.fileno()).st_ino == os.stat(part_path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            part.close()
+        try:
+            yield part
+        finally:
+            part.close()
+
+    def _download(self, url, part):
+        """Stream url into the locked partial file, resuming it when possible; returns (sha256, size, content_type)"""
+        validator_path = self.store.partial_paths(url)[1]
+        offset = os.fstat(part.fileno()).st_size
+        validator = self._read_validator(validator_path)
+
+        headers = {}
+        if offset and validator:
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = validator
+
+        with self._get(url, headers) as response:
+            if response.status_code == 416 and offset:
+                self._discard_partial(url)
+                raise requests.RequestException("Stored partial download no longer matches; restarting")
+            response.raise_for_status()
+
+            hasher = hashlib.sha256()
+            if response.status_code == 206 and offset:
+                part.seek(0)
+                for chunk in iter(lambda: part.read(CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+            else:
+                offset = 0  # Server sent the whole body
+                part.truncate(0)
+
+            # If-Range needs a strong validator, and offsets are only meaningful without a content coding
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            encoded = response.headers.get('Content-Encoding', 'identity').lower() != 'identity'
+            if validator and not validator.startswith('W/') and not encoded:
+                with open(validator_path, 'w') as f:
+                    json.dump({"validator": validator}, f)
+            else:
+                self._clear_validator(url)
+
+            size = offset
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise MediaTooLarge(f"Media is larger than {self.max_bytes} bytes")
+                hasher.update(chunk)
+                part.write(chunk)  # Opened in append mode
+            part.flush()
+
+            content_type = response.headers.get('Content-Type')
+        return hasher.hexdigest(), size, content_type
+
+    def _get(self, url, headers):
+        """Streamed GET that follows redirects itself; every hop connects through the public-address check"""
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise MediaBlocked(f"Not an http(s) URL: {url}")
+            response = self._session().get(url, headers=headers, stream=True, timeout=self.timeout,
+                                           allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+        raise requests.TooManyRedirects(f"More than {MAX_REDIRECTS} redirects")
+
+    @staticmethod
+    def _read_validator(path):
+        try:
+            with open(path) as f:
+                return json.load(f).get('validator')
+        except (OSError, ValueError):
+            return None
+
+    def _clear_validator(self, url):
+        try:
+            os.remove(self.store.partial_paths(url)[1])
+        except FileNotFoundError:
+            pass
+
+    def _discard_partial(self, url):
+        for path in self.store.partial_paths(url):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Shared by the app modules of this process
+media_fetcher = MediaFetcher()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Request Metrics
+Per-stage latency histograms, counters and gauges in Prometheus text format
+
+Each worker process records into in-memory counters guarded by one lock (a
+dict update per observation, nothing else on the hot path). A background
+thread writes a snapshot of them to a shared SQLite table every few seconds,
+and /metrics sums the snapshots of every worker on the host, so whichever
+gunicorn worker answers the scrape reports host-wide numbers. Snapshots of
+workers that exited long ago are folded into one "retired" row rather than
+deleted, so host-wide counters never go backwards.
+"""
+
+import os
+import json
+import time
+import bisect
+import sqlite3
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+
+from flask import request, g
+
+logger = logging.getLogger(__name__)
+
+METRICS_DB = os.environ.get('SKRAPER_METRICS_DB', os.path.join(tempfile.gettempdir(), 'skraper-metrics.db'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('SKRAPER_METRICS_FLUSH_INTERVAL', 5))
+METRICS_RETENTION = 24 * 3600  # Fold snapshots of workers that exited a day ago into the retired row
+RETIRED_WORKER = 'retired'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# name -> (type, help) for metrics recorded through inc() / observe()
+METRIC_HELP = {
+    'skraper_stage_duration_seconds': ('histogram', "Time spent in each stage of a request"),
+    'skraper_requests_total': ('counter', "HTTP requests by endpoint, method and status"),
+    'skraper_scrapes_total': ('counter', "Skraper runs by platform and outcome"),
+    'skraper_cache_requests_total': ('counter', "Result cache lookups by status"),
+}
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_snapshot(into, snapshot):
+    """Add the counters and histograms of snapshot to into (gauges of exited workers are dropped)"""
+    counters = {(name, json.dumps(labels)): value for name, labels, value in into['counters']}
+    for name, labels, value in snapshot['counters']:
+        key = (name, json.dumps(labels))
+        counters[key] = counters.get(key, 0) + value
+    into['counters'] = [[name, json.loads(labels), value] for (name, labels), value in counters.items()]
+
+    if snapshot.get('buckets') != into['buckets']:
+        return  # Recorded with another bucket layout, which aggregate() would skip anyway
+    histograms = {(name, json.dumps(labels)): values for name, labels, values in into['histograms']}
+    for name, labels, values in snapshot['histograms']:
+        total = histograms.setdefault((name, json.dumps(labels)), [0] * len(values))
+        for i, value in enumerate(values):
+            total[i] += value
+    into['histograms'] = [[name, json.loads(labels), values] for (name, labels), values in histograms.items()]
+
+
+class MetricsStore:
+    """Latest metrics snapshot of every worker process, in SQLite"""
+
+    def __init__(self, path=METRICS_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS worker_metrics (
+                    worker TEXT PRIMARY KEY,
+                    pid INTEGER NOT NULL,
+                    snapshot TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(self, worker, pid, snapshot):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, pid, snapshot, updated_at) VALUES (?, ?, ?, ?)",
+                (worker, pid, json.dumps(snapshot), now)
+            )
+        self.retire(now - METRICS_RETENTION, snapshot['buckets'])
+
+    def retire(self, before, buckets):
+        """Fold the counters and histograms of snapshots older than before into the retired row"""
+        conn = self._connect()
+        conn.isolation_level = None  # Explicit transaction: one process folds a snapshot exactly once
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute(
+                "SELECT worker, snapshot FROM worker_metrics WHERE updated_at < ? AND worker != ?",
+                (before, RETIRED_WORKER)
+            ).fetchall()
+            if not expired:
+                conn.execute("COMMIT")
+                return
+            row = conn.execute("SELECT snapshot FROM worker_metrics WHERE worker = ?", (RETIRED_WORKER,)).fetchone()
+            retired = json.loads(row[0]) if row else {"counters": [], "histograms": [], "gauges": [], "buckets": buckets}
+            for _, snapshot in expired:
+                _merge_snapshot(retired, json.loads(snapshot))
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, pid, snapshot, updated_at) VALUES (?, 0, ?, ?)",
+                (RETIRED_WORKER, json.dumps(retired), time.time())
+            )
+            conn.executemany("DELETE FROM worker_metrics WHERE worker = ?", [(worker,) for worker, _ in expired])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def load(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT worker, pid, snapshot, updated_at FROM worker_metrics").fetchall()
+        return [(worker, pid, json.loads(snapshot), updated_at) for worker, pid, snapshot, updated_at in rows]
+
+
+class Metrics:
+    """Process-local metrics, flushed periodically for host-wide aggregation"""
+
+    def __init__(self, store=None, flush_interval=METRICS_FLUSH_INTERVAL, buckets=DURATION_BUCKETS):
+        self._store = store
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._worker_gauges = {}  # name -> (help, callback, label); summed over live workers
+        self._host_gauges = {}  # name -> (help, callback, label); evaluated by the worker answering /metrics
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Fresh state for this process (also run in forked children)"""
+        self._pid = os.getpid()
+        self._worker = f"{self._pid}:{time.time():.0f}"
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+        self._flusher = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = MetricsStore()
+        return self._store
+
+    # Recording (hot path)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self._flusher is None:
+            self._start_flusher()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += seconds
+        if self._flusher is None:
+            self._start_flusher()
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Record the duration of a block as skraper_stage_duration_seconds{stage=...}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('skraper_stage_duration_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def register_gauge(self, name, help_text, callback, label=None, per_worker=True):
+        """callback() returns a number, or {label value: number} when label is set
+
+        Per-worker gauges are summed over the live workers; host gauges describe
+        something shared by every worker (the host pool, the cache) and are read
+        once by the worker answering /metrics.
+        """
+        gauges = self._worker_gauges if per_worker else self._host_gauges
+        gauges[name] = (help_text, callback, label)
+
+    # Flushing
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Metrics flush failed: {str(e)}")
+
+    @staticmethod
+    def _gauge_values(gauges):
+        values = []
+        for name, (_, callback, label) in gauges.items():
+            try:
+                result = callback()
+            except Exception as e:
+                logger.error(f"Gauge {name} failed: {str(e)}")
+                continue
+            if label is None:
+                values.append([name, [], result])
+            else:
+                values.extend([name, [[label, str(key)]], value] for key, value in result.items())
+        return values
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, [list(pair) for pair in labels], value]
+                        for (name, labels), value in self._counters.items()]
+            histograms = [[name, [list(pair) for pair in labels], list(values)]
+                          for (name, labels), values in self._histograms.items()]
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "gauges": self._gauge_values(self._worker_gauges),
+            "buckets": list(self.buckets)
+        }
+
+    def flush(self):
+        self.store.save(self._worker, self._pid, self.snapshot())
+
+    # Export
+
+    def aggregate(self):
+        """Sum the snapshots of every worker; gauges only from workers that are still alive"""
+        self.flush()
+        now = time.time()
+        counters, histograms, gauges = {}, {}, {}
+        for worker, pid, snapshot, updated_at in self.store.load():
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                if snapshot.get('buckets') != list(self.buckets):
+                    continue  # Recorded with a different bucket layout
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+            fresh = now - updated_at < 3 * self.flush_interval
+            if worker == self._worker or (fresh and _pid_alive(pid)):
+                for name, labels, value in snapshot['gauges']:
+                    key = (name, tuple(map(tuple, labels)))
+                    gauges[key] = gauges.get(key, 0) + value
+        for name, labels, value in self._gauge_values(self._host_gauges):
+            gauges[(name, tuple(map(tuple, labels)))] = value
+        return counters, histograms, gauges
+
+    def render(self):
+        """Prometheus text exposition of the host-wide metrics"""
+        counters, histograms, gauges = self.aggregate()
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name in sorted({name for name, _ in counters}):
+            header(name, 'counter', METRIC_HELP.get(name, ('counter', name))[1])
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            header(name, 'histogram', METRIC_HELP.get(name, ('histogram', name))[1])
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+        # Hit ratio over lookups that could have been served from the cache
+        cache = {dict(labels).get('status'): value
+                 for (name, labels), value in counters.items() if name == 'skraper_cache_requests_total'}
+        lookups = cache.get('hit', 0) + cache.get('miss', 0) + cache.get('coalesced', 0)
+        if lookups:
+            gauges[('skraper_cache_hit_ratio', ())] = cache.get('hit', 0) / lookups
+
+        helps = {name: gauge[0] for name, gauge in {**self._worker_gauges, **self._host_gauges}.items()}
+        helps['skraper_cache_hit_ratio'] = "Share of cacheable lookups answered from the result cache"
+        for name in sorted({name for name, _ in gauges}):
+            header(name, 'gauge', helps.get(name, name))
+            for (metric, labels), value in sorted(gauges.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def init_request_metrics(app, metrics):
+    """Count requests and time them end to end (register before other after_request hooks)"""
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        started = g.pop('metrics_started', None)
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        if started is not None:
+            metrics.observe('skraper_stage_duration_seconds', time.perf_counter() - started,
+                            stage='request', endpoint=endpoint)
+        metrics.inc('skraper_requests_total', endpoint=endpoint, method=request.method,
+                    status=response.status_code)
+        return response
+
+
+# Shared by the app modules of this process
+metrics = Metrics()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Platform Router
+Maps a social media URL to its Skraper platform with one hostname lookup
+
+The host is parsed once and matched against a precomputed suffix table, so
+"blog.tumblr.com" and "m.youtube.com" resolve like their parent domains while
+query strings or paths that merely mention another site never do.
+"""
+
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# Registered domains per platform
+PLATFORM_DOMAINS = {
+    'instagram': ('instagram.com', 'instagr.am'),
+    'tiktok': ('tiktok.com',),
+    'twitter': ('twitter.com', 'x.com'),
+    'youtube': ('youtube.com', 'youtu.be'),
+    'facebook': ('facebook.com',),
+    'reddit': ('reddit.com',),
+    'pinterest': ('pinterest.com',),
+    'flickr': ('flickr.com',),
+    'tumblr': ('tumblr.com',),
+    'telegram': ('t.me',),
+    'twitch': ('twitch.tv',),
+    'vimeo': ('vimeo.com',),
+    'vk': ('vk.com',),
+    '9gag': ('9gag.com',),
+    'ifunny': ('ifunny.co', 'ifunny.com'),
+    'coub': ('coub.com',),
+    'odnoklassniki': ('odnoklassniki.ru',),
+    'pikabu': ('pikabu.ru',)
+}
+
+# domain -> platform, built once at import
+_DOMAIN_TABLE = {
+    domain: platform
+    for platform, domains in PLATFORM_DOMAINS.items()
+    for domain in domains
+}
+
+
+def extract_host(url):
+    """Lower-cased hostname of a URL, accepting URLs without a scheme"""
+    url = url.strip()
+    if '//' not in url:
+        url = '//' + url
+    try:
+        return (urlsplit(url).hostname or '').rstrip('.')
+    except ValueError:
+        return ''
+
+
+def platform_for_host(host):
+    """Platform whose domain equals host or is a parent domain of it"""
+    while host:
+        platform = _DOMAIN_TABLE.get(host)
+        if platform:
+            return platform
+        _, _, host = host.partition('.')
+    return None
+
+
+@lru_cache(maxsize=4096)
+def detect_platform(url):
+    """Detect social media platform from URL"""
+    if not url:
+        return None
+    return platform_for_host(extract_host(url))
+
+
+def classify(urls):
+    """Detect platforms for many URLs at once; returns {url: platform or None}"""
+    return {url: detect_platform(url) for url in urls}
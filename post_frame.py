@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Columnar Post Frame
+NumPy-backed columns for vectorized engagement analytics over large post sets
+
+Numeric fields (likes, comments, shares, timestamps, lengths, emoji counts)
+are held as NumPy arrays; ids, text and media URLs are kept in separate
+string columns so the numeric work never touches Python dicts. Building a
+frame costs more than one sum() over the posts, so it pays off only when
+one frame serves several aggregations; timestamps are parsed on first use.
+"""
+
+import numpy as np
+
+from brand_analytics import BASELINE_FOLLOWERS
+
+DEFAULT_PERCENTILES = (25, 50, 75, 90, 99)
+
+# Engagement-rate histogram edges (fraction of followers)
+RATE_BINS = (0.0, 0.001, 0.005, 0.01, 0.05, np.inf)
+
+_BUCKET_UNITS = {'hour': 'h', 'day': 'D', 'week': 'W', 'month': 'M'}
+
+
+def _parse_timestamps(values):
+    """ISO-8601 strings to datetime64[s]; unparseable values become NaT"""
+    # Keep "YYYY-MM-DDTHH:MM:SS" and drop fractions / zone suffixes
+    trimmed = [value[:19] if isinstance(value, str) else '' for value in values]
+    try:
+        return np.array(trimmed, dtype='datetime64[s]')
+    except ValueError:
+        parsed = np.empty(len(trimmed), dtype='datetime64[s]')
+        for i, value in enumerate(trimmed):
+            try:
+                parsed[i] = np.datetime64(value, 's')
+            except ValueError:
+                parsed[i] = np.datetime64('NaT')
+        return parsed
+
+
+class PostFrame:
+    """Column store for posts"""
+
+    def __init__(self, likes, comments, shares, timestamps, lengths, emoji_counts,
+                 ids=None, contents=None, media_urls=None, timestamp_strings=None):
+        self.likes = np.asarray(likes, dtype=np.int64)
+        self.comments = np.asarray(comments, dtype=np.int64)
+        self.shares = np.asarray(shares, dtype=np.int64)
+        # Either a datetime64 column, or raw ISO strings parsed when the column is first read
+        self._timestamps = None if timestamps is None else np.asarray(timestamps, dtype='datetime64[s]')
+        self._timestamp_strings = timestamp_strings
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.emoji_counts = np.asarray(emoji_counts, dtype=np.int64)
+        n = len(self.likes)
+        self.ids = ids if ids is not None else [f"post_{i + 1}" for i in range(n)]
+        self.contents = contents if contents is not None else [''] * n
+        self.media_urls = media_urls if media_urls is not None else [''] * n
+        self.engagement = self.likes + self.comments + self.shares
+
+    @classmethod
+    def from_posts(cls, posts):
+        """Build a frame from formatted post dicts (one conversion pass)"""
+        contents = [post.get('content', '') for post in posts]
+        return cls(
+            likes=[post.get('likes', 0) for post in posts],
+            comments=[post.get('comments', 0) for post in posts],
+            shares=[post.get('shares', 0) for post in posts],
+            timestamps=None,
+            lengths=[len(content) for content in contents],
+            emoji_counts=[post.get('emoji_count', 0) for post in posts],
+            ids=[post.get('id') for post in posts],
+            contents=contents,
+            media_urls=[post.get('media_url', '') for post in posts],
+            timestamp_strings=[post.get('timestamp') for post in posts]
+        )
+
+    @property
+    def timestamps(self):
+        if self._timestamps is None:
+            self._timestamps = _parse_timestamps(self._timestamp_strings or [None] * len(self))
+        return self._timestamps
+
+    def __len__(self):
+        return len(self.likes)
+
+    def totals(self):
+        return {
+            "likes": int(self.likes.sum()),
+            "comments": int(self.comments.sum()),
+            "shares": int(self.shares.sum())
+        }
+
+    def media_items(self):
+        return sum(1 for url in self.media_urls if url)
+
+    def best_index(self):
+        return int(np.argmax(self.engagement))  # First maximum, like max()
+
+    def worst_index(self):
+        return int(np.argmin(self.engagement))  # First minimum, like min()
+
+    def engagement_summary(self, followers=BASELINE_FOLLOWERS):
+        """Same schema as EnhancedSkraperService.analyze_engagement_patterns"""
+        n = len(self)
+        if not n:
+            raise Exception("No posts to analyze")
+        totals = self.totals()
+        best, worst = self.best_index(), self.worst_index()
+
+        return {
+            "total_engagement": totals,
+            "average_engagement": {
+                "likes": round(totals['likes'] / n, 1),
+                "comments": round(totals['comments'] / n, 1),
+                "shares": round(totals['shares'] / n, 1)
+            },
+            "engagement_rate": round(((totals['likes'] + totals['comments'] + totals['shares']) / n) / followers, 4),
+            "best_performing_post": {
+                "id": self.ids[best],
+                "engagement": int(self.engagement[best]),
+                "content_preview": self.contents[best][:50] + "..."
+            },
+            "worst_performing_post": {
+                "id": self.ids[worst],
+                "engagement": int(self.engagement[worst]),
+                "content_preview": self.contents[worst][:50] + "..."
+            }
+        }
+
+    def percentiles(self, column='engagement', q=DEFAULT_PERCENTILES):
+        values = getattr(self, column)
+        if not len(values):
+            return {}
+        return {f"p{p}": round(float(v), 2) for p, v in zip(q, np.percentile(values, q))}
+
+    def engagement_rate_distribution(self, followers=BASELINE_FOLLOWERS, bins=RATE_BINS):
+        """Histogram of per-post engagement rate"""
+        counts, edges = np.histogram(self.engagement / followers, bins=np.asarray(bins))
+        return [
+            {
+                "min_rate": float(low),
+                "max_rate": None if np.isinf(high) else float(high),
+                "posts": int(count)
+            }
+            for low, high, count in zip(edges[:-1], edges[1:], counts)
+        ]
+
+    def time_buckets(self, freq='day'):
+        """Posts and engagement aggregated per hour/day/week/month, or by weekday / hour of day"""
+        valid = ~np.isnat(self.timestamps)
+        stamps = self.timestamps[valid]
+        engagement = self.engagement[valid]
+        if not len(stamps):
+            return []
+
+        if freq == 'weekday':
+            # 1970-01-01 was a Thursday; shift so Monday is 0
+            keys = (stamps.astype('datetime64[D]').astype(np.int64) + 3) % 7
+            labels = np.array(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
+            buckets, inverse = np.unique(keys, return_inverse=True)
+            names = labels[buckets]
+        elif freq == 'hour_of_day':
+            keys = stamps.astype('datetime64[h]').astype(np.int64) % 24
+            buckets, inverse = np.unique(keys, return_inverse=True)
+            names = [f"{hour:02d}:00" for hour in buckets]
+        else:
+            truncated = stamps.astype(f"datetime64[{_BUCKET_UNITS[freq]}]")
+            buckets, inverse = np.unique(truncated, return_inverse=True)
+            names = buckets.astype(str)
+
+        posts = np.bincount(inverse)
+        totals = np.bincount(inverse, weights=engagement)
+        return [
+            {
+                "bucket": str(name),
+                "posts": int(count),
+                "engagement": int(total),
+                "average_engagement": round(float(total / count), 1)
+            }
+            for name, count, total in zip(names, posts, totals)
+        ]
+
+    def distribution_report(self, followers=BASELINE_FOLLOWERS):
+        """Percentiles, engagement-rate histogram and time-bucketed aggregates"""
+        return {
+            "engagement_percentiles": self.percentiles('engagement'),
+            "likes_percentiles": self.percentiles('likes'),
+            "engagement_rate_histogram": self.engagement_rate_distribution(followers),
+            "by_month": self.time_buckets('month'),
+            "by_weekday": self.time_buckets('weekday'),
+            "by_hour_of_day": self.time_buckets('hour_of_day')
+        }
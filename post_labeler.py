@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Post Labeler
+One Aho-Corasick automaton over every lexicon used to label post text
+
+CTA phrases, emojis, theme keywords and sentiment words are compiled into a
+single automaton at import, so a post is labeled in one pass over its
+lower-cased text. Lexicons can be replaced at runtime with configure();
+the new automaton is built off to the side and swapped in atomically.
+"""
+
+import os
+import json
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CTA_KEYWORDS = [
+    'click', 'swipe', 'link in bio', 'check out', 'visit', 'shop now',
+    'buy now', 'order', 'subscribe', 'follow', 'share', 'comment',
+    'tell us', 'what do you think', 'change my mind', 'pro tip',
+    'reminder', 'alert', 'don\'t miss'
+]
+
+EMOJIS = ['😀', '😍', '🚀', '✨', '💫', '🔥', '💡', '🌍', '🧠', '💰', '🏠', '📊', '🚢']
+
+THEME_KEYWORDS = {
+    "product_focused": ['product', 'launch', 'new', 'available'],
+    "behind_scenes": ['behind', 'scenes', 'process', 'making'],
+    "customer_focused": ['customer', 'client', 'review', 'testimonial'],
+    "educational": ['tip', 'how', 'guide', 'learn', 'tutorial'],
+    "promotional": ['sale', 'discount', 'offer', 'deal', 'limited'],
+    "community": ['community', 'family', 'team', 'together']
+}
+
+POSITIVE_WORDS = ['amazing', 'awesome', 'great', 'excellent', 'fantastic', 'love', 'perfect', 'incredible',
+                  'outstanding', 'brilliant', 'excited', 'happy', 'thrilled', 'proud', 'grateful']
+NEGATIVE_WORDS = ['terrible', 'awful', 'horrible', 'hate', 'disappointed', 'frustrated', 'angry', 'sad',
+                  'annoyed', 'upset', 'worried', 'concerned']
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher compiled to a dense transition table"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        goto = [{}]
+        outputs = [[]]
+
+        # Trie of all patterns
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            outputs[state].append(pattern_id)
+
+        # Failure links by BFS, folded into full transitions so matching never backtracks
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions = dict(delta[fail[state]])
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0) if state else 0
+                transitions[ch] = child
+                queue.append(child)
+            delta[state] = transitions
+            outputs[state] = outputs[state] + outputs[fail[state]]
+
+        self._delta = delta
+        self._outputs = [tuple(output) for output in outputs]
+
+    def find_all(self, text):
+        """Pattern ids of every match in text (overlapping, with repeats)"""
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        found = []
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                found.extend(outputs[state])
+        return found
+
+
+class PostLabeler:
+    """Labels post text with CTAs, emoji count, themes and sentiment word counts"""
+
+    def __init__(self, cta_keywords=CTA_KEYWORDS, emojis=EMOJIS, theme_keywords=THEME_KEYWORDS,
+                 positive_words=POSITIVE_WORDS, negative_words=NEGATIVE_WORDS):
+        self.cta_keywords = list(cta_keywords)
+        self.emojis = list(emojis)
+        self.theme_keywords = dict(theme_keywords)
+        self.theme_names = list(theme_keywords)
+        self.positive_words = list(positive_words)
+        self.negative_words = list(negative_words)
+
+        # Every distinct pattern gets one id; each id maps back to its roles
+        patterns = {}
+        roles = []
+
+        def register(pattern, role):
+            pattern = pattern.lower()
+            if pattern not in patterns:
+                patterns[pattern] = len(roles)
+                roles.append([])
+            roles[patterns[pattern]].append(role)
+
+        for index, keyword in enumerate(self.cta_keywords):
+            register(keyword, ('cta', index))
+        for emoji in emojis:
+            register(emoji, ('emoji', None))
+        for index, (theme, keywords) in enumerate(theme_keywords.items()):
+            for keyword in keywords:
+                register(keyword, ('theme', index))
+        for word in positive_words:
+            register(word, ('positive', None))
+        for word in negative_words:
+            register(word, ('negative', None))
+
+        self._automaton = AhoCorasick(patterns)
+        self._roles = [tuple(r) for r in roles]
+
+    def label(self, text):
+        """Label one text in a single pass"""
+        matches = self._automaton.find_all(text.lower())
+        roles = self._roles
+
+        emoji_count = 0
+        distinct = set()
+        for pattern_id in matches:
+            for role in roles[pattern_id]:
+                if role[0] == 'emoji':
+                    emoji_count += 1  # Emojis count every occurrence
+            distinct.add(pattern_id)
+
+        cta_hits = set()
+        themes = set()
+        positive = negative = 0
+        for pattern_id in distinct:
+            for kind, index in roles[pattern_id]:
+                if kind == 'cta':
+                    cta_hits.add(index)
+                elif kind == 'theme':
+                    themes.add(index)
+                elif kind == 'positive':
+                    positive += 1  # Sentiment words count once per post
+                elif kind == 'negative':
+                    negative += 1
+
+        return {
+            "cta_types": [self.cta_keywords[i] for i in sorted(cta_hits)],
+            "emoji_count": emoji_count,
+            "themes": [self.theme_names[i] for i in sorted(themes)],
+            "positive_score": positive,
+            "negative_score": negative
+        }
+
+    def label_posts(self, posts, field='content'):
+        """Label a whole list of posts (dicts or PostRecords) or plain strings"""
+        return [self.label(post if isinstance(post, str) else post[field]) for post in posts]
+
+
+def call_to_action(cta_types):
+    """call_to_action block of an enhanced post"""
+    return {
+        "has_cta": len(cta_types) > 0,
+        "cta_types": list(cta_types),
+        "cta_strength": len(cta_types)
+    }
+
+
+def sentiment_summary(positive_count, negative_count):
+    """sentiment block of an enhanced post"""
+    if positive_count > negative_count:
+        sentiment = "positive"
+    elif negative_count > positive_count:
+        sentiment = "negative"
+    else:
+        sentiment = "neutral"
+
+    return {
+        "sentiment": sentiment,
+        "positive_score": positive_count,
+        "negative_score": negative_count,
+        "sentiment_strength": abs(positive_count - negative_count)
+    }
+
+
+def _labeler_from_file(path):
+    with open(path) as f:
+        lexicons = json.load(f)
+    return PostLabeler(
+        cta_keywords=lexicons.get('cta_keywords', CTA_KEYWORDS),
+        emojis=lexicons.get('emojis', EMOJIS),
+        theme_keywords=lexicons.get('theme_keywords', THEME_KEYWORDS),
+        positive_words=lexicons.get('positive_words', POSITIVE_WORDS),
+        negative_words=lexicons.get('negative_words', NEGATIVE_WORDS)
+    )
+
+
+# Shared labeler, optionally built from a JSON lexicon file
+_default_labeler = (
+    _labeler_from_file(os.environ['SKRAPER_LEXICON_FILE'])
+    if os.environ.get('SKRAPER_LEXICON_FILE') else PostLabeler()
+)
+
+
+def get_labeler():
+    return _default_labeler
+
+
+def configure(**lexicons):
+    """Replace lexicons (cta_keywords, emojis, theme_keywords, positive_words, negative_words)"""
+    global _default_labeler
+    current = _default_labeler
+    _default_labeler = PostLabeler(
+        cta_keywords=lexicons.get('cta_keywords', current.cta_keywords),
+        emojis=lexicons.get('emojis', current.emojis),
+        theme_keywords=lexicons.get('theme_keywords', current.theme_keywords),
+        positive_words=lexicons.get('positive_words', current.positive_words),
+        negative_words=lexicons.get('negative_words', current.negative_words)
+    )
+    return _default_labeler
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Compact Post Records
+Slotted post objects used in place of per-post dicts
+
+Records carry only their stored fields; enhanced fields derived from the
+text (length, emoji count, call to action, sentiment) are computed on first
+use from one labeler pass. They are turned into plain dicts only when they
+leave the process: the Flask JSON provider and json_default() handle that.
+"""
+
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+from post_labeler import get_labeler, call_to_action, sentiment_summary
+
+
+class PostRecord:
+    """One post of the web API"""
+
+    __slots__ = ('id', 'username', 'content', 'timestamp', 'likes', 'comments', 'shares',
+                 'media_url', 'caption', 'hashtags', 'mentions')
+
+    # Serialized fields, in output order
+    FIELDS = __slots__
+
+    def __init__(self, id, username='unknown', content='', timestamp=None, likes=0, comments=0, shares=0,
+                 media_url='', caption='', hashtags=None, mentions=None):
+        self.id = id
+        self.username = username
+        self.content = content
+        self.timestamp = timestamp
+        self.likes = likes
+        self.comments = comments
+        self.shares = shares
+        self.media_url = media_url
+        self.caption = caption
+        self.hashtags = hashtags if hashtags is not None else []
+        self.mentions = mentions if mentions is not None else []
+
+    @classmethod
+    def from_item(cls, item, index):
+        """Normalize one raw Skraper item (post object or plain string)"""
+        if isinstance(item, dict):
+            # Direct post object
+            return cls(
+                id=item.get('id', f"post_{index + 1}"),
+                username=item.get('username', 'unknown'),
+                content=item.get('content', item.get('text', item.get('caption', ''))),
+                timestamp=item.get('timestamp', item.get('created_at', datetime.utcnow().isoformat())),
+                likes=item.get('likes', item.get('like_count', 0)),
+                comments=item.get('comments', item.get('comment_count', 0)),
+                shares=item.get('shares', item.get('share_count', 0)),
+                media_url=item.get('media_url', item.get('image_url', item.get('video_url', ''))),
+                caption=item.get('caption', ''),
+                hashtags=item.get('hashtags', []),
+                mentions=item.get('mentions', [])
+            )
+        # String content
+        return cls(id=f"post_{index + 1}", content=str(item), timestamp=datetime.utcnow().isoformat())
+
+    # Read-only mapping access, so analytics code can treat records and cached dicts alike
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.id!r})"
+
+
+class EnhancedPostRecord(PostRecord):
+    """Post of the enhanced API, with lazily derived text analysis"""
+
+    __slots__ = ('media_type', '_labels')
+
+    FIELDS = PostRecord.FIELDS + ('media_type', 'post_length', 'emoji_count', 'call_to_action', 'sentiment')
+
+    def __init__(self, id, media_type='image', **fields):
+        super().__init__(id, **fields)
+        self.media_type = media_type
+        self._labels = None
+
+    def _label(self):
+        """(cta_types, emoji_count, positive_score, negative_score), computed once"""
+        if self._labels is None:
+            labels = get_labeler().label(self.content)
+            self._labels = (
+                tuple(labels['cta_types']),
+                labels['emoji_count'],
+                labels['positive_score'],
+                labels['negative_score']
+            )
+        return self._labels
+
+    @property
+    def post_length(self):
+        return len(self.content)
+
+    @property
+    def emoji_count(self):
+        return self._label()[1]
+
+    @property
+    def call_to_action(self):
+        return call_to_action(self._label()[0])
+
+    @property
+    def sentiment(self):
+        _, _, positive, negative = self._label()
+        return sentiment_summary(positive, negative)
+
+
+def json_default(obj):
+    """json.dumps default= hook for post records"""
+    if isinstance(obj, PostRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class PostJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes post records"""
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, PostRecord):
+            return obj.to_dict()
+        return DefaultJSONProvider.default(obj)
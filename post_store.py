@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Post History Store
+Every scraped post kept on local disk in SQLite, deduplicated by (platform, username, post id)
+
+Posts are upserted after each Skraper run, so a post seen again only has its
+counters and last_seen refreshed. Posts are indexed by publish time overall
+and per account, so range and top-N history queries are answered from disk
+without launching Skraper. Each scraped account path also keeps a high-water
+mark (its newest post) for "since last seen" scrapes.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import logging
+from datetime import datetime, timezone
+
+from post_record import PostRecord, json_default
+
+logger = logging.getLogger(__name__)
+
+POSTS_DB = os.environ.get('SKRAPER_POSTS_DB', os.path.join(tempfile.gettempdir(), 'skraper-posts.db'))
+HISTORY_MAX_LIMIT = 1000
+
+# Sort keys of history queries -> SQL expression
+HISTORY_SORTS = {
+    'timestamp': 'published_at',
+    'likes': 'likes',
+    'comments': 'comments',
+    'shares': 'shares',
+    'engagement': 'likes + comments + shares',
+    'last_seen': 'last_seen',
+}
+
+
+def parse_time(value):
+    """Epoch seconds from an ISO-8601 string or an epoch number (seconds or milliseconds), or None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+        seconds = float(value)
+        return seconds / 1000.0 if seconds > 1e11 else seconds
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+class PostStore:
+    """SQLite table of formatted posts with indexed history queries"""
+
+    def __init__(self, path=POSTS_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS posts (
+                    platform TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    post_id TEXT NOT NULL,
+                    published_at REAL,
+                    likes INTEGER NOT NULL DEFAULT 0,
+                    comments INTEGER NOT NULL DEFAULT 0,
+                    shares INTEGER NOT NULL DEFAULT 0,
+                    record TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    PRIMARY KEY (platform, username, post_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS posts_published ON posts (published_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS posts_account_published "
+                         "ON posts (username, platform, published_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    platform TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    post_id TEXT NOT NULL,
+                    published_at REAL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (platform, path)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def upsert(self, platform, posts, account=None):
+        """Insert new posts and refresh the counters of known ones; returns the number written
+
+        account is used as the username of posts that do not name one.
+        """
+        now = time.time()
+        rows = []
+        for post in posts:
+            record = post.to_dict() if isinstance(post, PostRecord) else dict(post)
+            if record.get('id') is None:
+                continue
+            username = record.get('username')
+            if not username or username == 'unknown':
+                username = account or 'unknown'
+            rows.append((
+                platform,
+                username,
+                str(record['id']),
+                parse_time(record.get('timestamp')),
+                int(record.get('likes') or 0),
+                int(record.get('comments') or 0),
+                int(record.get('shares') or 0),
+                json.dumps(record, default=json_default),
+                now,
+                now
+            ))
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO posts (platform, username, post_id, published_at, likes, comments, shares,
+                                   record, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (platform, username, post_id) DO UPDATE SET
+                    published_at = COALESCE(excluded.published_at, published_at),
+                    likes = excluded.likes,
+                    comments = excluded.comments,
+                    shares = excluded.shares,
+                    record = excluded.record,
+                    last_seen = excluded.last_seen
+            """, rows)
+        return len(rows)
+
+    def watermark(self, platform, path):
+        """Newest post seen for an account path: {"post_id", "published_at", "updated_at"} or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT post_id, published_at, updated_at FROM watermarks WHERE platform = ? AND path = ?",
+                (platform, path)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"post_id": row[0], "published_at": row[1], "updated_at": row[2]}
+
+    def advance_watermark(self, platform, path, posts):
+        """Move an account's mark to the newest of posts; it never moves back in time
+
+        posts are in Skraper's newest-first order. When none has a publish
+        time the first post's id becomes the mark, with no time.
+        """
+        if not posts:
+            return
+        newest = (str(posts[0]['id']), None)
+        for post in posts:
+            published_at = parse_time(post.get('timestamp'))
+            if published_at is not None and (newest[1] is None or published_at > newest[1]):
+                newest = (str(post['id']), published_at)
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO watermarks (platform, path, post_id, published_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (platform, path) DO UPDATE SET
+                    post_id = excluded.post_id,
+                    published_at = excluded.published_at,
+                    updated_at = excluded.updated_at
+                WHERE published_at IS NULL OR excluded.published_at >= published_at
+            """, (platform, path, newest[0], newest[1], time.time()))
+
+    def history(self, platform=None, username=None, since=None, until=None, sort='timestamp',
+                order='desc', limit=50, offset=0):
+        """Stored posts matching the filters, as dicts with platform, first_seen and last_seen added
+
+        since / until bound the publish time (epoch seconds); sort is one of
+        HISTORY_SORTS, so a top-N query is sort='likes', limit=N.
+        """
+        if sort not in HISTORY_SORTS:
+            raise ValueError(f"Unknown sort: {sort}. Valid sorts: {', '.join(HISTORY_SORTS)}")
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+
+        clauses, params = [], []
+        for column, value in (('platform', platform), ('username', username)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("published_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("published_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT platform, record, first_seen, last_seen FROM posts {where} "
+                f"ORDER BY {HISTORY_SORTS[sort]} {order.upper()}, post_id LIMIT ? OFFSET ?",
+                params + [max(1, min(int(limit), HISTORY_MAX_LIMIT)), max(int(offset), 0)]
+            ).fetchall()
+
+        return [
+            {**json.loads(record), "platform": platform, "first_seen": first_seen, "last_seen": last_seen}
+            for platform, record, first_seen, last_seen in rows
+        ]
+
+    def stats(self):
+        with self._connect() as conn:
+            posts, accounts = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT platform || '/' || username) FROM posts"
+            ).fetchone()
+        return {"posts": posts, "accounts": accounts}
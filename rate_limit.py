@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Upstream Rate Limiting
+Per-platform token buckets shared across worker processes, plus a fair
+scheduler that interleaves queued Skraper calls across platforms and tenants
+"""
+
+import os
+import time
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import logging
+from collections import deque, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RATE_DB = os.environ.get('SKRAPER_RATE_DB', os.path.join(tempfile.gettempdir(), 'skraper-ratelimit.db'))
+RATE_WAIT_TIMEOUT = int(os.environ.get('SKRAPER_RATE_WAIT_TIMEOUT', 120))
+DEFAULT_TENANT = 'anonymous'
+
+# Requests per minute and burst size per platform
+DEFAULT_RATE = (20, 4)
+PLATFORM_RATES = {
+    'instagram': (6, 2),
+    'facebook': (6, 2),
+    'twitter': (15, 3),
+    'tiktok': (20, 4),
+    'youtube': (30, 5),
+    'reddit': (30, 5)
+}
+
+
+def _load_rate_overrides():
+    """Per-platform overrides, e.g. SKRAPER_RATE_LIMITS="instagram=6:2,tiktok=40:8" """
+    overrides = {}
+    for item in os.environ.get('SKRAPER_RATE_LIMITS', '').split(','):
+        if '=' in item:
+            platform, value = item.split('=', 1)
+            per_minute, _, burst = value.partition(':')
+            overrides[platform.strip()] = (float(per_minute), float(burst or 1))
+    return overrides
+
+
+PLATFORM_RATES.update(_load_rate_overrides())
+
+
+class TokenBuckets:
+    """Token bucket per platform, stored in SQLite so every worker draws from the same bucket"""
+
+    def __init__(self, path=RATE_DB, rates=None):
+        self.path = path
+        self.rates = rates if rates is not None else PLATFORM_RATES
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    platform TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def rate_for(self, platform):
+        return self.rates.get(platform, DEFAULT_RATE)
+
+    def try_take(self, platform):
+        """Take one token; returns (granted, seconds_until_next_token)"""
+        per_minute, burst = self.rate_for(platform)
+        per_second = per_minute / 60.0
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE platform = ?", (platform,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * per_second)
+            granted = tokens >= 1
+            if granted:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (platform, tokens, updated_at) VALUES (?, ?, ?)",
+                (platform, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return granted, (0 if granted else (1 - tokens) / per_second)
+
+    def refund(self, platform):
+        """Return a token taken for a request that stopped waiting before it was granted"""
+        per_minute, burst = self.rate_for(platform)
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE buckets SET tokens = MIN(?, tokens + 1) WHERE platform = ?", (burst, platform))
+        finally:
+            conn.close()
+
+    def snapshot(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT platform, tokens, updated_at FROM buckets").fetchall()
+        finally:
+            conn.close()
+        now = time.time()
+        result = {}
+        for platform, tokens, updated_at in rows:
+            per_minute, burst = self.rate_for(platform)
+            result[platform] = {
+                "tokens": round(min(burst, tokens + (now - updated_at) * per_minute / 60.0), 2),
+                "per_minute": per_minute,
+                "burst": burst
+            }
+        return result
+
+
+class _Ticket:
+    def __init__(self, on_grant=None):
+        self.event = threading.Event()
+        self.granted = False
+        self.on_grant = on_grant  # Called under the scheduler lock; must not block
+
+
+class FairScheduler:
+    """Hands out upstream slots round-robin across platforms, then across tenants
+
+    A single dispatcher thread grants the next waiting request of the next
+    platform that has a token, so a backlog on one platform never holds up
+    platforms with spare capacity, and one tenant cannot starve the others.
+    Token buckets live on disk, so the dispatcher takes tokens without
+    holding the queue lock; callers queueing or timing out never wait on I/O.
+    """
+
+    def __init__(self, buckets=None, wait_timeout=RATE_WAIT_TIMEOUT):
+        self.buckets = buckets or TokenBuckets()
+        self.wait_timeout = wait_timeout
+        self._changed = threading.Condition()
+        self._queues = {}  # platform -> OrderedDict(tenant -> deque of tickets)
+        self._platforms = deque()  # Rotation of platforms with waiters
+        self._arrivals = 0  # Bumped on every new waiter, so the dispatcher never sleeps through one
+        self._dispatcher = None
+
+    def acquire(self, platform, tenant=DEFAULT_TENANT, timeout=None):
+        """Block until this request may call the platform"""
+        ticket = self._enqueue(platform, tenant, _Ticket())
+        if ticket.event.wait(timeout or self.wait_timeout):
+            return
+        self._give_up(platform, tenant, ticket)
+
+    async def acquire_async(self, platform, tenant=DEFAULT_TENANT, timeout=None):
+        """acquire for coroutines: the grant resolves a future on the caller's loop, no thread waits"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def on_grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+
+        ticket = self._enqueue(platform, tenant, _Ticket(on_grant))
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout or self.wait_timeout)
+        except asyncio.TimeoutError:
+            self._give_up(platform, tenant, ticket)
+        except asyncio.CancelledError:
+            with self._changed:
+                if not ticket.granted:
+                    self._remove(platform, tenant, ticket)
+            raise
+
+    def _enqueue(self, platform, tenant, ticket):
+        with self._changed:
+            tenants = self._queues.setdefault(platform, OrderedDict())
+            tenants.setdefault(tenant, deque()).append(ticket)
+            if platform not in self._platforms:
+                self._platforms.append(platform)
+            self._arrivals += 1
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name='rate-dispatcher', daemon=True)
+                self._dispatcher.start()
+            self._changed.notify_all()
+        return ticket
+
+    def _give_up(self, platform, tenant, ticket):
+        """Leave the queue after a timed-out wait; returns quietly if the turn was granted meanwhile"""
+        with self._changed:
+            if ticket.granted:
+                return  # Granted just as the wait timed out
+            self._remove(platform, tenant, ticket)
+        raise Exception(f"Rate limit wait timed out for {platform}")
+
+    def _remove(self, platform, tenant, ticket):
+        tenants = self._queues[platform]
+        tenants[tenant].remove(ticket)
+        if not tenants[tenant]:
+            del tenants[tenant]
+        if not tenants:
+            del self._queues[platform]
+            self._platforms.remove(platform)
+
+    def _dispatch_loop(self):
+        while True:
+            # Pick the rotation under the lock, then take tokens (SQLite I/O) without it
+            with self._changed:
+                while not self._platforms:
+                    self._changed.wait()
+                candidates = list(self._platforms)
+                arrivals = self._arrivals
+
+            next_wait = None
+            for platform in candidates:
+                try:
+                    granted, wait = self.buckets.try_take(platform)
+                except Exception as e:
+                    # Fail open rather than stalling every scrape on a storage error
+                    logger.error(f"Rate limiter storage error: {str(e)}")
+                    granted, wait = True, 0
+                if granted:
+                    with self._changed:
+                        granted = platform in self._queues
+                        if granted:
+                            self._platforms.remove(platform)
+                            self._platforms.append(platform)  # Back of the rotation
+                            self._grant_next(platform)
+                    if not granted:
+                        self._refund(platform)  # Every waiter gave up meanwhile
+                    break
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+            else:
+                # No platform with waiters has a token yet
+                with self._changed:
+                    if self._arrivals == arrivals:
+                        self._changed.wait(next_wait)
+
+    def _refund(self, platform):
+        try:
+            self.buckets.refund(platform)
+        except Exception as e:
+            logger.error(f"Rate limiter storage error: {str(e)}")
+
+    def _grant_next(self, platform):
+        tenants = self._queues[platform]
+        tenant, tickets = tenants.popitem(last=False)
+        ticket = tickets.popleft()
+        if tickets:
+            tenants[tenant] = tickets  # Back of the line for this tenant's next request
+        if not tenants:
+            del self._queues[platform]
+            self._platforms.remove(platform)
+        ticket.granted = True
+        ticket.event.set()
+        if ticket.on_grant:
+            ticket.on_grant()
+
+    def queued(self):
+        """Requests of this process waiting for a turn, per platform"""
+        with self._changed:
+            return {
+                platform: sum(len(tickets) for tickets in tenants.values())
+                for platform, tenants in self._queues.items()
+            }
+    
+    def snapshot(self):
+        return {"queued": self.queued(), "buckets": self.buckets.snapshot()}
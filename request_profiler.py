@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Request Profiling
+Opt-in cProfile runs of single API requests, on demand or sampled, stored for later analysis
+
+A request is profiled when it carries `X-Profile: 1` (or `?profile=1`) and
+an `X-Profile-Token` matching SKRAPER_PROFILE_TOKEN, or when it is picked by
+1-in-SKRAPER_PROFILE_SAMPLE_RATE sampling. Each profile is written to
+SKRAPER_PROFILE_DIR as a .prof file (for pstats / snakeviz) and a JSON
+summary with the call tree, the top functions and the time spent waiting on
+Skraper subprocesses. Only the request's own thread is profiled, and for
+streamed responses only the work done before the first byte is covered.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import hmac
+import random
+import pstats
+import cProfile
+import tempfile
+import functools
+import threading
+import logging
+from datetime import datetime
+
+from flask import request, current_app, jsonify, send_file
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.environ.get('SKRAPER_PROFILE_TOKEN')  # On-demand profiling is disabled without one
+PROFILE_SAMPLE_RATE = int(os.environ.get('SKRAPER_PROFILE_SAMPLE_RATE', 0))  # 0 disables sampling
+PROFILE_DIR = os.environ.get('SKRAPER_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'skraper-profiles'))
+PROFILE_KEEP = int(os.environ.get('SKRAPER_PROFILE_KEEP', 200))
+
+TOP_FUNCTIONS = 30
+TREE_MAX_DEPTH = 12
+TREE_MIN_FRACTION = 0.01  # Calls below 1% of the request's time are left out of the tree
+
+# (file basename, function) of calls that block on a Skraper process
+SUBPROCESS_CALLS = {
+    ('skraper_pool.py', 'run'),
+    ('subprocess.py', 'run'),
+    ('subprocess.py', 'communicate'),
+    ('subprocess.py', 'wait'),
+}
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+
+def _function_name(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # Built-in function
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _is_subprocess_call(func):
+    return (os.path.basename(func[0]), func[2]) in SUBPROCESS_CALLS
+
+
+def summarize_profile(stats, root=None):
+    """JSON summary of pstats.Stats: top functions, call tree and subprocess time"""
+    entries = stats.stats  # func -> (primitive calls, calls, self time, cumulative time, callers)
+
+    top = sorted(entries.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+    top_functions = [
+        {
+            "function": _function_name(func),
+            "calls": calls,
+            "self_seconds": round(self_time, 6),
+            "cumulative_seconds": round(cumulative, 6)
+        }
+        for func, (_, calls, self_time, cumulative, _) in top
+    ]
+
+    # Time in subprocess calls, counted only where they are entered from outside the set
+    subprocess_seconds = sum(
+        edge[3]
+        for func, (_, _, _, _, callers) in entries.items() if _is_subprocess_call(func)
+        for caller, edge in callers.items() if not _is_subprocess_call(caller)
+    )
+
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge
+
+    if root not in entries:
+        root = max(entries, key=lambda func: entries[func][3]) if entries else None
+
+    def node(func, calls, cumulative, depth, path):
+        children = []
+        if depth < TREE_MAX_DEPTH:
+            for child, edge in sorted(callees.get(func, {}).items(), key=lambda item: item[1][3], reverse=True):
+                if child in path or edge[3] < minimum:
+                    continue
+                children.append(node(child, edge[1], edge[3], depth + 1, path | {child}))
+        return {
+            "function": _function_name(func),
+            "calls": calls,
+            "cumulative_seconds": round(cumulative, 6),
+            "children": children
+        }
+
+    call_tree = None
+    if root is not None:
+        minimum = entries[root][3] * TREE_MIN_FRACTION
+        call_tree = node(root, entries[root][1], entries[root][3], 0, {root})
+
+    return {
+        "total_seconds": round(stats.total_tt, 6),
+        "subprocess_seconds": round(subprocess_seconds, 6),
+        "top_functions": top_functions,
+        "call_tree": call_tree
+    }
+
+
+class ProfileStore:
+    """Profiles on local disk: <id>.prof (pstats) and <id>.json (summary)"""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, profile_id, suffix):
+        if not PROFILE_ID_PATTERN.match(profile_id or ''):
+            return None
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, profiler, info, root=None):
+        profile_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        profiler.dump_stats(self.path(profile_id, '.prof'))
+        summary = {"id": profile_id, **info, **summarize_profile(pstats.Stats(profiler), root)}
+        with open(self.path(profile_id, '.json'), 'w') as f:
+            json.dump(summary, f)
+        self.prune()
+        return profile_id
+
+    def load(self, profile_id):
+        path = self.path(profile_id, '.json')
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def list(self):
+        ids = sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')), reverse=True)
+        return [profile_id for profile_id in ids if PROFILE_ID_PATTERN.match(profile_id)]
+
+    def prune(self):
+        for profile_id in self.list()[self.keep:]:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(self.path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+
+class RequestProfiler:
+    """Decides which requests to profile and runs them under cProfile"""
+
+    def __init__(self, store=None, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE):
+        self._store = store
+        self.token = token
+        self.sample_rate = sample_rate
+        self._active = threading.Lock()  # One profiled request per process keeps the overhead bounded
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = ProfileStore()
+        return self._store
+
+    def authorized(self):
+        supplied = request.headers.get('X-Profile-Token', '')
+        return bool(self.token) and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def requested(self):
+        return request.headers.get('X-Profile') in ('1', 'true') or request.args.get('profile') in ('1', 'true')
+
+    def mode(self):
+        """'requested', 'sampled' or None for the current request"""
+        if self.requested():
+            return 'requested'
+        if self.sample_rate > 0 and random.random() < 1.0 / self.sample_rate:
+            return 'sampled'
+        return None
+
+    def profiled(self, view):
+        """Decorator running a view under the profiler when the request asks or is sampled"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = self.mode()
+            if mode is None:
+                return view(*args, **kwargs)
+            if mode == 'requested' and not self.authorized():
+                return jsonify({"error": "Profiling requires a valid X-Profile-Token", "success": False}), 403
+            if not self._active.acquire(blocking=False):
+                response = current_app.make_response(view(*args, **kwargs))
+                if mode == 'requested':
+                    response.headers['X-Profile-Status'] = 'busy'
+                return response
+
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                finally:
+                    profiler.disable()
+            finally:
+                self._active.release()
+
+            info = {
+                "mode": mode,
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.url_rule.rule if request.url_rule else None,
+                "status": response.status_code,
+                "streamed": response.is_streamed,
+                "wall_seconds": round(time.perf_counter() - started, 6),
+                "created_at": datetime.utcnow().isoformat() + "Z"
+            }
+            code = view.__code__
+            try:
+                profile_id = self.store.save(profiler, info, (code.co_filename, code.co_firstlineno, code.co_name))
+            except Exception as e:
+                logger.error(f"Could not store profile: {str(e)}")
+                return response
+            logger.info(f"Profiled {request.method} {request.path} ({mode}): {profile_id}")
+            if mode == 'requested':
+                response.headers['X-Profile-Id'] = profile_id
+            return response
+        return wrapper
+
+
+def init_profile_routes(app, profiler):
+    """GET /api/profiles and /api/profiles/<id> (summary, or ?format=pstats for the raw profile)"""
+    @app.route('/api/profiles')
+    def list_profiles():
+        """Ids of the stored profiles, newest first"""
+        if not profiler.authorized():
+            return jsonify({"error": "A valid X-Profile-Token is required", "success": False}), 403
+        return jsonify({"profiles": profiler.store.list()})
+
+    @app.route('/api/profiles/<profile_id>')
+    def get_profile(profile_id):
+        """Summary of one stored profile"""
+        if not profiler.authorized():
+            return jsonify({"error": "A valid X-Profile-Token is required", "success": False}), 403
+        if request.args.get('format') == 'pstats':
+            path = profiler.store.path(profile_id, '.prof')
+            if path and os.path.exists(path):
+                return send_file(path, mimetype='application/octet-stream', as_attachment=True)
+            return jsonify({"error": "Profile not found"}), 404
+        summary = profiler.store.load(profile_id)
+        if summary is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return jsonify(summary)
+
+
+# Shared by the app modules of this process
+profiler = RequestProfiler()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Response Projection
+fields= / include= selection of what a scrape response computes and returns
+
+fields= names the post fields to return (e.g. "likes,hashtags") and
+include= names the top-level sections (e.g. "posts" or "posts,brand_analysis").
+Both are read from the JSON body or the query string, as a comma separated
+string or a list. Metadata is always returned.
+"""
+
+
+class ProjectionError(Exception):
+    """Raised when fields= or include= names something the response does not have"""
+
+
+def parse_list(value):
+    """Names from a comma separated string or a list; None when empty"""
+    if value is None:
+        return None
+    items = value.split(',') if isinstance(value, str) else value
+    items = [str(item).strip() for item in items if str(item).strip()]
+    return items or None
+
+
+def parse_sections(value, sections):
+    """Requested section names in canonical order; all sections when none are given"""
+    requested = parse_list(value)
+    unknown = [section for section in requested or () if section not in sections]
+    if unknown:
+        raise ProjectionError(f"Unknown sections: {', '.join(unknown)}. Valid sections: {', '.join(sections)}")
+    return [section for section in sections if requested is None or section in requested]
+
+
+def parse_projection(data, args, post_fields, sections):
+    """Returns (fields, include): a tuple of post fields or None for all, and the set of sections"""
+    fields = parse_list(data.get('fields', args.get('fields')))
+    include = parse_list(data.get('include', args.get('include')))
+
+    unknown = [field for field in fields or () if field not in post_fields]
+    if unknown:
+        raise ProjectionError(f"Unknown fields: {', '.join(unknown)}. Valid fields: {', '.join(post_fields)}")
+    unknown = [section for section in include or () if section not in sections]
+    if unknown:
+        raise ProjectionError(f"Unknown sections: {', '.join(unknown)}. Valid sections: {', '.join(sections)}")
+
+    return (tuple(fields) if fields else None), set(include or sections)
+
+
+def project_posts(posts, fields):
+    """Posts reduced to the requested fields; lazy record fields outside them are never computed"""
+    if fields is None:
+        return posts
+    return [{field: post[field] for field in fields} for post in posts]
+
+
+def project_response(response, fields, include, posts_key, sections):
+    """Response with only the included sections and projected posts"""
+    projected = {key: value for key, value in response.items() if key not in sections or key in include}
+    if posts_key in projected:
+        projected[posts_key] = project_posts(projected[posts_key], fields)
+    return projected
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Scrape Result Cache
+SQLite-backed result cache shared by every gunicorn worker on the host
+
+Entries expire after a per-platform TTL and the cache is kept under a byte
+budget by evicting the least recently used entries first.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import logging
+
+from post_record import json_default
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_DB = os.environ.get('SKRAPER_CACHE_DB', os.path.join(tempfile.gettempdir(), 'skraper-cache.db'))
+CACHE_MAX_BYTES = int(os.environ.get('SKRAPER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+DEFAULT_TTL = int(os.environ.get('SKRAPER_CACHE_TTL', 600))
+
+# Fast-moving feeds go stale sooner than profile-style platforms
+PLATFORM_TTLS = {
+    'twitter': 120,
+    'reddit': 180,
+    'telegram': 180,
+    'twitch': 180,
+    'tiktok': 300,
+    'instagram': 600,
+    'facebook': 600,
+    'youtube': 900,
+    'pinterest': 1800,
+    'flickr': 1800,
+    'vimeo': 1800
+}
+
+
+def _load_ttl_overrides():
+    """Per-platform overrides, e.g. SKRAPER_CACHE_TTLS="twitter=60,instagram=900" """
+    overrides = {}
+    for item in os.environ.get('SKRAPER_CACHE_TTLS', '').split(','):
+        if '=' in item:
+            platform, seconds = item.split('=', 1)
+            overrides[platform.strip()] = int(seconds)
+    return overrides
+
+
+PLATFORM_TTLS.update(_load_ttl_overrides())
+
+
+class CacheOptionError(ValueError):
+    """Raised when a request's cache controls are malformed"""
+
+
+def parse_cache_options(data):
+    """Read cache controls from a request body: {"cache": false} and/or {"max_age": seconds}"""
+    use_cache = data.get('cache', True) not in (False, 'false', 'bypass', 0)
+    max_age = data.get('max_age')
+    if max_age is None:
+        return use_cache, None
+    try:
+        max_age = float(max_age)
+    except (TypeError, ValueError):
+        raise CacheOptionError("max_age must be a number of seconds")
+    if max_age < 0:
+        raise CacheOptionError("max_age must not be negative")
+    return use_cache, max_age
+
+
+class ResultCache:
+    """TTL + LRU cache of JSON-serializable scrape results"""
+
+    def __init__(self, path=CACHE_DB, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results (last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def make_key(*parts):
+        return json.dumps(parts)
+
+    @staticmethod
+    def ttl_for(platform):
+        return PLATFORM_TTLS.get(platform, DEFAULT_TTL)
+
+    def get(self, key, max_age=None):
+        """Return (value, age_seconds) or (None, None) on a miss"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None, None
+
+            value, created_at, expires_at = row
+            age = now - created_at
+            if expires_at < now:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None, None
+            if max_age is not None and age > max_age:
+                return None, None
+
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value), round(age, 1)
+
+    def version(self, key, max_age=None):
+        """Creation time of a live entry, or None; reads neither the value nor the LRU clock"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT created_at, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+        if not row or row[1] < now or (max_age is not None and now - row[0] > max_age):
+            return None
+        return row[0]
+
+    def put(self, key, value, ttl):
+        payload = json.dumps(value, default=json_default)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now + ttl, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM results WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until back under the byte budget
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes}
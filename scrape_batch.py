@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Batch Scraping
+Fans a list of scrape requests out concurrently under global and per-platform caps
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Batch configuration
+BATCH_MAX_ITEMS = int(os.environ.get('SKRAPER_BATCH_MAX_ITEMS', 50))
+BATCH_CONCURRENCY = int(os.environ.get('SKRAPER_BATCH_CONCURRENCY', 8))
+BATCH_PER_PLATFORM = int(os.environ.get('SKRAPER_BATCH_PER_PLATFORM', 2))
+
+
+def _load_platform_limits():
+    """Per-platform caps, e.g. SKRAPER_BATCH_PLATFORM_LIMITS="instagram=1,tiktok=4" """
+    limits = {}
+    for item in os.environ.get('SKRAPER_BATCH_PLATFORM_LIMITS', '').split(','):
+        if '=' in item:
+            platform, value = item.split('=', 1)
+            limits[platform.strip()] = int(value)
+    return limits
+
+
+class ConcurrencyLimits:
+    """Non-blocking global + per-platform slot accounting shared by all batches"""
+
+    def __init__(self, global_limit=BATCH_CONCURRENCY, per_platform=BATCH_PER_PLATFORM, overrides=None):
+        self.global_limit = global_limit
+        self.per_platform = per_platform
+        self.overrides = overrides if overrides is not None else _load_platform_limits()
+        self._running = 0
+        self._by_platform = {}
+        self._changed = threading.Condition()
+
+    def limit_for(self, platform):
+        return self.overrides.get(platform, self.per_platform)
+
+    def try_acquire(self, platform):
+        with self._changed:
+            if self._running >= self.global_limit:
+                return False
+            if self._by_platform.get(platform, 0) >= self.limit_for(platform):
+                return False
+            self._running += 1
+            self._by_platform[platform] = self._by_platform.get(platform, 0) + 1
+            return True
+
+    def release(self, platform):
+        with self._changed:
+            self._running -= 1
+            self._by_platform[platform] -= 1
+            self._changed.notify_all()
+
+    def wait_for_release(self, timeout):
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def snapshot(self):
+        with self._changed:
+            return {"running": self._running, "by_platform": dict(self._by_platform)}
+
+
+class BatchRunner:
+    """Runs batch items concurrently and collects per-item results
+
+    scrape_item(item) does the work for one normalized item and returns its
+    result; detect_platform(url) decides which per-platform cap applies.
+    """
+
+    def __init__(self, scrape_item, detect_platform, limits=None):
+        self.scrape_item = scrape_item
+        self.detect_platform = detect_platform
+        self.limits = limits or ConcurrencyLimits()
+        self.executor = ThreadPoolExecutor(max_workers=self.limits.global_limit, thread_name_prefix='scrape-batch')
+
+    def run(self, items, on_progress=None):
+        """Scrape every item; returns {url: result-or-error} and a summary
+
+        Items that carry an "error" (rejected while normalizing the request)
+        are reported as failed without being scraped. on_progress(done, total)
+        is called as items finish.
+        """
+        started = time.time()
+        results = {}
+        pending = deque()
+        seen = set()
+
+        for item in items:
+            url = item['url']
+            if url in seen:
+                continue  # Results are keyed by URL, so duplicates are scraped once
+            seen.add(url)
+            if item.get('error'):
+                results[url] = {"success": False, "error": item['error']}
+                continue
+            platform = self.detect_platform(url)
+            if not platform:
+                results[url] = {"success": False, "error": f"Unsupported platform for URL: {url}"}
+                continue
+            pending.append((platform, item))
+
+        running = {}
+        while pending or running:
+            self._launch_ready(pending, running)
+            if running:
+                done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    platform, item = running.pop(future)
+                    results[item['url']] = self._collect(future, item)
+                    if on_progress:
+                        on_progress(len(results), len(seen))
+            else:
+                # Every slot for the queued platforms is held by other batches
+                self.limits.wait_for_release(0.5)
+
+        succeeded = sum(1 for result in results.values() if result['success'])
+        return results, {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "duration_seconds": round(time.time() - started, 3)
+        }
+
+    def _launch_ready(self, pending, running):
+        for _ in range(len(pending)):
+            platform, item = pending.popleft()
+            if self.limits.try_acquire(platform):
+                future = self.executor.submit(self._run_item, platform, item)
+                running[future] = (platform, item)
+            else:
+                pending.append((platform, item))
+
+    def _run_item(self, platform, item):
+        try:
+            return self.scrape_item(item)
+        finally:
+            self.limits.release(platform)
+
+    def _collect(self, future, item):
+        try:
+            return {"success": True, **future.result()}
+        except Exception as e:
+            logger.error(f"Batch item failed for {item['url']}: {str(e)}")
+            return {"success": False, "error": str(e)}
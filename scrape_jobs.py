@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Scrape Jobs
+Runs scrapes on a bounded background executor and tracks them by job id
+
+Job state lives in a small SQLite database so that any gunicorn worker can
+answer GET /api/jobs/<id>, whichever worker accepted the job.
+"""
+
+import os
+import json
+import uuid
+import time
+import sqlite3
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from post_record import json_default
+
+logger = logging.getLogger(__name__)
+
+# Job configuration
+JOBS_DB = os.environ.get('SKRAPER_JOBS_DB', os.path.join(tempfile.gettempdir(), 'skraper-jobs.db'))
+JOB_WORKERS = int(os.environ.get('SKRAPER_JOB_WORKERS', 4))
+JOB_QUEUE_LIMIT = int(os.environ.get('SKRAPER_JOB_QUEUE_LIMIT', 32))
+JOB_TTL = int(os.environ.get('SKRAPER_JOB_TTL', 3600))  # Keep finished jobs for 1 hour
+
+
+class JobQueueFull(Exception):
+    """Raised when the background executor cannot accept more jobs"""
+
+
+class JobStore:
+    """SQLite-backed job records shared by every worker process on the host"""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    params TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create(self, kind, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, stage, params, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(params), now, now)
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or (row['expires_at'] and row['expires_at'] < time.time()):
+            return None
+        return {
+            "job_id": row['id'],
+            "kind": row['kind'],
+            "status": row['status'],
+            "stage": row['stage'],
+            "progress": row['progress'],
+            "params": json.loads(row['params']) if row['params'] else {},
+            "result": json.loads(row['result']) if row['result'] else None,
+            "error": row['error'],
+            "created_at": row['created_at'],
+            "updated_at": row['updated_at'],
+            "expires_at": row['expires_at']
+        }
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+
+
+class JobManager:
+    """Bounded background executor for scrape jobs"""
+
+    def __init__(self, store=None, max_workers=JOB_WORKERS, max_queued=JOB_QUEUE_LIMIT, ttl=JOB_TTL):
+        self.store = store or JobStore()
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape-job')
+        self._capacity = threading.BoundedSemaphore(max_workers + max_queued)
+        self._lock = threading.Lock()
+        self._counts = {"queued": 0, "running": 0}
+
+    def submit(self, kind, func, **params):
+        """Queue func(progress, **params) and return the new job id
+
+        func reports progress by calling progress(stage, fraction) and
+        returns the JSON-serializable job result.
+        """
+        if not self._capacity.acquire(blocking=False):
+            raise JobQueueFull("Too many scrape jobs queued, try again later")
+
+        self.store.purge_expired()
+        job_id = self.store.create(kind, params)
+        with self._lock:
+            self._counts["queued"] += 1
+        try:
+            self.executor.submit(self._run, job_id, func, params)
+        except Exception:
+            with self._lock:
+                self._counts["queued"] -= 1
+            self._capacity.release()
+            raise
+        return job_id
+
+    def _run(self, job_id, func, params):
+        def progress(stage, fraction):
+            self.store.update(job_id, stage=stage, progress=round(fraction, 2))
+
+        with self._lock:
+            self._counts["queued"] -= 1
+            self._counts["running"] += 1
+        try:
+            self.store.update(job_id, status='running', stage='running')
+            result = func(progress, **params)
+            self.store.update(
+                job_id,
+                status='completed',
+                stage='done',
+                progress=1.0,
+                result=json.dumps(result, default=json_default),
+                expires_at=time.time() + self.ttl
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status='failed', error=str(e), expires_at=time.time() + self.ttl)
+        finally:
+            with self._lock:
+                self._counts["running"] -= 1
+            self._capacity.release()
+
+    def in_flight(self):
+        """Jobs of this process waiting for and running on the executor"""
+        with self._lock:
+            return dict(self._counts)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
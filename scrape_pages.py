@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Cursor Pagination for Scrapes
+Spools Skraper output to disk so later pages are served without re-scraping
+
+The first page request starts a background fill that streams Skraper output
+into an NDJSON spool file and returns as soon as the first page is on disk.
+Cursors point at a byte offset in that spool, so any gunicorn worker can
+serve the next page with bounded memory. The Skraper CLI cannot resume a
+listing, so when a spool runs past its window the fill is re-run with a
+larger -n and the items already spooled are skipped while streaming.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import base64
+import shutil
+import tempfile
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pagination configuration
+PAGES_DIR = os.environ.get('SKRAPER_PAGES_DIR', os.path.join(tempfile.gettempdir(), 'skraper-pages'))
+PAGE_WINDOW = int(os.environ.get('SKRAPER_PAGE_WINDOW', 500))  # Items fetched per Skraper run
+PAGE_MAX_ITEMS = int(os.environ.get('SKRAPER_PAGE_MAX_ITEMS', 10000))
+PAGE_TTL = int(os.environ.get('SKRAPER_PAGE_TTL', 3600))
+PAGE_WAIT_SECONDS = 300
+PAGE_POLL_SECONDS = 0.1
+
+_SPOOL_ID = re.compile(r'[0-9a-f]{32}')
+
+
+def encode_cursor(spool_id, offset, index):
+    raw = json.dumps({"s": spool_id, "o": offset, "i": index}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        spool_id, offset, index = data['s'], int(data['o']), int(data['i'])
+    except Exception:
+        raise Exception("Invalid pagination cursor")
+    if not _SPOOL_ID.fullmatch(spool_id):
+        raise Exception("Invalid pagination cursor")
+    return spool_id, offset, index
+
+
+class PageSpool:
+    """On-disk NDJSON spool of raw Skraper items plus a small meta file"""
+
+    def __init__(self, root, spool_id):
+        self.spool_id = spool_id
+        self.path = os.path.join(root, spool_id)
+        self.items_path = os.path.join(self.path, 'items.ndjson')
+        self.meta_path = os.path.join(self.path, 'meta.json')
+
+    @classmethod
+    def create(cls, root, params, window):
+        spool = cls(root, uuid.uuid4().hex)
+        os.makedirs(spool.path)
+        open(spool.items_path, 'w').close()
+        spool.write_meta({
+            "params": params,
+            "status": "filling",
+            "window": window,
+            "count": 0,
+            "error": None,
+            "created_at": time.time()
+        })
+        return spool
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def read_meta(self):
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def write_meta(self, meta):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def update_meta(self, **fields):
+        meta = self.read_meta()
+        meta.update(fields)
+        self.write_meta(meta)
+        return meta
+
+    def locked(self):
+        """Exclusive lock used when deciding whether to extend the spool"""
+        return _FileLock(os.path.join(self.path, 'extend.lock'))
+
+    def read_lines(self, offset, size):
+        """Read up to size complete lines starting at a byte offset"""
+        items = []
+        with open(self.items_path, 'rb') as f:
+            f.seek(offset)
+            while len(items) < size:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # Nothing more, or a line still being written
+                offset += len(line)
+                items.append(json.loads(line))
+        return items, offset
+
+    def size(self):
+        return os.path.getsize(self.items_path)
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+class PageManager:
+    """Serves cursor-paginated pages from spooled Skraper output
+
+    stream_items(params, n) must return an iterator over the first n raw
+    items Skraper produces for params.
+    """
+
+    def __init__(self, stream_items, root=PAGES_DIR, window=PAGE_WINDOW, max_items=PAGE_MAX_ITEMS):
+        self.stream_items = stream_items
+        self.root = root
+        self.window = window
+        self.max_items = max_items
+        os.makedirs(root, exist_ok=True)
+
+    def page(self, params, page_size, cursor=None):
+        """Return (raw_items, start_index, next_cursor, params)
+
+        With a cursor, params are taken from the spool the cursor points at.
+        """
+        if cursor:
+            spool_id, offset, index = decode_cursor(cursor)
+            spool = PageSpool(self.root, spool_id)
+            if not spool.exists():
+                raise Exception("Pagination cursor expired, start again without a cursor")
+        else:
+            self.purge_expired()
+            spool = PageSpool.create(self.root, params, min(self.window, self.max_items))
+            self._start_fill(spool, spool.read_meta()['window'], skip=0)
+            offset, index = 0, 0
+
+        items, offset, exhausted = self._read_page(spool, offset, page_size)
+        next_cursor = None if exhausted else encode_cursor(spool.spool_id, offset, index + len(items))
+        return items, index, next_cursor, spool.read_meta()['params']
+
+    def _read_page(self, spool, offset, page_size):
+        deadline = time.time() + PAGE_WAIT_SECONDS
+        items = []
+        while True:
+            more, offset = spool.read_lines(offset, page_size - len(items))
+            items.extend(more)
+            meta = spool.read_meta()
+
+            if meta['status'] == 'failed':
+                raise Exception(f"Scraping failed: {meta['error']}")
+            if meta['status'] == 'partial' and offset >= spool.size():
+                self._extend(spool)
+                continue
+
+            done = meta['status'] == 'complete' and offset >= spool.size()
+            if len(items) >= page_size or done:
+                return items, offset, done
+            if time.time() >= deadline:
+                raise Exception("Timed out waiting for the next page of results")
+            time.sleep(PAGE_POLL_SECONDS)
+
+    def _extend(self, spool):
+        """Re-run Skraper with a larger window, skipping items already spooled"""
+        with spool.locked():
+            meta = spool.read_meta()
+            if meta['status'] != 'partial':
+                return  # Another worker already extended it
+            window = min(meta['window'] * 2, self.max_items)
+            spool.update_meta(status='filling', window=window)
+        self._start_fill(spool, window, skip=meta['count'])
+
+    def _start_fill(self, spool, window, skip):
+        thread = threading.Thread(
+            target=self._fill, args=(spool, window, skip), name='scrape-page-fill', daemon=True
+        )
+        thread.start()
+
+    def _fill(self, spool, window, skip):
+        params = spool.read_meta()['params']
+        seen = 0
+        try:
+            with open(spool.items_path, 'a') as out:
+                for item in self.stream_items(params, window):
+                    seen += 1
+                    if seen <= skip:
+                        continue
+                    out.write(json.dumps(item) + "\n")
+                    out.flush()
+            # Fewer items than asked for means the account has no more posts
+            exhausted = seen < window or window >= self.max_items
+            spool.update_meta(status='complete' if exhausted else 'partial', count=max(seen, skip))
+        except Exception as e:
+            logger.error(f"Page fill failed for spool {spool.spool_id}: {str(e)}")
+            spool.update_meta(status='failed', error=str(e))
+
+    def purge_expired(self):
+        cutoff = time.time() - PAGE_TTL
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if _SPOOL_ID.fullmatch(name) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
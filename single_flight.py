@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Single-Flight Request Coalescing
+Makes identical concurrent scrapes share one Skraper run
+
+Within a process, later callers for a key wait on the leader's future.
+Across gunicorn workers, a per-key file lock (lease) lets one worker scrape
+while the others wait and then pick the fresh result up from the shared cache.
+"""
+
+import os
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+import asyncio
+import logging
+from concurrent.futures import Future
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+LOCK_DIR = os.environ.get('SKRAPER_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'skraper-locks'))
+LEASE_POLL_SECONDS = 0.05
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key"""
+
+    def __init__(self, lock_dir=LOCK_DIR):
+        self.lock_dir = lock_dir
+        os.makedirs(lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def do(self, key, func):
+        """Run func once per key at a time; returns (result, shared)
+
+        shared is True when this caller waited on another caller's run.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def _lease_path(self, key):
+        return os.path.join(self.lock_dir, hashlib.sha1(key.encode()).hexdigest() + '.lock')
+
+    @staticmethod
+    def _try_lease(path):
+        """One non-blocking attempt at a lease; the locked file, or None while another process holds it"""
+        while True:
+            candidate = open(path, 'a')
+            try:
+                fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                candidate.close()
+                return None
+            # The previous holder may have removed the file we locked; then lock the new one
+            try:
+                if os.fstat(candidate.fileno()).st_ino == os.stat(path).st_ino:
+                    return candidate
+            except FileNotFoundError:
+                pass
+            candidate.close()
+
+    @staticmethod
+    def _release_lease(path, lock_file):
+        if lock_file is None:
+            return
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        lock_file.close()  # Releases the lock
+
+    @contextmanager
+    def host_lease(self, key, timeout=300):
+        """Hold an exclusive per-key lease shared by every process on the host
+
+        If the lease cannot be taken within timeout the caller proceeds
+        without it rather than failing the request. The lock file is removed
+        by the holder before it lets go, so the lock directory only holds
+        files of leases in use.
+        """
+        path = self._lease_path(key)
+        deadline = time.time() + timeout
+        lock_file = self._try_lease(path)
+        while lock_file is None:
+            if time.time() >= deadline:
+                logger.warning(f"Scrape lease wait timed out, proceeding without it: {key}")
+                break
+            time.sleep(LEASE_POLL_SECONDS)
+            lock_file = self._try_lease(path)
+
+        try:
+            yield lock_file is not None
+        finally:
+            self._release_lease(path, lock_file)
+
+    @asynccontextmanager
+    async def host_lease_async(self, key, timeout=300):
+        """host_lease for coroutines: waits with asyncio.sleep instead of holding a thread"""
+        path = self._lease_path(key)
+        deadline = time.time() + timeout
+        lock_file = self._try_lease(path)
+        while lock_file is None:
+            if time.time() >= deadline:
+                logger.warning(f"Scrape lease wait timed out, proceeding without it: {key}")
+                break
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+            lock_file = self._try_lease(path)
+
+        try:
+            yield lock_file is not None
+        finally:
+            self._release_lease(path, lock_file)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Skraper Worker Pool
+Caps how many Skraper processes run at once on a host
+
+The Skraper CLI has no resident mode, so every job launches the CLI once a
+pool slot is free; under gunicorn the slots are shared by all web workers
+through the master's Unix socket. This is a concurrency cap only: each run
+still starts its own JVM, trimmed by DEFAULT_JAVA_OPTS.
+
+Clients of the shared pool send Skraper's arguments, never a command: the
+master runs them with the executable it found itself, and its socket is
+only accessible to the user the service runs as. One JSON line each way:
+    request:  {"op": "run", "args": ["instagram", "nike", "-n", "50", "-t", "json"], "timeout": 300}
+    response: {"returncode": 0, "stdout": "...", "stderr": "..."}
+              {"error": "timeout"}
+
+Callers that run Skraper themselves, to stream its output, hold a slot with
+pool.slot() for the life of their process.
+"""
+
+import os
+import json
+import socket
+import tempfile
+import socketserver
+import subprocess
+import threading
+import logging
+from contextlib import contextmanager
+
+from skraper_probe import skraper_probe
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+POOL_SIZE = int(os.environ.get('SKRAPER_POOL_SIZE', 4))
+# Inside a directory only the service user can enter, unless the deployment picks a path
+POOL_SOCKET = os.environ.get('SKRAPER_POOL_SOCKET') or os.path.join(
+    tempfile.gettempdir(), f"skraper-{os.getuid()}", 'pool.sock'
+)
+
+# JVM flags for short-lived Skraper runs (C1 only, serial GC, class-data sharing), unless set by the deployment
+DEFAULT_JAVA_OPTS = '-XX:TieredStopAtLevel=1 -XX:+UseSerialGC -Xshare:auto'
+
+# Extra time a client waits on top of the job timeout before giving up on the pool
+WORKER_GRACE_SECONDS = 10
+
+
+def skraper_env():
+    """Environment for a Skraper process: ours, plus the short-run JVM flags unless already set"""
+    env = dict(os.environ)
+    env.setdefault('JAVA_TOOL_OPTIONS', DEFAULT_JAVA_OPTS)
+    return env
+
+
+def run_direct(cmd, timeout):
+    """Run one Skraper command as its own process; returns the pool reply shape"""
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, env=skraper_env())
+    return {"returncode": result.returncode, "stdout": result.stdout, "stderr": result.stderr}
+
+
+class SkraperPool:
+    """size slots for Skraper runs in this process"""
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._waiting = 0  # Jobs queued for a free slot
+        self.stats = {
+            "jobs_completed": 0,
+            "jobs_failed": 0
+        }
+
+    @contextmanager
+    def slot(self, timeout=300):
+        """Hold one slot for the block, e.g. while a streamed Skraper process started by the caller runs"""
+        with self._lock:
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            raise Exception("Skraper pool is busy - no worker became free in time")
+
+        with self._lock:
+            self._busy += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._busy -= 1
+            self._slots.release()
+
+    def run(self, cmd, timeout=300):
+        """Run a Skraper command once a slot is free"""
+        with self.slot(timeout):
+            try:
+                reply = run_direct(cmd, timeout)
+            except Exception:
+                with self._lock:
+                    self.stats["jobs_failed"] += 1
+                raise
+            with self._lock:
+                self.stats["jobs_completed"] += 1
+            return reply
+
+    def health(self):
+        """Pool health summary"""
+        with self._lock:
+            return {
+                "mode": "local",
+                "size": self.size,
+                "busy": self._busy,
+                "idle": self.size - self._busy,
+                "queued": self._waiting,
+                **self.stats
+            }
+
+
+class _PoolRequestHandler(socketserver.StreamRequestHandler):
+    """Serves one client connection: a single JSON request line in, one reply line out
+
+    A "slot" request is answered once a slot is free, which stays taken until
+    the client closes the connection.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            if request.get('op') == 'health':
+                reply = self.server.pool.health()
+            elif request.get('op') == 'slot':
+                self._hold_slot(request.get('timeout', 300))
+                return
+            else:
+                reply = self.server.pool.run(self._command(request.get('args')), request.get('timeout', 300))
+        except subprocess.TimeoutExpired:
+            reply = {"error": "timeout"}
+        except Exception as e:
+            reply = {"error": str(e)}
+        self.wfile.write((json.dumps(reply) + "\n").encode())
+
+    @staticmethod
+    def _command(args):
+        """Skraper's own executable followed by the client's arguments"""
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            raise Exception("args must be a list of strings")
+        executable = skraper_probe.executable()
+        if not executable:
+            raise Exception("Skraper executable not found")
+        return [executable] + args
+
+    def _hold_slot(self, timeout):
+        with self.server.pool.slot(timeout):
+            try:
+                self.wfile.write(b'{"ok": true}\n')
+                self.wfile.flush()
+                self.rfile.read()  # Until the client is done with its process and hangs up
+            except OSError:
+                pass  # Client went away; leaving the block frees the slot either way
+
+
+class PoolServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket front-end so every gunicorn worker on the host shares one pool"""
+
+    daemon_threads = True
+
+    def __init__(self, pool, path=POOL_SOCKET):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        owner = os.stat(directory).st_uid
+        if owner not in (os.getuid(), 0):
+            raise Exception(f"Refusing to serve the Skraper pool from {directory}: owned by uid {owner}")
+        if os.path.exists(path):
+            os.unlink(path)
+        self.pool = pool
+        super().__init__(path, _PoolRequestHandler)
+
+    def server_bind(self):
+        # Created 0600: only the service user may hand the pool work
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def serve_in_background(self):
+        thread = threading.Thread(target=self.serve_forever, name='skraper-pool', daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class PoolClient:
+    """Sends jobs to a PoolServer over its Unix socket"""
+
+    def __init__(self, path=POOL_SOCKET):
+        self.path = path
+
+    def _request(self, payload, timeout):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.path)
+            sock.sendall((json.dumps(payload) + "\n").encode())
+            with sock.makefile('r') as reader:
+                line = reader.readline()
+        if not line:
+            raise Exception("Skraper pool closed the connection")
+        return json.loads(line)
+
+    def run(self, cmd, timeout=300):
+        """Run cmd's arguments with the pool's own Skraper executable"""
+        try:
+            reply = self._request({"op": "run", "args": cmd[1:], "timeout": timeout},
+                                  timeout + 2 * WORKER_GRACE_SECONDS)
+        except OSError as e:
+            raise Exception(f"Skraper pool unavailable: {e}")
+
+        if reply.get('error') == 'timeout':
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if 'error' in reply:
+            raise Exception(reply['error'])
+        return reply
+
+    @contextmanager
+    def slot(self, timeout=300):
+        """Hold one slot of the host pool for the block; the connection stays open meanwhile"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout + WORKER_GRACE_SECONDS)
+            sock.connect(self.path)
+            sock.sendall((json.dumps({"op": "slot", "timeout": timeout}) + "\n").encode())
+            with sock.makefile('r') as reader:
+                line = reader.readline()
+        except OSError as e:
+            sock.close()
+            raise Exception(f"Skraper pool unavailable: {e}")
+
+        try:
+            if not line:
+                raise Exception("Skraper pool closed the connection")
+            reply = json.loads(line)
+            if 'error' in reply:
+                raise Exception(reply['error'])
+            yield
+        finally:
+            sock.close()  # Frees the slot
+
+    def health(self):
+        try:
+            health = self._request({"op": "health"}, 5)
+        except OSError as e:
+            return {"mode": "shared", "socket": self.path, "reachable": False, "error": str(e)}
+        return {**health, "mode": "shared", "socket": self.path, "reachable": True}
+
+
+def start_pool_server(path=POOL_SOCKET):
+    """Start a pool and its socket server (used by the gunicorn master)"""
+    pool = SkraperPool()
+    server = PoolServer(pool, path)
+    server.serve_in_background()
+    logger.info(f"Skraper pool serving {pool.size} slots on {path}")
+    return server
+
+
+def create_pool():
+    """Connect to the shared host pool if one is running, otherwise use a local pool"""
+    # The gunicorn master exports SKRAPER_POOL_SOCKET once its pool server is up
+    path = os.environ.get('SKRAPER_POOL_SOCKET')
+    if path and os.path.exists(path):
+        return PoolClient(path)
+    return SkraperPool()
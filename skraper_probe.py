@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Skraper Binary Probe
+Finds the Skraper executable and checks that it runs, once per host, with the result cached on disk
+
+Running `skraper --help` starts a JVM and takes seconds, so it is never done
+on a request or at import time of a web worker. The result is written to
+SKRAPER_PROBE_FILE; every worker reads that file, and whichever process
+first sees it stale (older than SKRAPER_PROBE_TTL) refreshes it in a
+background thread while holding a host-wide lock. Until the first probe
+finishes the state reports status "probing". The gunicorn master starts
+the first probe before the workers are forked.
+"""
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import tempfile
+import subprocess
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROBE_FILE = os.environ.get('SKRAPER_PROBE_FILE', os.path.join(tempfile.gettempdir(), 'skraper-probe.json'))
+PROBE_TTL = int(os.environ.get('SKRAPER_PROBE_TTL', 600))
+PROBE_TIMEOUT = int(os.environ.get('SKRAPER_PROBE_TIMEOUT', 30))  # JVM start-up on a cold host
+
+
+def find_skraper_executable():
+    """Path of the skraper executable, or None; looked up in-process, without a subprocess"""
+    # Try common installation paths
+    possible_paths = [
+        '/usr/local/bin/skraper',
+        '/usr/bin/skraper',
+        os.path.expanduser('~/.local/bin/skraper'),
+        os.path.join(os.getcwd(), 'skraper'),
+    ]
+
+    for path in possible_paths:
+        if os.path.exists(path) and os.access(path, os.X_OK):
+            return path
+
+    # Check if skraper is in PATH
+    return shutil.which('skraper')
+
+
+class SkraperProbe:
+    """Host-wide cached result of discovering and running the Skraper binary"""
+
+    def __init__(self, path=PROBE_FILE, ttl=PROBE_TTL, timeout=PROBE_TIMEOUT):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._cached = None  # (mtime, state) of the last read of the probe file
+
+    def _read(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+        cached = self._cached
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._cached = (mtime, state)
+        return state
+
+    def _write(self, state):
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.skraper-probe-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)  # Readers never see a half-written file
+
+    def run_probe(self):
+        """Discover the binary and run `skraper --help` (blocking)"""
+        executable = find_skraper_executable()
+        state = {"path": executable, "available": False, "error": None, "checked_at": time.time()}
+        if not executable:
+            state["error"] = "Skraper executable not found"
+            return state
+        started = time.time()
+        try:
+            result = subprocess.run([executable, '--help'], capture_output=True, text=True, timeout=self.timeout)
+            state["available"] = result.returncode == 0
+            if result.returncode != 0:
+                state["error"] = (result.stderr or result.stdout).strip()[-500:]
+        except subprocess.TimeoutExpired:
+            state["error"] = f"skraper --help did not finish within {self.timeout}s"
+        except OSError as e:
+            state["error"] = str(e)
+        state["probe_seconds"] = round(time.time() - started, 3)
+        return state
+
+    def refresh(self):
+        """Probe and store the result, unless another process on the host is already doing so"""
+        with open(self.path + '.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return self._read()
+            try:
+                state = self.run_probe()
+                self._write(state)
+                logger.info(f"Skraper probe: available={state['available']} path={state['path']}")
+                return state
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh_async(self):
+        """Start a background refresh unless this process already has one running"""
+        with self._lock:
+            if self._refreshing and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self._refresh_quietly, name='skraper-probe', daemon=True)
+            self._refreshing.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Skraper probe failed: {str(e)}")
+
+    def state(self, wait=False):
+        """Last probe result; never blocks unless wait=True and no result exists yet
+
+        A missing or stale result schedules a background refresh.
+        """
+        state = self._read()
+        if state is None and wait:
+            state = self.refresh() or self._read()
+        if state is None:
+            self.refresh_async()
+            return {"path": find_skraper_executable(), "available": False, "status": "probing", "checked_at": None}
+        if time.time() - state.get('checked_at', 0) > self.ttl:
+            self.refresh_async()
+            return {**state, "status": "stale"}
+        return {**state, "status": "ok"}
+
+    def executable(self):
+        """Path to run Skraper with: the probed one while it still exists, else a fresh lookup"""
+        path = (self._read() or {}).get('path')
+        if path and os.access(path, os.X_OK):
+            return path
+        return find_skraper_executable()
+
+
+# Shared by the app modules of this process
+skraper_probe = SkraperProbe()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Skraper Output Streaming
+Incremental parsing of Skraper JSON output and NDJSON / Server-Sent Events framing
+"""
+
+import json
+
+from post_record import json_default
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = ' \t\r\n,'
+
+# Streaming response formats a client can ask for via the Accept header
+STREAM_MIMETYPES = ('application/x-ndjson', 'text/event-stream')
+
+
+def iter_raw_posts(raw_data):
+    """Yield the post items contained in a parsed Skraper response"""
+    if isinstance(raw_data, list):
+        yield from raw_data
+    elif isinstance(raw_data, dict):
+        if 'posts' in raw_data:
+            yield from raw_data['posts']
+        elif 'data' in raw_data:
+            yield from raw_data['data']
+        else:
+            yield raw_data
+
+
+def iter_json_items(chunks):
+    """Yield post items from Skraper JSON output as the text chunks arrive
+
+    A top-level JSON array is decoded one element at a time, so items are
+    available before the closing bracket is read. Any other document (an
+    object wrapping "posts"/"data", or newline-delimited JSON) is buffered
+    and parsed once complete.
+    """
+    chunks = iter(chunks)
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+    buffer = buffer.lstrip()
+    if not buffer:
+        return
+
+    if buffer[0] != '[':
+        yield from _iter_document(buffer + ''.join(chunks))
+        return
+
+    pos = 1
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+            pos += 1
+        if pos < len(buffer):
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+                # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+                if end < len(buffer) or eof:
+                    yield item
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        if eof:
+            raise json.JSONDecodeError("Unterminated JSON array", buffer, pos)
+
+        # Drop what has been consumed, then read more
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer += chunk
+
+
+def _iter_document(text):
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError:
+        # Newline-delimited JSON: one item per line
+        for line in text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    yield from iter_raw_posts(document)
+
+
+def negotiate_stream_format(accept_header):
+    """Streaming mimetype the client explicitly asked for, or None"""
+    for mimetype in STREAM_MIMETYPES:
+        if mimetype in (accept_header or ''):
+            return mimetype
+    return None
+
+
+def ndjson_event(event, data):
+    return json.dumps({"event": event, "data": data}, default=json_default) + "\n"
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+
+def frame_events(events, mimetype):
+    """Serialize (event, data) pairs for the negotiated streaming format"""
+    frame = sse_event if mimetype == 'text/event-stream' else ndjson_event
+    for event, data in events:
+        yield frame(event, data)
@@ -9,7 +9,12 @@ PORT=${PORT:-5000}
 # Check if we're in development or production
 if [ "$FLASK_ENV" = "production" ]; then
     echo "Running in production mode"
-    gunicorn --bind 0.0.0.0:$PORT --workers 4 app_enhanced:app
+    if [ "$SKRAPER_SERVER" = "asgi" ]; then
+        # One asyncio process; Skraper runs as non-blocking subprocesses
+        uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+    else
+        gunicorn --bind 0.0.0.0:$PORT --workers 4 app_enhanced:app
+    fi
 else
     echo "Running in development mode"
     python app_enhanced.py